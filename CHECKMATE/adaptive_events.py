@@ -0,0 +1,206 @@
+import os
+import re
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+module_path = Path("combine_signal_regions.py").resolve()
+spec = importlib.util.spec_from_file_location("combine_signal_regions", module_path)
+combine_signal_regions = importlib.util.module_from_spec(spec)
+sys.modules["combine_signal_regions"] = combine_signal_regions
+spec.loader.exec_module(combine_signal_regions)
+
+TEMPLATE_FILE = "FPVDM_TOP.dat"
+PYTHIA_TEMPLATE = "pythia8card.in"
+CHECKMATE_EXEC = os.path.expandvars("$HOME/packages/CHECKMATE/checkmate2/bin/CM")
+RESULTS_DIR = os.path.expandvars("$HOME/packages/CHECKMATE/checkmate2/results")
+RESULT_SUFFIX = os.path.join("evaluation", "total_results.txt")
+
+
+def write_cards(scratch_dir, name, lhe_file, n_events, skip, seed, template=TEMPLATE_FILE):
+    """
+    Run card and Pythia card for one CheckMATE run over LHE events
+    [skip, skip + n_events), as run_all_fpvdm.sh prepares them from the
+    run card `template`.
+    """
+    with open(template) as f:
+        card = f.read()
+    card = re.sub(r"(?m)^Name:.*", f"Name: {name}", card)
+    card = card.replace("pythia8card.in", "pythia8card_1.in")
+    run_file = os.path.join(scratch_dir, f"run_{name}.dat")
+    with open(run_file, "w") as f:
+        f.write(card)
+
+    with open(PYTHIA_TEMPLATE) as f:
+        pythia = f.read()
+    pythia = re.sub(r"(?m)^Main:numberOfEvents *=.*?(!|$)", f"Main:numberOfEvents = {n_events}        \\1", pythia)
+    pythia = re.sub(r"Beams:LHEF *= *file\.lhe\.gz", "Beams:LHEF = file1.lhe.gz", pythia)
+    # Independent events for every run: skip the ones earlier runs used, and a new seed
+    pythia += f"\nBeams:nSkipLHEFatInit = {skip}\nRandom:setSeed = on\nRandom:seed = {seed}\n"
+    with open(os.path.join(scratch_dir, "pythia8card_1.in"), "w") as f:
+        f.write(pythia)
+
+    os.symlink(os.path.realpath(lhe_file), os.path.join(scratch_dir, "file1.lhe.gz"))
+    return run_file
+
+
+def run_checkmate(name, lhe_file, n_events, skip, seed, results_dir=RESULTS_DIR, template=TEMPLATE_FILE):
+    """
+    Run CheckMATE on n_events LHE events starting after `skip`, with the
+    run card `template`.
+
+    Returns:
+        Path of the run's evaluation/total_results.txt
+    """
+    scratch_dir = tempfile.mkdtemp(prefix=f"tmp_run_{name}_", dir=".")
+    try:
+        run_file = write_cards(scratch_dir, name, lhe_file, n_events, skip, seed, template)
+        with open(f"log_{name}.txt", "w") as log:
+            subprocess.run([CHECKMATE_EXEC, os.path.basename(run_file)], cwd=scratch_dir,
+                           stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, check=True)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return os.path.join(results_dir, name, RESULT_SUFFIX)
+
+
+def remove_runs(names, results_dir=RESULTS_DIR):
+    """
+    Delete the result folders of partial runs once they are merged, so the
+    tools walking the results folder do not take them for model points.
+    """
+    for name in names:
+        shutil.rmtree(os.path.join(results_dir, name), ignore_errors=True)
+
+
+def merge_runs(runs):
+    """
+    Merge total_results.txt tables of independent runs of one point.
+
+    Each run's s is an unbiased estimate of the same yield, so the merged s is
+    the event-weighted mean and the MC uncertainties add in quadrature with
+    the same weights; b and db are taken from the first run. s95exp and
+    s95obs do not depend on s, so rexpcons = (s - 1.64 ds) / s95exp and
+    robscons = (s - 1.64 ds) / s95obs are recomputed with the first run's
+    limits (the limit engine is only needed where s95exp cannot be recovered
+    from its rexpcons).
+
+    Args:
+        runs (list of (DataFrame, int)): total_results table and its number of events
+
+    Returns:
+        Merged DataFrame with the columns of the first table
+    """
+    first = runs[0][0]
+    key = ["analysis", "sr"]
+    total = sum(n for _, n in runs)
+    merged = first.set_index(key)
+
+    if "s95exp" in merged.columns:
+        s95exp = merged["s95exp"].astype(float)
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s95exp = (merged["s"] - 1.64 * merged["ds"]) / merged["rexpcons"]
+        for idx in s95exp.index[~np.isfinite(s95exp) | (s95exp <= 0)]:
+            row = merged.loc[idx]
+            s95exp[idx] = float(combine_signal_regions.compute_r_exp_cons_scaled(
+                row["s"], row["ds"], row["b"], row["db"], [1], df=1)[0]["s95exp"])
+
+    # s95obs likewise, from the table or the first run's robscons (NaN where that fails)
+    if "s95obs" in merged.columns:
+        s95obs = merged["s95obs"].astype(float)
+    elif "robscons" in merged.columns:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s95obs = (merged["s"] - 1.64 * merged["ds"]) / merged["robscons"]
+        s95obs = s95obs.where(np.isfinite(s95obs) & (s95obs > 0))
+
+    merged["s"] = sum(n * df.set_index(key)["s"] for df, n in runs) / total
+    merged["ds"] = np.sqrt(sum((n * df.set_index(key)["ds"])**2 for df, n in runs)) / total
+    merged["rexpcons"] = (merged["s"] - 1.64 * merged["ds"]) / s95exp
+    if "robscons" in merged.columns:
+        merged["robscons"] = (merged["s"] - 1.64 * merged["ds"]) / s95obs
+    return merged.reset_index()[first.columns]
+
+
+def r_precision(df):
+    """
+    r_exp_cons of the best SR and its Monte Carlo uncertainty, ds / s95exp
+    (s95exp from the table, or from rexpcons = (s - 1.64 ds) / s95exp).
+
+    Returns:
+        (r, sigma_r, "analysis:sr")
+    """
+    best = df.loc[df["rexpcons"].idxmax()]
+    if "s95exp" in df.columns:
+        s95exp = best["s95exp"]
+    else:
+        s95exp = (best["s"] - 1.64 * best["ds"]) / best["rexpcons"]
+    return best["rexpcons"], best["ds"] / s95exp, f"{best['analysis']}:{best['sr']}"
+
+
+def control_point(name, lhe_file, n_initial=10000, z=2.0, growth=4, max_events=160000, lhe_events=None,
+                  seed=1, results_dir=RESULTS_DIR, runner=run_checkmate):
+    """
+    Run CheckMATE for one point with as few events as its r value allows.
+
+    Starts with n_initial events. While the best SR's r_exp_cons lies within
+    z Monte Carlo standard deviations of 1, more events are requested: enough
+    to bring sigma_r down to |r - 1| / z (sigma_r ~ 1/sqrt(N)), at least
+    `growth` times the events so far, at most max_events (or lhe_events) in
+    total. Every run reads new LHE events; all runs are merged into
+    <results_dir>/<name>/evaluation/total_results.txt and their own
+    <name>_part<i> folders are removed.
+
+    Returns:
+        List of (events so far, r, sigma_r, best SR) after each run
+    """
+    runs = []
+    history = []
+    parts = []
+    used = 0
+    limit = min(max_events, lhe_events) if lhe_events else max_events
+    n_next = min(n_initial, limit)
+    try:
+        while n_next > 0:
+            parts.append(f"{name}_part{len(runs)}")
+            path = runner(parts[-1], lhe_file, n_next, used, seed + len(runs), results_dir)
+            runs.append((pd.read_csv(path, sep=r"\s+"), n_next))
+            used += n_next
+
+            merged = merge_runs(runs) if len(runs) > 1 else runs[0][0]
+            r, sigma_r, best = r_precision(merged)
+            history.append((used, r, sigma_r, best))
+            print(f"{name}: {used} events, best {best} r = {r:.4g} +- {sigma_r:.2g}")
+
+            if abs(r - 1) >= z * sigma_r or used >= limit:
+                break
+            needed = used * (z * sigma_r / max(abs(r - 1), 1e-3))**2
+            n_next = int(min(max(needed, growth * used), limit) - used)
+
+        out_dir = os.path.join(results_dir, name, "evaluation")
+        os.makedirs(out_dir, exist_ok=True)
+        merged.to_csv(os.path.join(out_dir, "total_results.txt"), sep=" ", index=False)
+    finally:
+        remove_runs(parts, results_dir)
+    return history
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run CheckMATE for a point with an event count adapted to its r value")
+    parser.add_argument("name", help="CheckMATE run name, e.g. fpvdm_Mtp1500DMV100")
+    parser.add_argument("lhe_file")
+    parser.add_argument("--initial", type=int, default=10000, help="events in the first run")
+    parser.add_argument("--z", type=float, default=2.0, help="more events while |r - 1| < z * sigma_r")
+    parser.add_argument("--max-events", type=int, default=160000)
+    parser.add_argument("--lhe-events", type=int, default=None, help="events available in the LHE file")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    control_point(args.name, args.lhe_file, args.initial, args.z, max_events=args.max_events,
+                  lhe_events=args.lhe_events, results_dir=args.results_dir)
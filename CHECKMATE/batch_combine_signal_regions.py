@@ -1,3 +1,4 @@
+import io
 import os
 import pandas as pd
 import numpy as np
@@ -5,6 +6,11 @@ from pathlib import Path
 import importlib.util
 import sys
 import re
+import json
+import zlib
+import argparse
+from fractions import Fraction
+from contextlib import nullcontext
 
 # Load combine_signal_regions module
 module_path = Path("combine_signal_regions.py").resolve()
@@ -13,11 +19,53 @@ combine_signal_regions = importlib.util.module_from_spec(spec)
 sys.modules["combine_signal_regions"] = combine_signal_regions
 spec.loader.exec_module(combine_signal_regions)
 
+module_path = Path("pipeline_profile.py").resolve()
+spec = importlib.util.spec_from_file_location("pipeline_profile", module_path)
+pipeline_profile = importlib.util.module_from_spec(spec)
+sys.modules["pipeline_profile"] = pipeline_profile
+spec.loader.exec_module(pipeline_profile)
+
+module_path = Path("result_cache.py").resolve()
+spec = importlib.util.spec_from_file_location("result_cache", module_path)
+result_cache = importlib.util.module_from_spec(spec)
+sys.modules["result_cache"] = result_cache
+spec.loader.exec_module(result_cache)
+
+module_path = Path("region_archive.py").resolve()
+spec = importlib.util.spec_from_file_location("region_archive", module_path)
+region_archive = importlib.util.module_from_spec(spec)
+sys.modules["region_archive"] = region_archive
+spec.loader.exec_module(region_archive)
+
+
+HEADER = ["Mtp", "DMV", "Lumi", "Best_Individual", "Best_ATLAS", "Best_CMS", "Best_Combined", "Overall_Best"]
+HEADER_LONG = HEADER[:3] + ["Scenario"] + HEADER[3:]
+# Decision mode: exclusion status only, see decide_point
+HEADER_DECISION = ["Mtp", "DMV", "Lumi", "Scenario", "Excluded", "Method", "r_Decisive", "Candidate", "Fits"]
+# Bootstrap mode: spread of Overall_Best under the signal MC uncertainty, see bootstrap_point
+HEADER_BOOTSTRAP = ["Mtp", "DMV", "Lumi", "Scenario", "Overall_Best", "r_Mean", "r_Std", "r_P16", "r_P84",
+                    "P_Excluded", "Top_Candidate", "Top_Win_Frac", "Winners"]
+HEADER_WINS = ["Mtp", "DMV", "Lumi", "Scenario", "Candidate", "Win_Frac"]
+# Cross-section mode: sigma95 in fb of the Best_* selections, see xsec_limit_point
+HEADER_XSEC = HEADER_LONG + ["Sigma_fb", "LAE_Best"]
+
 
 def load_signal_regions_from_file(file_path):
+    if isinstance(file_path, region_archive.ArchiveMember):
+        return pd.read_csv(io.BytesIO(file_path.read_bytes()), sep="\t")
     return pd.read_csv(file_path, sep="\t")
 
 
+def find_filtered_regions(root_dir):
+    """
+    */filtered_regions.txt of every point in root_dir, a folder or a zip/tar
+    archive of one (read in place, see region_archive.RegionArchive).
+    """
+    if region_archive.is_archive(root_dir):
+        return region_archive.RegionArchive(root_dir).members()
+    return list(Path(root_dir).glob("*/filtered_regions.txt"))
+
+
 def extract_mtp_dmv(folder_name):
     match = re.match(r"fpvdm_(\d+)DMV([0-9]+(?:\.[0-9]+)?)", folder_name)
 #    print(match)
@@ -27,90 +75,548 @@ def extract_mtp_dmv(folder_name):
     return None, None
 
 
-def process_all_filtered_regions(root_dir="filtered_regions", lumi_factor=1):
+def process_all_filtered_regions(root_dir="filtered_regions", lumi_factor=1, profile=None,
+                                 cache_dir=".result_cache", scenarios=("stat",), output=None):
+    """
+    Find the best single SR, ATLAS, CMS and ATLAS+CMS combinations for every
+    model point and write them to summary_results.txt.
+
+    Args:
+        root_dir (str): Folder with */filtered_regions.txt files, or a zip/tar archive of it
+        lumi_factor (float or list of float): Luminosity scaling factor(s)
+        profile (PipelineProfile or None): If given, pyhf calls are counted, the
+            pipeline stages are timed per model point and the profile is written
+            next to the output file as <output>.profile.jsonl
+        cache_dir (str or None): Each point's row is stored here as soon as it is
+            computed, keyed by a hash of its filtered_regions.txt, lumi_factor,
+            scenario and combine_signal_regions.ENGINE_SETTINGS; re-runs only
+            recompute points whose inputs changed. None disables the cache.
+        scenarios (list of str): Keys of combine_signal_regions.SYST_SCENARIOS
+        output (str or None): Output file. Defaults to summary_results.txt for a
+            single lumi factor with the "stat" scenario, otherwise to the
+            long-format summary_results_long.txt (one row per point, lumi
+            factor and scenario, with an extra Scenario column)
+    """
+    lumi_factors = list(lumi_factor) if np.ndim(lumi_factor) else [lumi_factor]
+    scenarios = list(scenarios)
+    long_format = len(lumi_factors) > 1 or scenarios != ["stat"]
+    if output is None:
+        output = "summary_results_long.txt" if long_format else "summary_results.txt"
+    profile_output = os.path.splitext(output)[0] + ".profile.jsonl"
+
+    if profile is not None:
+        stage = profile.stage
+        count = profile.count
+        hooks = pipeline_profile.instrument_pyhf(profile)
+    else:
+        stage = lambda name: nullcontext()
+        count = lambda counter, n=1: None
+        hooks = nullcontext()
+
     results = []
-    header = ["Mtp", "DMV", "Lumi", "Best_Individual", "Best_ATLAS", "Best_CMS", "Best_Combined", "Overall_Best"]
-    print("\t".join(header))
-    for path in Path("filtered_regions").glob("*/filtered_regions.txt"):
+    print("\t".join(HEADER_LONG if long_format else HEADER))
+    with hooks:
+        for path in find_filtered_regions(root_dir):
+            point = profile.point(path.parent.name, lumi=lumi_factors, scenarios=scenarios) \
+                if profile is not None else nullcontext()
+            with point:
+                rows = process_point_scenarios(path, lumi_factors, scenarios, stage, count, cache_dir)
+            for (k, scenario), row in rows.items():
+                if row is None:
+                    continue
+                if long_format:
+                    row = row[:3] + [scenario] + row[3:]
+                print("\t".join(row))
+                results.append(row)
+
+    with stage("write"):
+        write_summary(results, long_format, output)
+    print(f"\nResults written to {output}")
+
+    if profile is not None:
+        profile.write_jsonl(profile_output)
+        profile.summary()
+        print(f"Profile written to {profile_output}")
+
+
+def write_summary(rows, long_format, output):
+    """
+    Sort formatted rows (HEADER, or HEADER_LONG if long_format) by model point
+    and replace `output` with them atomically.
+    """
+    df_out = pd.DataFrame(rows, columns=HEADER_LONG if long_format else HEADER)
+    if long_format:
+        df_out.sort_values(["Mtp", "DMV", "Lumi", "Scenario"], inplace=True, kind="stable")
+    else:
+        df_out.sort_values(["Mtp", "DMV"], inplace=True)
+    result_cache.write_atomic(output, df_out.to_csv(sep="\t", index=False))
+
+
+def process_point_scenarios(path, lumi_factors, scenarios, stage, count, cache_dir=None):
+    """
+    Evaluate one filtered_regions.txt for every (lumi factor, scenario) pair.
+    The SR groups are enumerated once and reused for all pairs; pairs found in
+    cache_dir are not recomputed.
+
+    Returns:
+        Dict {(lumi_factor, scenario): formatted summary row or None}
+    """
+    rows = {}
+    keys = {}
+    for k in lumi_factors:
+        for scenario in scenarios:
+            rows[(k, scenario)] = None
+            if cache_dir is None:
+                continue
+            key = result_cache.cache_key(path, k, combine_signal_regions.ENGINE_SETTINGS,
+                                         extra=json.dumps(combine_signal_regions.SYST_SCENARIOS[scenario]))
+            keys[(k, scenario)] = key
+            cached = result_cache.load(cache_dir, key)
+            if cached is not None:
+                count("cache_hits")
+                rows[(k, scenario)] = cached["row"]
+
+    missing = [pair for pair, row in rows.items() if row is None]
+    if not missing:
+        return rows
+
+    with stage("load"):
+        df = load_signal_regions_from_file(path)
+    if df.empty:
+        return rows
+
+    with stage("slice"):
+        atlas_masks, cms_masks = combine_signal_regions.enumerate_candidates(df)
+    mtp, dmv = extract_mtp_dmv(path.parent.name)
+    for k, scenario in missing:
+        values = evaluate_candidates(df, atlas_masks, cms_masks, k, scenario, stage, count)
+        row = [mtp, dmv, k] + values
+        row = [f"{x:.4g}" if isinstance(x, float) else str(x) for x in row]
+        rows[(k, scenario)] = row
+        if cache_dir is not None:
+            result_cache.store(cache_dir, keys[(k, scenario)], {"point": path.parent.name, "row": row})
+    return rows
+
+
+def process_point(path, lumi_factor, stage=None, count=None, scenario="stat"):
+    """
+    Evaluate one filtered_regions.txt; returns the formatted summary row
+    (see process_all_filtered_regions) or None if the file has no SRs.
+    """
+    if stage is None:
+        stage = lambda name: nullcontext()
+    if count is None:
+        count = lambda counter, n=1: None
+    return process_point_scenarios(path, [lumi_factor], [scenario], stage, count)[(lumi_factor, scenario)]
+
+
+def evaluate_candidates(df, atlas_masks, cms_masks, lumi_factor, scenario="stat", stage=None, count=None):
+    """
+    r_exp_cons of every single SR and candidate group for one lumi factor and
+    scenario. Candidates are rows of boolean masks over pre-extracted s, ds, b,
+    db arrays (see combine_signal_regions.enumerate_candidates), evaluated with
+    combine_signal_regions.combine_masks.
+
+    Returns:
+        [Best_Individual, Best_ATLAS, Best_CMS, Best_Combined, Overall_Best]
+    """
+    if stage is None:
+        stage = lambda name: nullcontext()
+    if count is None:
+        count = lambda counter, n=1: None
+
+    yields = [df[col].to_numpy(dtype=float) for col in ('s', 'ds', 'b', 'db')]
+
+    def masks_r(masks):
+        count("combinations", len(masks))
+        if len(masks) == 0:
+            return np.empty(0)
+        return combine_signal_regions.combine_masks(*yields, masks, lumi_factor, scenario)
+
+    with stage("fit_single"):
+        global_max_r, _ = combine_signal_regions.best_of(masks_r(np.eye(len(df), dtype=bool)))
+
+    with stage("fit_atlas"):
+        best_atlas_r, i_atlas = combine_signal_regions.best_of(masks_r(atlas_masks))
+
+    with stage("fit_cms"):
+        best_cms_r, i_cms = combine_signal_regions.best_of(masks_r(cms_masks))
+
+    with stage("fit_combined"):
+        combined = np.zeros(len(df), dtype=bool)
+        if i_atlas is not None:
+            combined |= atlas_masks[i_atlas]
+        if i_cms is not None:
+            combined |= cms_masks[i_cms]
+        best_comb_r = masks_r(combined[None, :])[0]
+    overall_best = max(global_max_r, best_atlas_r, best_cms_r, best_comb_r)
+
+    return [global_max_r, best_atlas_r, best_cms_r, best_comb_r, overall_best]
+
+
+def decide_point(df, atlas_masks, cms_masks, lumi_factor, scenario="stat", margin=0.1, hint=None, count=None):
+    """
+    Decide only whether a point is excluded (Overall_Best > 1), with as few
+    limit computations as possible.
+
+    Single SRs and ATLAS/CMS candidates get a cheap upper bound on r
+    (combine_signal_regions.r_upper_bound_masks). Candidates whose bound is
+    below 1 are never fitted; the rest are fitted best-first (the SR set that
+    decided the neighbouring point, `hint`, first, then by decreasing bound)
+    and the search stops at the first r > 1 + margin. If every ATLAS x CMS
+    union is also bounded below 1 the point is not excluded; otherwise the
+    remaining ATLAS/CMS candidates and Best_Combined are computed as in
+    evaluate_candidates.
+
+    Returns:
+        (excluded, method, r_decisive, candidate SR labels, fits); r_decisive
+        is the r or bound that settled the point, NOT the maximal r
+    """
+    if count is None:
+        count = lambda counter, n=1: None
+    yields = [df[col].to_numpy(dtype=float) for col in ('s', 'ds', 'b', 'db')]
+    labels = (df['analysis'] + ":" + df['sr'].astype(str)).to_numpy()
+    memo = {}
+
+    def mask_r(mask):
+        key = mask.tobytes()
+        if key not in memo:
+            count("combinations")
+            memo[key] = combine_signal_regions.combine_masks(*yields, mask[None, :], lumi_factor, scenario)[0]
+        return memo[key]
+
+    def label(mask):
+        return "+".join(labels[mask])
+
+    candidates = np.concatenate([np.eye(len(df), dtype=bool), atlas_masks, cms_masks])
+    bounds = combine_signal_regions.r_upper_bound_masks(*yields, candidates, lumi_factor, scenario)
+    unions = (atlas_masks[:, None, :] | cms_masks[None, :, :]).reshape(-1, len(df))
+    union_bound = combine_signal_regions.r_upper_bound_masks(*yields, unions, lumi_factor, scenario).max(initial=-1)
+
+    hinted = np.array([hint is not None and label(m) == hint for m in candidates])
+    order = np.lexsort((-bounds, ~hinted))
+    best_r, best_mask = -1, None
+    for i in order:
+        if bounds[i] < 1:
+            continue
+        r = mask_r(candidates[i])
+        if r > best_r:
+            best_r, best_mask = r, candidates[i]
+        if r > 1 + margin:
+            return True, "r>1+margin", r, label(candidates[i]), len(memo)
+
+    if best_r > 1:
+        return True, "r>1", best_r, label(best_mask), len(memo)
+    if union_bound < 1:
+        max_bound = max(bounds.max(initial=-1), union_bound)
+        return False, "bound<1", max_bound, "", len(memo)
+
+    # Undecided: Best_Combined needs the best ATLAS and best CMS candidates
+    best_atlas = max(atlas_masks, key=mask_r, default=None)
+    best_cms = max(cms_masks, key=mask_r, default=None)
+    combined = np.zeros(len(df), dtype=bool)
+    for best in (best_atlas, best_cms):
+        if best is not None and mask_r(best) > -1:
+            combined |= best
+    r = mask_r(combined)
+    if r > best_r:
+        best_r, best_mask = r, combined
+    return bool(best_r > 1), "full", best_r, label(best_mask) if best_mask is not None else "", len(memo)
+
+
+def decide_all_filtered_regions(root_dir="filtered_regions", lumi_factors=(1,), scenarios=("stat",), margin=0.1,
+                                output="summary_decision.txt"):
+    """
+    Exclusion status of every point (see decide_point), written to `output`
+    with HEADER_DECISION. Points are visited in (Mtp, DMV) order and each one
+    starts from the SR set that decided its nearest already-decided neighbour.
+    """
+    print("Decision mode: reports excluded yes/no only; r_Decisive is the value that settled each point, "
+          "not the maximal r (run without --decide for Best_* values)")
+    paths = []
+    for path in find_filtered_regions(root_dir):
+        mtp, dmv = extract_mtp_dmv(path.parent.name)
+        if mtp is not None:
+            paths.append((mtp, dmv, path))
+    paths.sort()
+    mtp_scale = max(np.ptp([p[0] for p in paths]), 1) if paths else 1
+    dmv_scale = max(np.ptp([p[1] for p in paths]), 1e-12) if paths else 1
+
+    rows = []
+    total_fits = 0
+    print("\t".join(HEADER_DECISION))
+    for k in lumi_factors:
+        for scenario in scenarios:
+            decided = []
+            for mtp, dmv, path in paths:
+                df = load_signal_regions_from_file(path)
+                if df.empty:
+                    continue
+                hint = None
+                if decided:
+                    nearest = min(decided, key=lambda d: ((d[0] - mtp) / mtp_scale)**2 + ((d[1] - dmv) / dmv_scale)**2)
+                    hint = nearest[2]
+                atlas_masks, cms_masks = combine_signal_regions.enumerate_candidates(df)
+                excluded, method, r, candidate, fits = decide_point(df, atlas_masks, cms_masks, k, scenario, margin, hint)
+                total_fits += fits
+                if candidate:
+                    decided.append((mtp, dmv, candidate))
+                row = [str(mtp), str(dmv), str(k), scenario, str(int(excluded)), method, f"{r:.4g}", candidate, str(fits)]
+                print("\t".join(row))
+                rows.append(row)
+
+    df_out = pd.DataFrame(rows, columns=HEADER_DECISION)
+    result_cache.write_atomic(output, df_out.to_csv(sep="\t", index=False))
+    print(f"\nExclusion status written to {output} ({total_fits} limit computations)")
+
+
+def load_xsec(path):
+    """
+    Production cross sections of calchep_xsec.py's table as {(Mtp, DMV):
+    sigma_fb}, DMV rounded to 3 digits (from MV if the scan used MV). Of
+    several runs at one (Mtp, DMV), e.g. different DM, the first is used.
+    """
+    table = pd.read_csv(path, sep="\t")
+    table = table.dropna(subset=["sigma_fb"]) if "sigma_fb" in table else table
+    if "DMV" not in table:
+        table["DMV"] = 1 - table["MV"] / table["Mtp"]
+    keys = list(zip(table["Mtp"].round().astype(int), table["DMV"].round(3)))
+    xsec = {}
+    for key, sigma in zip(keys, table["sigma_fb"]):
+        xsec.setdefault(key, float(sigma))
+    if len(xsec) < len(keys):
+        print(f"Warning: {len(keys) - len(xsec)} runs in {path} share (Mtp, DMV) with another, first one used")
+    return xsec
+
+
+def xsec_limit_point(df, atlas_masks, cms_masks, lumi_factor, scenario, sigma_fb):
+    """
+    Expected 95% CL upper limits on the production cross section for the
+    selections of evaluate_candidates (best single SR, ATLAS and CMS
+    candidate, their union and the overall best, each chosen by r_exp_cons):
+    sigma95 = s95exp / (L x A x eps), with L x A x eps = s / sigma_fb the
+    selection's signal events per fb (each analysis at its own luminosity,
+    times lumi_factor). The s95exp are the engine's, one masks_s95exp pass
+    over all candidates and one for the union, as in the r computation.
+
+    Returns:
+        ([sigma95 of Best_Individual ... Overall_Best], L x A x eps of the
+        overall best); NaN where a selection has no candidate
+    """
+    s, ds, b, db = combine_signal_regions.scale_yields(*[df[col].to_numpy(dtype=float) for col in ('s', 'ds', 'b', 'db')],
+                                                       lumi_factor, scenario)
+    groups = [np.eye(len(df), dtype=bool), atlas_masks, cms_masks]
+    masks = np.concatenate(groups)
+    s95 = combine_signal_regions.masks_s95exp(b, db, masks)
+    total_s = np.where(masks, s, 0.0).sum(axis=1)
+
+    chosen = []
+    start = 0
+    for group in groups:
+        r = total_s[start:start + len(group)] / s95[start:start + len(group)]
+        _, i = combine_signal_regions.best_of(r)
+        chosen.append(None if i is None else start + i)
+        start += len(group)
+
+    union = np.zeros(len(df), dtype=bool)
+    for i in chosen[1:]:
+        if i is not None:
+            union |= masks[i]
+    selections = [(total_s[i], s95[i]) if i is not None else (np.nan, np.nan) for i in chosen]
+    selections.append((s[union].sum(), combine_signal_regions.masks_s95exp(b, db, union[None, :])[0])
+                      if union.any() else (np.nan, np.nan))
+
+    lae = np.array([n for n, _ in selections]) / sigma_fb
+    sigma95 = np.array([limit for _, limit in selections]) / lae
+    sigma95[~(sigma95 > 0)] = np.nan
+    best = int(np.nanargmin(sigma95)) if np.isfinite(sigma95).any() else None
+    overall = sigma95[best] if best is not None else np.nan
+    return list(sigma95) + [overall], (lae[best] if best is not None else np.nan)
+
+
+def xsec_limits_all_filtered_regions(root_dir="filtered_regions", xsec_file="calchep_xsec.txt", lumi_factors=(1,),
+                                     scenarios=("stat",), output="summary_xsec95.txt"):
+    """
+    sigma95 maps (see xsec_limit_point) of every point with a cross section in
+    xsec_file, written to `output` with HEADER_XSEC: the Best_* columns hold
+    sigma95 in fb instead of r_exp_cons, so load_data of the contour plotters
+    reads the table as it is.
+    """
+    xsec = load_xsec(xsec_file)
+    rows = []
+    missing = 0
+    print("\t".join(HEADER_XSEC))
+    for path in find_filtered_regions(root_dir):
+        mtp, dmv = extract_mtp_dmv(path.parent.name)
+        sigma = xsec.get((mtp, round(dmv, 3))) if mtp is not None else None
+        if sigma is None:
+            missing += 1
+            continue
         df = load_signal_regions_from_file(path)
         if df.empty:
             continue
+        atlas_masks, cms_masks = combine_signal_regions.enumerate_candidates(df)
+        for k in lumi_factors:
+            for scenario in scenarios:
+                sigma95, lae = xsec_limit_point(df, atlas_masks, cms_masks, k, scenario, sigma)
+                row = [mtp, dmv, k, scenario] + sigma95 + [sigma, lae]
+                row = [f"{x:.4g}" if isinstance(x, float) else str(x) for x in row]
+                print("\t".join(row))
+                rows.append(row)
+
+    df_out = pd.DataFrame(rows, columns=HEADER_XSEC)
+    df_out.sort_values(["Mtp", "DMV", "Lumi", "Scenario"], inplace=True, kind="stable")
+    result_cache.write_atomic(output, df_out.to_csv(sep="\t", index=False))
+    if missing:
+        print(f"{missing} points without a cross section in {xsec_file} skipped")
+    print(f"\nsigma95 [fb] written to {output}")
+
+
+def bootstrap_point(df, atlas_masks, cms_masks, lumi_factor, scenario="stat", replicas=1000, seed=0, batch=10000):
+    """
+    Propagate the signal MC uncertainty into Overall_Best: s of every SR is
+    resampled as max(s + ds * N(0, 1), 0) and the selection of
+    evaluate_candidates (best single SR, best ATLAS and best CMS candidate,
+    and their union) is repeated on each replica.
 
-        def combo_r(sr_list):
-            payload = [
-                {'s0': row['s'], 'ds0': row['ds'], 'b0': row['b'], 'db0': row['db']} for _, row in sr_list.iterrows()
-            ]
-            return combine_signal_regions.combine_signal_regions(payload, [lumi_factor])[0]['r_exp_cons']
-
-#        best_single_row = df.loc[df['rexpcons'].idxmax()]
-#        global_max_r = best_single_row['rexpcons']
-
-        best_single_r = -1
-        for _, row in df.iterrows():
-    	    payload = [{'s0': row['s'], 'ds0': row['ds'], 'b0': row['b'], 'db0': row['db']}]
-    	    r_val = combine_signal_regions.combine_signal_regions(payload, [lumi_factor])[0]['r_exp_cons']
-    	    if r_val > best_single_r:
-                best_single_r = r_val
-        global_max_r = best_single_r
-
-
-
-
-
-        best_atlas_r = -1
-        best_atlas_combo = pd.DataFrame()
-        atlas_2004 = df[df['analysis'] == 'atlas_2004_14060']
-        atlas_2101 = df[df['analysis'] == 'atlas_2101_01629']
-        atlas_2211 = df[df['analysis'] == 'atlas_2211_08028']
-        atlas_2211_0lep = atlas_2211[atlas_2211['sr'].isin(['SR-Gtb-C','SR-Gtb-M','SR-Gtb-B','SR-Gbb-C','SR-Gbb-M','SR-Gtt-0L-B'])]
-        atlas_2211_1lep = atlas_2211[atlas_2211['sr'].str.startswith('SR-Gtt-1L')]
-        atlas_combos = []
-        if not atlas_2004.empty: atlas_combos.append(atlas_2004)
-        if not atlas_2101.empty: atlas_combos.append(atlas_2101)
-        if not atlas_2211_0lep.empty and not atlas_2211_1lep.empty:
-            for i in atlas_2211_0lep.index:
-                for j in atlas_2211_1lep.index:
-                    atlas_combos.append(df.loc[[i, j]])
-        grouped_atlas = set(atlas_2004.index).union(atlas_2101.index).union(atlas_2211.index)
-        for i in df[(df['analysis'].str.startswith('atlas_')) & (~df.index.isin(grouped_atlas))].index:
-            atlas_combos.append(df.loc[[i]])
-        for combo in atlas_combos:
-            r = combo_r(combo)
-            if r > best_atlas_r:
-                best_atlas_r = r
-                best_atlas_combo = combo
-
-        best_cms_r = -1
-        best_cms_combo = pd.DataFrame()
-        cms_1908 = df[df['analysis'] == 'cms_1908_04722']
-        cms_sus = df[df['analysis'] == 'cms_sus_19_005']
-        cms_combos = []
-        if not cms_1908.empty: cms_combos.append(cms_1908)
-        if not cms_sus.empty: cms_combos.append(cms_sus)
-        grouped_cms = set(cms_1908.index).union(cms_sus.index)
-        for i in df[(df['analysis'].str.startswith('cms_')) & (~df.index.isin(grouped_cms))].index:
-            cms_combos.append(df.loc[[i]])
-        for combo in cms_combos:
-            r = combo_r(combo)
-            if r > best_cms_r:
-                best_cms_r = r
-                best_cms_combo = combo
-
-        combined = pd.concat([best_atlas_combo, best_cms_combo])
-        best_comb_r = combo_r(combined)
-        overall_best = max(global_max_r, best_atlas_r, best_cms_r, best_comb_r)
+    s95exp depends on b and db only, so it is computed once per single SR and
+    candidate, and once per ATLAS x CMS union that wins in some replica; the
+    replicas themselves are matrix products over `batch` rows at a time.
 
+    Returns:
+        (nominal Overall_Best, array of the replicas' Overall_Best,
+        dict {winning SR labels: replicas won})
+    """
+    n = len(df)
+    s, ds, b, db = combine_signal_regions.scale_yields(*[df[col].to_numpy(dtype=float) for col in ('s', 'ds', 'b', 'db')],
+                                                       lumi_factor, scenario)
+    labels = (df['analysis'] + ":" + df['sr'].astype(str)).to_numpy()
+    single = np.eye(n, dtype=bool)
+    # An all-False row stands in for an empty ATLAS or CMS list, as in evaluate_candidates
+    atlas = atlas_masks if len(atlas_masks) else np.zeros((1, n), dtype=bool)
+    cms = cms_masks if len(cms_masks) else np.zeros((1, n), dtype=bool)
+    s95_single, s95_atlas, s95_cms = (combine_signal_regions.masks_s95exp(b, db, m) if len(m) else np.empty(0)
+                                      for m in (single, atlas_masks, cms_masks))
+    s95_union = {}
+
+    def best(r, width):
+        if width == 0:
+            return np.full(len(r), -1.0), np.zeros(len(r), dtype=int)
+        i = np.argmax(r, axis=1)
+        return r[np.arange(len(r)), i], i
+
+    def select(sample):
+        """Overall_Best of each row of sample (replicas, n) and the mask that gave it."""
+        r_single, i_single = best(sample / s95_single, n)
+        r_atlas, i_atlas = best(sample @ atlas_masks.T / s95_atlas, len(atlas_masks))
+        r_cms, i_cms = best(sample @ cms_masks.T / s95_cms, len(cms_masks))
+        pairs = i_atlas * len(cms) + i_cms
+        for pair in np.unique(pairs):
+            if pair not in s95_union:
+                s95_union[pair] = combine_signal_regions.masks_s95exp(b, db, atlas[pair // len(cms)] | cms[pair % len(cms)])[0]
+        union = atlas[i_atlas] | cms[i_cms]
+        r_union = (sample * union).sum(axis=1) / np.array([s95_union[p] for p in pairs])
+        r_all = np.column_stack([r_single, r_atlas, r_cms, r_union])
+        which = np.argmax(r_all, axis=1)
+        winner = np.choose(which[:, None], [single[i_single], atlas[i_atlas], cms[i_cms], union])
+        return r_all[np.arange(len(r_all)), which], winner
+
+    nominal, _ = select(s[None, :])
+    rng = np.random.default_rng([seed, zlib.crc32("|".join(labels).encode()), zlib.crc32(repr(float(lumi_factor)).encode())])
+    overall = np.empty(replicas)
+    wins = {}
+    for start in range(0, replicas, batch):
+        size = min(batch, replicas - start)
+        sample = np.maximum(s + ds * rng.standard_normal((size, n)), 0.0)
+        overall[start:start + size], winner = select(sample)
+        masks, counts = np.unique(winner, axis=0, return_counts=True)
+        for mask, c in zip(masks, counts):
+            key = "+".join(labels[mask])
+            wins[key] = wins.get(key, 0) + int(c)
+    return float(nominal[0]), overall, wins
+
+
+def bootstrap_all_filtered_regions(root_dir="filtered_regions", lumi_factors=(1,), scenarios=("stat",), replicas=1000,
+                                   seed=0, output="summary_bootstrap.txt"):
+    """
+    bootstrap_point for every point: mean, standard deviation, 16/84%
+    quantiles and exclusion probability of Overall_Best go to `output`
+    (HEADER_BOOTSTRAP), the win frequency of every SR combination that was
+    ever best to <output>_wins.txt (HEADER_WINS).
+    """
+    rows = []
+    win_rows = []
+    print("\t".join(HEADER_BOOTSTRAP))
+    for path in find_filtered_regions(root_dir):
+        df = load_signal_regions_from_file(path)
+        if df.empty:
+            continue
         mtp, dmv = extract_mtp_dmv(path.parent.name)
-        row = [mtp, dmv, lumi_factor, global_max_r, best_atlas_r, best_cms_r, best_comb_r, overall_best]
-        formatted_row = [f"{x:.4g}" if isinstance(x, float) else str(x) for x in row]
-        print("\t".join(formatted_row))
-        results.append(formatted_row)
+        atlas_masks, cms_masks = combine_signal_regions.enumerate_candidates(df)
+        for k in lumi_factors:
+            for scenario in scenarios:
+                nominal, overall, wins = bootstrap_point(df, atlas_masks, cms_masks, k, scenario, replicas, seed)
+                ranked = sorted(wins.items(), key=lambda item: -item[1])
+                p16, p84 = np.percentile(overall, [16, 84])
+                row = [str(mtp), str(dmv), str(k), scenario] + \
+                      [f"{x:.4g}" for x in (nominal, overall.mean(), overall.std(), p16, p84, np.mean(overall > 1))] + \
+                      [ranked[0][0], f"{ranked[0][1] / replicas:.4g}", str(len(ranked))]
+                print("\t".join(row))
+                rows.append(row)
+                win_rows.extend([str(mtp), str(dmv), str(k), scenario, label, f"{c / replicas:.4g}"] for label, c in ranked)
 
-    df_out = pd.DataFrame(results, columns=header)
-    df_out.sort_values(["Mtp", "DMV"], inplace=True)
-    df_out.to_csv("summary_results.txt", sep="\t", index=False)
-    print("\nResults written to summary_results.txt")
+    df_out = pd.DataFrame(rows, columns=HEADER_BOOTSTRAP)
+    df_out.sort_values(["Mtp", "DMV", "Lumi", "Scenario"], inplace=True, kind="stable")
+    result_cache.write_atomic(output, df_out.to_csv(sep="\t", index=False))
+    wins_output = os.path.splitext(output)[0] + "_wins.txt"
+    df_wins = pd.DataFrame(win_rows, columns=HEADER_WINS)
+    df_wins.sort_values(["Mtp", "DMV", "Lumi", "Scenario"], inplace=True, kind="stable")
+    result_cache.write_atomic(wins_output, df_wins.to_csv(sep="\t", index=False))
+    print(f"\nBootstrap ({replicas} replicas) written to {output} and {wins_output}")
 
 
 if __name__ == "__main__":
-    process_all_filtered_regions("filtered_regions", lumi_factor=1)
+    parser = argparse.ArgumentParser(description="Best SR combinations for every point in filtered_regions/")
+    parser.add_argument("--root", default="filtered_regions",
+                        help="folder with */filtered_regions.txt, or a zip/tar archive of it")
+    parser.add_argument("--profile", action="store_true",
+                        help="count pyhf fits, time each stage and write summary_results.profile.jsonl")
+    parser.add_argument("--no-cache", action="store_true", help="recompute every point, ignore .result_cache/")
+    parser.add_argument("--lumi", type=lambda x: float(Fraction(x)), nargs="+", default=[1],
+                        help="luminosity factor(s), e.g. --lumi 1 3000/139 for LHC and HL-LHC in one pass")
+    parser.add_argument("--scenario", nargs="+", default=["stat"],
+                        choices=sorted(combine_signal_regions.SYST_SCENARIOS),
+                        help="background-systematics scaling scenario(s)")
+    parser.add_argument("--output", default=None, help="output table (default depends on --lumi/--scenario)")
+    parser.add_argument("--engine", choices=["pyhf", "native"], default="pyhf",
+                        help="s95exp engine: pyhf (reference) or the vectorised native_cls.py solver")
+    parser.add_argument("--toys-below", type=float, default=0.0, metavar="B",
+                        help="use toy-MC CLs for SRs with background below B events")
+    parser.add_argument("--toy-workers", type=int, default=os.cpu_count(), help="processes for the toys")
+    parser.add_argument("--decide", type=float, nargs="?", const=0.1, default=None, metavar="MARGIN",
+                        help="decision mode: only excluded yes/no, stop at the first r > 1 + MARGIN (default 0.1)")
+    parser.add_argument("--bootstrap", type=int, nargs="?", const=1000, default=None, metavar="REPLICAS",
+                        help="resample s within ds and report the spread of Overall_Best and how often "
+                             "each SR combination wins (default 1000 replicas)")
+    parser.add_argument("--seed", type=int, default=0, help="bootstrap: random seed")
+    parser.add_argument("--xsec", nargs="?", const="calchep_xsec.txt", default=None, metavar="TABLE",
+                        help="write sigma95 [fb] instead of r, with cross sections from calchep_xsec.py's TABLE")
+    args = parser.parse_args()
+
+    combine_signal_regions.set_engine(args.engine)
+    combine_signal_regions.set_toys(args.toys_below, workers=args.toy_workers)
+    lumi_factor = [int(k) if k == int(k) else k for k in args.lumi]
+    if args.xsec is not None:
+        xsec_limits_all_filtered_regions(args.root, args.xsec, lumi_factor, args.scenario,
+                                         output=args.output or "summary_xsec95.txt")
+    elif args.bootstrap is not None:
+        bootstrap_all_filtered_regions(args.root, lumi_factor, args.scenario, args.bootstrap, args.seed,
+                                       output=args.output or "summary_bootstrap.txt")
+    elif args.decide is not None:
+        decide_all_filtered_regions(args.root, lumi_factor, args.scenario, args.decide,
+                                    output=args.output or "summary_decision.txt")
+    else:
+        profile = pipeline_profile.PipelineProfile() if args.profile else None
+        cache_dir = None if args.no_cache else ".result_cache"
+        process_all_filtered_regions(args.root, lumi_factor=lumi_factor if len(lumi_factor) > 1 else lumi_factor[0],
+                                     profile=profile, cache_dir=cache_dir, scenarios=args.scenario, output=args.output)
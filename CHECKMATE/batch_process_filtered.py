@@ -1,5 +1,6 @@
 
 import pandas as pd
+import numpy as np
 from pathlib import Path
 import importlib.util
 import sys
@@ -16,59 +17,33 @@ def load_signal_regions_from_file(file_path):
     return pd.read_csv(file_path, sep="\t")
 
 
-def combo_r(sr_list, lumi_factor):
-    payload = [{'s0': row['s'], 'ds0': row['ds'], 'b0': row['b'], 'db0': row['db']} for _, row in sr_list.iterrows()]
-    return combine_signal_regions.combine_signal_regions(payload, [lumi_factor])[0]['r_exp_cons']
+def yields_of(df):
+    return [df[col].to_numpy(dtype=float) for col in ('s', 'ds', 'b', 'db')]
+
+
+def masks_r(df, masks, lumi_factor):
+    """r_exp_cons of every combination given as a row of a boolean mask over df."""
+    if len(masks) == 0:
+        return np.empty(0)
+    return combine_signal_regions.combine_masks(*yields_of(df), masks, lumi_factor)
 
 
 def find_best_combination(df, lumi_factor):
-    best_r = -1
-    best_combo = pd.DataFrame()
-    best_atlas_r = -1
-    best_cms_r = -1
-
-    atlas_2004 = df[df['analysis'] == 'atlas_2004_14060']
-    atlas_2101 = df[df['analysis'] == 'atlas_2101_01629']
-    atlas_2211 = df[df['analysis'] == 'atlas_2211_08028']
-    atlas_2211_0lep = atlas_2211[atlas_2211['sr'].isin(['SR-Gtb-C','SR-Gtb-M','SR-Gtb-B','SR-Gbb-C','SR-Gbb-M','SR-Gtt-0L-B'])]
-    atlas_2211_1lep = atlas_2211[atlas_2211['sr'].str.startswith('SR-Gtt-1L')]
-    atlas_combos = []
-    if not atlas_2004.empty: atlas_combos.append(atlas_2004)
-    if not atlas_2101.empty: atlas_combos.append(atlas_2101)
-    if not atlas_2211_0lep.empty and not atlas_2211_1lep.empty:
-        for i in atlas_2211_0lep.index:
-            for j in atlas_2211_1lep.index:
-                atlas_combos.append(df.loc[[i, j]])
-    grouped_atlas = set(atlas_2004.index).union(atlas_2101.index).union(atlas_2211.index)
-    for i in df[(df['analysis'].str.startswith('atlas_')) & (~df.index.isin(grouped_atlas))].index:
-        atlas_combos.append(df.loc[[i]])
-    for combo in atlas_combos:
-        r = combo_r(combo, lumi_factor)
-        if r > best_atlas_r:
-            best_atlas_r = r
-
-    cms_1908 = df[df['analysis'] == 'cms_1908_04722']
-    cms_sus = df[df['analysis'] == 'cms_sus_19_005']
-    cms_combos = []
-    if not cms_1908.empty: cms_combos.append(cms_1908)
-    if not cms_sus.empty: cms_combos.append(cms_sus)
-    grouped_cms = set(cms_1908.index).union(cms_sus.index)
-    for i in df[(df['analysis'].str.startswith('cms_')) & (~df.index.isin(grouped_cms))].index:
-        cms_combos.append(df.loc[[i]])
-    for combo in cms_combos:
-        r = combo_r(combo, lumi_factor)
-        if r > best_cms_r:
-            best_cms_r = r
-
-    for combo_a in atlas_combos:
-        for combo_c in cms_combos:
-            combined = pd.concat([combo_a, combo_c])
-            r = combo_r(combined, lumi_factor)
-            if r > best_r:
-                best_r = r
-                best_combo = combined
-
-    return best_r, best_combo, best_atlas_r, best_cms_r
+    """
+    Best ATLAS-only, CMS-only and ATLAS+CMS combination. Candidates are the
+    boolean masks of combine_signal_regions.enumerate_candidates; only the
+    winning ATLAS+CMS combination is turned back into a DataFrame.
+    """
+    atlas_masks, cms_masks = combine_signal_regions.enumerate_candidates(df)
+    best_atlas_r, _ = combine_signal_regions.best_of(masks_r(df, atlas_masks, lumi_factor))
+    best_cms_r, _ = combine_signal_regions.best_of(masks_r(df, cms_masks, lumi_factor))
+
+    # Every ATLAS candidate with every CMS candidate
+    combined = (atlas_masks[:, None, :] | cms_masks[None, :, :]).reshape(-1, len(df))
+    best_r, best = combine_signal_regions.best_of(masks_r(df, combined, lumi_factor))
+    if best is None:
+        return -1, pd.DataFrame(), best_atlas_r, best_cms_r
+    return best_r, df[combined[best]], best_atlas_r, best_cms_r
 
 
 def process_single_file(file_path, lumi_factor=1):
@@ -77,14 +52,9 @@ def process_single_file(file_path, lumi_factor=1):
         return None
 
     # Recompute best individual SR using current lumi_factor
-    best_single_r = -1
-    best_single_label = ""
-    for _, row in df.iterrows():
-        payload = [{'s0': row['s'], 'ds0': row['ds'], 'b0': row['b'], 'db0': row['db']}]
-        r_val = combine_signal_regions.combine_signal_regions(payload, [lumi_factor])[0]['r_exp_cons']
-        if r_val > best_single_r:
-            best_single_r = r_val
-            best_single_label = f"{row['analysis']}:{row['sr']}"
+    r_single = masks_r(df, np.eye(len(df), dtype=bool), lumi_factor)
+    best_single_r, best = combine_signal_regions.best_of(r_single)
+    best_single_label = f"{df['analysis'].iloc[best]}:{df['sr'].iloc[best]}" if best is not None else ""
     global_max_r = best_single_r
     global_max_label = best_single_label
 
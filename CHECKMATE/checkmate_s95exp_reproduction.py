@@ -1,65 +1,80 @@
 import pyhf
 import numpy as np
+from pathlib import Path
+import importlib.util
+import sys
 
 pyhf.set_backend("numpy", precision="64b")
 
+module_path = Path("limit_client.py").resolve()
+spec = importlib.util.spec_from_file_location("limit_client", module_path)
+limit_client = importlib.util.module_from_spec(spec)
+sys.modules["limit_client"] = limit_client
+spec.loader.exec_module(limit_client)
+
 # CheckMATE .txt input values
 s = 5.2865
 ds = 0.3766
 b = 2.8
 db = 0.9
 
-# Use dummy signal yield = 1.0; actual scaling done later
-spec = {
-    "channels": [{
-        "name": "signal_region",
-        "samples": [
-            {
-                "name": "signal",
-                "data": [1.0],
-                "modifiers": [
-                    {"name": "mu", "type": "normfactor", "data": None}
-                ]
-            },
-            {
-                "name": "background",
-                "data": [b],
-                "modifiers": [
-                    {
-                        "name": "bkg_unc",
-                        "type": "normsys",
-                        "data": {
-                            "hi": 1 + db / b,
-                            "lo": 1 - db / b
+# A running limit_server.py answers with the same model (POI bounds 0-1000
+# instead of 0-30, the same limit below 30) and its memo of earlier limits;
+# otherwise the limit is computed here with pyhf
+if limit_client.available():
+    mu_up = limit_client.compute_r_exp_cons_scaled(s, ds, b, db, [1], df=1)[0]["s95exp"]
+else:
+    # Use dummy signal yield = 1.0; actual scaling done later
+    spec = {
+        "channels": [{
+            "name": "signal_region",
+            "samples": [
+                {
+                    "name": "signal",
+                    "data": [1.0],
+                    "modifiers": [
+                        {"name": "mu", "type": "normfactor", "data": None}
+                    ]
+                },
+                {
+                    "name": "background",
+                    "data": [b],
+                    "modifiers": [
+                        {
+                            "name": "bkg_unc",
+                            "type": "normsys",
+                            "data": {
+                                "hi": 1 + db / b,
+                                "lo": 1 - db / b
+                            }
                         }
-                    }
-                ]
-            }
-        ]
-    }]
-}
+                    ]
+                }
+            ]
+        }]
+    }
 
-model = pyhf.Model(spec, poi_name="mu")
+    model = pyhf.Model(spec, poi_name="mu")
 
-# Asimov dataset using nominal values
-init_pars = model.config.suggested_init()
-asimov_data = model.expected_data(init_pars)
+    # Asimov dataset using nominal values
+    init_pars = model.config.suggested_init()
+    asimov_data = model.expected_data(init_pars)
 
-# ---- Specify bounds to avoid ValueError ----
-# Use wide bounds so that fitting succeeds
-par_bounds = model.config.suggested_bounds()
-par_bounds[0] = (0.0, 30.0)  # POI 'mu' bound
+    # ---- Specify bounds to avoid ValueError ----
+    # Use wide bounds so that fitting succeeds
+    par_bounds = model.config.suggested_bounds()
+    par_bounds[0] = (0.0, 30.0)  # POI 'mu' bound
 
-# Compute upper limit on mu at 95% CL with specified bounds
-mu_up = pyhf.infer.intervals.upper_limits.upper_limit(
-    data=asimov_data,
-    model=model,
-    level=0.05,
-    par_bounds=par_bounds
-)
+    # Compute upper limit on mu at 95% CL with specified bounds
+    mu_up = pyhf.infer.intervals.upper_limits.upper_limit(
+        data=asimov_data,
+        model=model,
+        level=0.05,
+        par_bounds=par_bounds
+    )
 
-if isinstance(mu_up, (list, tuple, np.ndarray)):
-    mu_up = mu_up[0]
+    if isinstance(mu_up, (list, tuple, np.ndarray)):
+        mu_up = mu_up[0]
 
 # Compute s95exp and CheckMATE-style r-value (conservative)
 s95exp = mu_up
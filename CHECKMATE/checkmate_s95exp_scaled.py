@@ -1,8 +1,20 @@
 import pyhf
 import numpy as np
+from pathlib import Path
+import importlib.util
+import sys
 
 pyhf.set_backend("numpy", precision="64b")
 
+# A running limit_server.py fits the same model (POI bounds 0-1000, 95% CL)
+# with its memo of earlier limits; without one pyhf is run here
+module_path = Path("limit_client.py").resolve()
+spec = importlib.util.spec_from_file_location("limit_client", module_path)
+limit_client = importlib.util.module_from_spec(spec)
+sys.modules["limit_client"] = limit_client
+spec.loader.exec_module(limit_client)
+USE_SERVER = limit_client.available()
+
 # CheckMATE .txt input values
 s = 5.2865
 ds = 0.3766
@@ -94,6 +106,9 @@ def compute_r_exp_cons_scaled(s0, ds0, b0, db0, lumi_factors):
     Returns:
         List of dicts with results for each luminosity factor
     """
+    if USE_SERVER:
+        return limit_client.compute_r_exp_cons_scaled(s0, ds0, b0, db0, lumi_factors, df=1)
+
     results = []
 
     for k in lumi_factors:
@@ -1,21 +1,153 @@
 import pandas as pd
 import numpy as np
 import os
+import re
+import argparse
+
+# Below this s/b the closed forms cancel catastrophically; use the series instead
+SMALL_SB = 1e-4
+
 
 def asimov_significance(s, b):
-    if b <= 0:
-        return 0.0
-    if s <= 0:
-        return 0.0
-    return np.sqrt(2 * ((s + b) * np.log(1 + s / b) - s))
+    """
+    Median discovery significance Z_A = sqrt(2((s+b) ln(1+s/b) - s)).
+
+    Works on scalars or NumPy arrays. Evaluated as b*((1+x)log1p(x) - x) with
+    x = s/b, switching to the series x^2/2 - x^3/6 + x^4/12 for s << b.
+    Entries with b <= 0 or s <= 0 give 0.
+    """
+    s, b = np.broadcast_arrays(np.asarray(s, dtype=float), np.asarray(b, dtype=float))
+    valid = (s > 0) & (b > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = np.where(valid, s / np.where(valid, b, 1.0), 0.0)
+        exact = (1 + x) * np.log1p(x) - x
+        series = x**2 / 2 - x**3 / 6 + x**4 / 12
+        half_z2 = b * np.where(x < SMALL_SB, series, exact)
+    z = np.where(valid, np.sqrt(2 * np.clip(half_z2, 0.0, None)), 0.0)
+    return z if z.ndim else float(z)
+
 
 def cowan_significance(s, b, db):
-    if b <= 0 or db <= 0 or s <= 0:
-        return 0.0
+    """
+    Discovery significance with background uncertainty db (Cowan et al.).
+
+    Works on scalars or NumPy arrays. The logarithms are rewritten as
+    log1p(s b / (b^2 + (s+b) db^2)) and log1p(u)/u, so db -> 0 reduces smoothly
+    to asimov_significance, and s << b uses the series
+    Z^2 = s^2/(b+db^2) - s^3 (b+2db^2) / (3 b (b+db^2)^2).
+    Entries with b <= 0 or s <= 0 give 0.
+    """
+    s, b, db = np.broadcast_arrays(np.asarray(s, dtype=float), np.asarray(b, dtype=float),
+                                   np.asarray(db, dtype=float))
+    valid = (s > 0) & (b > 0)
+    s_ = np.where(valid, s, 1.0)
+    b_ = np.where(valid, b, 1.0)
     sb2 = db**2
-    term1 = (s + b) * np.log(((s + b) * (b + sb2)) / (b**2 + (s + b) * sb2))
-    term2 = (b**2 / sb2) * np.log(1 + (sb2 * s) / (b * (b + sb2)))
-    return np.sqrt(2 * (term1 - term2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        term1 = (s_ + b_) * np.log1p(s_ * b_ / (b_**2 + (s_ + b_) * sb2))
+        u = sb2 * s_ / (b_ * (b_ + sb2))
+        log1p_over_u = np.where(u > 0, np.log1p(u) / np.where(u > 0, u, 1.0), 1.0)
+        term2 = b_ * s_ / (b_ + sb2) * log1p_over_u
+        exact = 2 * (term1 - term2)
+        series = s_**2 / (b_ + sb2) - s_**3 * (b_ + 2 * sb2) / (3 * b_ * (b_ + sb2)**2)
+        z2 = np.where(s_ / b_ < SMALL_SB, series, exact)
+    z = np.where(valid, np.sqrt(np.clip(z2, 0.0, None)), 0.0)
+    return z if z.ndim else float(z)
+
+
+def extract_mtp_dmv(folder_name):
+    match = re.search(r"fpvdm_(?:Mtp)?(\d+)DMV([0-9]+(?:\.[0-9]+)?)", folder_name)
+    if match:
+        return int(match.group(1)), float(match.group(2))
+    return None, None
+
+
+def load_result_tree(base_dir, prefix="fpvdm_", suffix="evaluation/total_results.txt"):
+    """
+    Read every <base_dir>/<prefix>*/<suffix> into one DataFrame with a
+    'point' column naming the source folder.
+    """
+    frames = []
+    for folder in sorted(os.listdir(base_dir)):
+        path = os.path.join(base_dir, folder, suffix)
+        if not folder.startswith(prefix) or not os.path.isfile(path):
+            continue
+        try:
+            df = pd.read_csv(path, sep=r'\s+', comment="#")
+        except Exception as e:
+            print(f"Failed to read {path}: {e}")
+            continue
+        df.insert(0, "point", folder)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["point", "analysis", "sr", "s", "b", "db"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def significance_table(df, lumi_factors):
+    """
+    Z_asimov and Z_cowan for every SR row in df and every luminosity factor in
+    one vectorised pass. Yields scale as in combine_signal_regions.py
+    (s, b -> k s, k b; db -> sqrt(k) db).
+
+    Returns:
+        Long DataFrame with one row per (SR, lumi factor)
+    """
+    k = np.asarray(lumi_factors, dtype=float)[:, None]
+    s = k * df["s"].to_numpy(dtype=float)[None, :]
+    b = k * df["b"].to_numpy(dtype=float)[None, :]
+    db = np.sqrt(k) * df["db"].to_numpy(dtype=float)[None, :]
+
+    z_asimov = asimov_significance(s, b)
+    z_cowan = cowan_significance(s, b, db)
+
+    n_lumi, n_sr = s.shape
+    out = df.loc[np.tile(np.arange(n_sr), n_lumi), ["point", "analysis", "sr"]].reset_index(drop=True)
+    out["Lumi"] = np.repeat(k[:, 0], n_sr)
+    out["s"] = s.ravel()
+    out["b"] = b.ravel()
+    out["db"] = db.ravel()
+    out["Z_asimov"] = z_asimov.ravel()
+    out["Z_cowan"] = z_cowan.ravel()
+    return out
+
+
+def discovery_reach(table):
+    """
+    Best SR per (point, lumi) for each significance definition, i.e. the
+    grid-wide discovery-reach map in the Mtp/DMV layout of summary_results.txt.
+    """
+    groups = table.groupby(["point", "Lumi"], sort=False)
+    best_a = table.loc[groups["Z_asimov"].idxmax().to_numpy()].reset_index(drop=True)
+    best_c = table.loc[groups["Z_cowan"].idxmax().to_numpy()].reset_index(drop=True)
+    mtp_dmv = [extract_mtp_dmv(p) for p in best_a["point"]]
+    reach = pd.DataFrame({
+        "Mtp": [m for m, _ in mtp_dmv],
+        "DMV": [d for _, d in mtp_dmv],
+        "Lumi": best_a["Lumi"],
+        "Z_asimov": best_a["Z_asimov"],
+        "SR_asimov": best_a["analysis"] + ":" + best_a["sr"],
+        "Z_cowan": best_c["Z_cowan"],
+        "SR_cowan": best_c["analysis"] + ":" + best_c["sr"],
+        "point": best_a["point"],
+    })
+    if not reach.empty:
+        reach.sort_values(["Lumi", "Mtp", "DMV"], inplace=True)
+    return reach
+
+
+def grid_main(base_dir, lumi_factors, output="discovery_reach.txt"):
+    df = load_result_tree(base_dir)
+    if df.empty:
+        print(f"No total_results.txt found under {base_dir}")
+        return
+    table = significance_table(df, lumi_factors)
+    reach = discovery_reach(table)
+    reach.to_csv(output, sep="\t", index=False, float_format="%.4g")
+    print(reach.to_string(index=False))
+    print(f"\n{len(df)} SRs x {len(lumi_factors)} lumi factors, {reach['point'].nunique()} points")
+    print(f"Results written to {output}")
+
 
 def main():
     # Update the path if needed
@@ -53,4 +185,13 @@ def main():
     print(f"  Cowan Profile Likelihood (with db): {z_cowan:.4f}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Discovery significance from CheckMATE results")
+    parser.add_argument("--grid", action="store_true",
+                        help="Z_asimov/Z_cowan for every SR of every point and lumi factor")
+    args = parser.parse_args()
+
+    if args.grid:
+        base_dir = os.path.expanduser('~/packages/CHECKMATE/checkmate2/results')
+        grid_main(base_dir, lumi_factors=[1, 3000. / 139.])
+    else:
+        main()
@@ -0,0 +1,228 @@
+import os
+import re
+import glob
+import math
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Model point in the run tag of run_all_fpvdm.sh: log_Mtp1500DMV100.txt
+POINT = re.compile(r"Mtp(\d+(?:\.\d+)?)DMV(\d+(?:\.\d+)?)")
+
+# Line written by stamp_lines in run_all_fpvdm.sh: "<epoch second> <CheckMATE output>"
+STAMPED = re.compile(r"^(\d{9,11}) (.*)$")
+
+# Stages of a CheckMATE run with a Pythia8Card. fritz runs Pythia, Delphes and
+# the analyses together in one event loop, so the run splits into init (from
+# the first log line), the event loop and the evaluation. Each later stage
+# starts at the first of its lines after the start of the previous one: the
+# event listing Pythia prints for the first event (its progress lines if that
+# listing is switched off), and CM's "Evaluating Results" banner (or the
+# evaluate_counts.py summary of a SkipEvaluation run). Adjust here if a
+# CheckMATE version words them differently; a stage not found gets no runtime.
+STAGE_MARKERS = {
+    "event_loop": re.compile(r"PYTHIA Event Listing|Pythia::next\(\):\s*\d+ events have been generated"),
+    "evaluation": re.compile(r"^\s*Evaluating Results|^Evaluation written to"),
+}
+
+PYTHIA_PROGRESS = re.compile(r"Pythia::next\(\):\s*(\d+) events have been generated")
+RESULT = re.compile(r"^\s*Result:\s*(\w+)", re.I)
+R_VALUE = re.compile(r"^\s*Result for r:.*?([-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*$", re.I)
+# Failure lines only: Pythia's "Error and Warning Messages Statistics" block
+# and its handled " PYTHIA Error in ..." messages are part of normal runs
+ERROR = re.compile(r"^\s*(ERROR\b|Error:)|^\s*\w+(Error|Exception): |Traceback \(most recent call last\)"
+                   r"|Segmentation fault|std::bad_alloc|^\s*Killed\b")
+
+# Lines of GNU time -v and of run_all_fpvdm.sh in timing_<tag>.txt
+TIMING_FIELDS = {
+    "Maximum resident set size (kbytes)": ("max_rss_mb", lambda v: float(v) / 1024),
+    "User time (seconds)": ("user_s", float),
+    "System time (seconds)": ("sys_s", float),
+    "Scheduler start": ("start", float),
+    "Scheduler end": ("end", float),
+    "Scheduler exit status": ("exit_status", int),
+    "Scheduler events": ("events_requested", int),
+    "Scheduler host": ("host", str),
+    "Scheduler max parallel": ("max_parallel", int),
+    "Scheduler shards": ("shards", int),
+}
+
+STAGES = ["init"] + list(STAGE_MARKERS)
+COLUMNS = (["tag", "Mtp", "DMV", "events", "wall_s", "events_per_s"] + [f"{stage}_s" for stage in STAGES] +
+           ["cpu_s", "max_rss_mb", "exit_status", "failed", "result", "r", "error", "host", "max_parallel", "shards", "start"])
+
+
+def parse_log(path):
+    """
+    Stage start times, number of events, result and first error of one
+    log_<tag>.txt. Works on plain logs as well, which just give no times.
+    """
+    info = {"events": np.nan, "result": "", "r": np.nan, "error": ""}
+    starts = {}
+    first = last = None
+    stage = 1
+    with open(path, errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            stamp = None
+            match = STAMPED.match(line)
+            if match:
+                stamp, line = float(match.group(1)), match.group(2)
+                if first is None:
+                    first = starts["init"] = stamp
+                last = stamp
+            if stage < len(STAGES) and STAGE_MARKERS[STAGES[stage]].search(line):
+                starts[STAGES[stage]] = stamp
+                stage += 1
+            match = PYTHIA_PROGRESS.search(line)
+            if match:
+                info["events"] = np.nanmax([info["events"], int(match.group(1))])
+            match = RESULT.match(line)
+            if match:
+                info["result"] = match.group(1)
+            match = R_VALUE.match(line)
+            if match:
+                info["r"] = float(match.group(1))
+            if not info["error"] and ERROR.search(line):
+                info["error"] = line.strip()[:120]
+
+    # A stage lasts until the next stage that was found starts, the last one until the log ends
+    found = [s for s in STAGES if starts.get(s) is not None]
+    for stage in STAGES:
+        info[f"{stage}_s"] = np.nan
+    for this, following in zip(found, found[1:] + [None]):
+        end = starts[following] if following else last
+        info[f"{this}_s"] = end - starts[this]
+    info["log_span_s"] = last - first if first is not None else np.nan
+    return info
+
+
+def parse_timing(path):
+    """Fields of one timing_<tag>.txt (GNU time -v output plus the scheduler's lines)."""
+    info = {}
+    with open(path, errors="replace") as f:
+        for line in f:
+            key, sep, value = line.strip().rpartition(": ")
+            if sep and key in TIMING_FIELDS and value:
+                name, convert = TIMING_FIELDS[key]
+                try:
+                    info[name] = convert(value)
+                except ValueError:
+                    pass
+    return info
+
+
+def harvest(log_dir=".", output="checkmate_telemetry.txt"):
+    """
+    One row per log_<tag>.txt in log_dir: model point, events, wall time and
+    throughput, stage runtimes, CPU time, peak memory, exit status, result
+    and the first error line. Written tab-separated to `output`, sorted by
+    model point.
+
+    Events come from Pythia's progress lines, or from the number of events
+    the scheduler asked for; the wall time from the scheduler, or from the
+    log's time stamps. A run counts as failed if CheckMATE exited non-zero
+    or never printed a result. A point run in shards (shard_point.py) has a
+    row for the whole point, without result, and one per shard.
+    """
+    rows = []
+    for log in sorted(glob.glob(os.path.join(log_dir, "log_*.txt"))):
+        tag = os.path.basename(log)[len("log_"):-len(".txt")]
+        point = POINT.search(tag)
+        row = {"tag": tag,
+               "Mtp": float(point.group(1)) if point else np.nan,
+               "DMV": float(point.group(2)) if point else np.nan}
+        row.update(parse_log(log))
+        timing = os.path.join(log_dir, f"timing_{tag}.txt")
+        if os.path.isfile(timing):
+            row.update(parse_timing(timing))
+
+        if np.isnan(row["events"]) and "events_requested" in row:
+            row["events"] = row["events_requested"]
+        row["wall_s"] = row["end"] - row["start"] if "end" in row and "start" in row else row["log_span_s"]
+        row["events_per_s"] = row["events"] / row["wall_s"] if row["wall_s"] > 0 else np.nan
+        row["cpu_s"] = row.get("user_s", np.nan) + row.get("sys_s", np.nan)
+        row["failed"] = int(row.get("exit_status", 0) != 0 or (not row["result"] and row.get("shards", 1) <= 1))
+        rows.append(row)
+
+    table = pd.DataFrame(rows).reindex(columns=COLUMNS)
+    table["start"] = pd.to_datetime(table["start"], unit="s").dt.strftime("%Y-%m-%dT%H:%M:%S")
+    table = table.sort_values(["Mtp", "DMV", "tag"]).reset_index(drop=True)
+    table.to_csv(output, sep="\t", index=False, float_format="%.6g")
+    print(f"{len(table)} runs ({int(table['failed'].sum())} failed) written to {output}")
+    return table
+
+
+def throughput_summary(table, output="checkmate_throughput.txt"):
+    """
+    Runs grouped by Mtp and number of events: runs, failures and, over the
+    successful ones, median and maximal wall time, events per second, CPU
+    efficiency, peak memory and median stage runtimes. Written tab-separated
+    to `output`.
+    """
+    def summarize(group):
+        ok = group[group["failed"] == 0]
+        return pd.Series({
+            "runs": len(group),
+            "failed": int(group["failed"].sum()),
+            "wall_s_median": ok["wall_s"].median(),
+            "wall_s_max": ok["wall_s"].max(),
+            "events_per_s": ok["events_per_s"].median(),
+            "cpu_per_wall": (ok["cpu_s"] / ok["wall_s"]).median(),
+            "max_rss_mb": ok["max_rss_mb"].max(),
+            **{f"{stage}_s_median": ok[f"{stage}_s"].median() for stage in STAGES},
+        })
+
+    summary = table.groupby(["Mtp", "events"], dropna=False).apply(summarize, include_groups=False).reset_index()
+    summary.to_csv(output, sep="\t", index=False, float_format="%.4g")
+    print(f"Throughput by Mtp and events written to {output}")
+    return summary
+
+
+def suggest_parallel(table, node_cores, node_mem_gb, points=None, hours=None, mem_margin=1.2):
+    """
+    MAX_PARALLEL for a node from the measured peak memory and CPU use per
+    run, and, given a number of points to run within `hours`, the number of
+    such nodes needed at the measured median wall time.
+
+    Returns:
+        (max_parallel, nodes or None)
+    """
+    ok = table[table["failed"] == 0]
+    rss_gb = ok["max_rss_mb"].max() / 1024
+    cpu = ok["cpu_s"] / ok["wall_s"]
+    cores_per_run = max(cpu.median(), 1.0) if cpu.notna().any() else 1.0
+    by_cores = int(node_cores // cores_per_run)
+    # Without GNU time in the scheduler there is no memory measurement, only cores limit
+    by_memory = int(node_mem_gb // (rss_gb * mem_margin)) if rss_gb > 0 else by_cores
+    max_parallel = max(min(by_cores, by_memory), 1)
+    memory = f"{rss_gb:.2f} GB" if rss_gb > 0 else "unknown memory"
+    print(f"Peak {memory} and {cores_per_run:.2f} cores per run: "
+          f"MAX_PARALLEL={max_parallel} on {node_cores} cores / {node_mem_gb:g} GB")
+
+    nodes = None
+    if points and hours:
+        wall = ok["wall_s"].median()
+        # Measured wall times already include the contention at the MAX_PARALLEL they ran with
+        nodes = math.ceil(points * wall / (max_parallel * hours * 3600))
+        print(f"{points} points at {wall:.0f} s per run need {nodes} node(s) for {hours:g} h")
+    return max_parallel, nodes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harvest run_all_fpvdm.sh logs into a CheckMATE telemetry table")
+    parser.add_argument("log_dir", nargs="?", default=".", help="folder with log_<tag>.txt and timing_<tag>.txt")
+    parser.add_argument("--output", default="checkmate_telemetry.txt")
+    parser.add_argument("--summary", default="checkmate_throughput.txt")
+    parser.add_argument("--node-cores", type=int, default=None, help="size MAX_PARALLEL for nodes with this many cores")
+    parser.add_argument("--node-mem-gb", type=float, default=None, help="... and this much memory")
+    parser.add_argument("--points", type=int, default=None, help="number of points to plan for")
+    parser.add_argument("--hours", type=float, default=None, help="wall-clock budget for --points")
+    args = parser.parse_args()
+
+    table = harvest(args.log_dir, args.output)
+    summary = throughput_summary(table, args.summary)
+    print(summary.to_string(index=False))
+    if args.node_cores and args.node_mem_gb:
+        suggest_parallel(table, args.node_cores, args.node_mem_gb, args.points, args.hours)
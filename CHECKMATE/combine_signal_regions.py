@@ -1,9 +1,165 @@
 
 import pyhf
 import numpy as np
+from pathlib import Path
+import importlib.util
+import sys
 
 pyhf.set_backend("numpy", precision="64b")
 
+# Settings of the limit computation; anything cached from its results is keyed on these
+CL_LEVEL = 0.05
+POI_BOUNDS = (0.0, 1000.0)
+ENGINE_SETTINGS = {
+    "engine": "pyhf",
+    "pyhf": pyhf.__version__,
+    "level": CL_LEVEL,
+    "poi_bounds": list(POI_BOUNDS),
+}
+
+# Native single-bin CLs solver, used when ENGINE_SETTINGS["engine"] == "native"
+module_path = Path("native_cls.py").resolve()
+spec = importlib.util.spec_from_file_location("native_cls", module_path)
+native_cls = importlib.util.module_from_spec(spec)
+sys.modules["native_cls"] = native_cls
+spec.loader.exec_module(native_cls)
+
+# Toy-MC CLs, used for SRs with background below TOY_SETTINGS["b_threshold"]
+module_path = Path("toy_cls.py").resolve()
+spec = importlib.util.spec_from_file_location("toy_cls", module_path)
+toy_cls = importlib.util.module_from_spec(spec)
+sys.modules["toy_cls"] = toy_cls
+spec.loader.exec_module(toy_cls)
+
+TOY_SETTINGS = {"b_threshold": 0.0, "rtol": 0.01, "max_toys": 200000, "seed": 0}
+TOY_WORKERS = 1
+
+# Optional memo of s95exp_scalar, see set_s95exp_memo
+S95EXP_MEMO = None
+
+def set_engine(engine):
+    """
+    Select the s95exp engine: "pyhf" (reference) or "native" (native_cls.py,
+    vectorised asymptotic CLs for this single-bin model; falls back to pyhf
+    where it is not defined, e.g. db >= b).
+    """
+    if engine not in ("pyhf", "native"):
+        raise ValueError(f"unknown limit engine {engine}")
+    ENGINE_SETTINGS["engine"] = engine
+    if engine == "native":
+        ENGINE_SETTINGS["native_rtol"] = native_cls.PYHF_RTOL
+    else:
+        ENGINE_SETTINGS.pop("native_rtol", None)
+
+
+def set_toys(b_threshold, workers=1, **settings):
+    """
+    Use toy-MC CLs (toy_cls.py) instead of the asymptotic formulae for every
+    SR, or SR combination, with background below b_threshold events.
+
+    Args:
+        b_threshold (float): Background below which toys are used (0 disables them)
+        workers (int): Processes for the toy batches
+        **settings: rtol, max_toys, seed, batch, z of toy_cls.upper_limit
+    """
+    global TOY_WORKERS
+    TOY_SETTINGS["b_threshold"] = b_threshold
+    TOY_SETTINGS.update(settings)
+    TOY_WORKERS = workers
+    if b_threshold > 0:
+        ENGINE_SETTINGS["toys"] = dict(TOY_SETTINGS)
+    else:
+        ENGINE_SETTINGS.pop("toys", None)
+
+
+def set_s95exp_memo(memo):
+    """
+    Memoise s95exp_scalar per (b, db) in `memo`, any mapping with get() and
+    item assignment (a dict, or a thread-safe one as in limit_server.py);
+    None switches memoising off. The memo is not keyed on ENGINE_SETTINGS,
+    so set it after set_engine/set_toys.
+    """
+    global S95EXP_MEMO
+    S95EXP_MEMO = memo
+
+
+def s95exp_pyhf(b, db):
+    """
+    95% CL upper limit on the signal yield for background b +- db
+    (single bin, normsys background uncertainty) from pyhf.
+    """
+    spec = {
+        "channels": [{
+            "name": "signal_region",
+            "samples": [
+                {
+                    "name": "signal",
+                    "data": [1.0],
+                    "modifiers": [
+                        {"name": "mu", "type": "normfactor", "data": None}
+                    ]
+                },
+                {
+                    "name": "background",
+                    "data": [b],
+                    "modifiers": [
+                        {
+                            "name": "bkg_unc",
+                            "type": "normsys",
+                            "data": {
+                                "hi": 1 + db / b,
+                                "lo": 1 - db / b
+                            }
+                        }
+                    ]
+                }
+            ]
+        }]
+    }
+
+    model = pyhf.Model(spec, poi_name="mu")
+    init_pars = model.config.suggested_init()
+    par_bounds = model.config.suggested_bounds()
+    par_bounds[0] = POI_BOUNDS
+
+    asimov_data = model.expected_data(init_pars)
+    mu_up = pyhf.infer.intervals.upper_limits.upper_limit(
+        data=asimov_data,
+        model=model,
+        level=CL_LEVEL,
+        par_bounds=par_bounds
+    )
+
+    if isinstance(mu_up, (list, tuple, np.ndarray)):
+        mu_up = mu_up[0]
+
+    return mu_up
+
+
+def s95exp_scalar(b, db):
+    """
+    s95exp of one SR from the selected engine: toys below
+    TOY_SETTINGS["b_threshold"], otherwise native_cls or pyhf (pyhf also
+    wherever native_cls is not defined), memoised if set_s95exp_memo was called.
+    """
+    if S95EXP_MEMO is not None:
+        key = (float(b), float(db))
+        cached = S95EXP_MEMO.get(key)
+        if cached is not None:
+            return cached
+    s95exp = np.nan
+    if b < TOY_SETTINGS["b_threshold"]:
+        toy_settings = {k: v for k, v in TOY_SETTINGS.items() if k != "b_threshold"}
+        s95exp = toy_cls.upper_limit(b, db, level=CL_LEVEL, workers=TOY_WORKERS, **toy_settings)
+    elif ENGINE_SETTINGS["engine"] == "native":
+        s95exp = native_cls.upper_limit(b, db, level=CL_LEVEL)
+    if np.isnan(s95exp):
+        s95exp = s95exp_pyhf(b, db)
+    if S95EXP_MEMO is not None:
+        S95EXP_MEMO[key] = float(s95exp)
+    return s95exp
+
+
 def compute_r_exp_cons_scaled(s0, ds0, b0, db0, lumi_factors,df):
     """
     Compute s95exp and r_exp_cons for a range of luminosity scaling factors.
@@ -26,52 +182,7 @@ def compute_r_exp_cons_scaled(s0, ds0, b0, db0, lumi_factors,df):
         b = k * b0
         db = np.sqrt(k) * db0
 
-        spec = {
-            "channels": [{
-                "name": "signal_region",
-                "samples": [
-                    {
-                        "name": "signal",
-                        "data": [1.0],
-                        "modifiers": [
-                            {"name": "mu", "type": "normfactor", "data": None}
-                        ]
-                    },
-                    {
-                        "name": "background",
-                        "data": [b],
-                        "modifiers": [
-                            {
-                                "name": "bkg_unc",
-                                "type": "normsys",
-                                "data": {
-                                    "hi": 1 + db / b,
-                                    "lo": 1 - db / b
-                                }
-                            }
-                        ]
-                    }
-                ]
-            }]
-        }
-
-        model = pyhf.Model(spec, poi_name="mu")
-        init_pars = model.config.suggested_init()
-        par_bounds = model.config.suggested_bounds()
-        par_bounds[0] = (0.0, 1000.0)
-
-        asimov_data = model.expected_data(init_pars)
-        mu_up = pyhf.infer.intervals.upper_limits.upper_limit(
-            data=asimov_data,
-            model=model,
-            level=0.05,
-            par_bounds=par_bounds
-        )
-
-        if isinstance(mu_up, (list, tuple, np.ndarray)):
-            mu_up = mu_up[0]
-
-        s95exp = mu_up
+        s95exp = s95exp_scalar(b, db)
         r_exp_cons = (s - 1.64 *df* ds) / s95exp
 
         results.append({
@@ -87,13 +198,55 @@ def compute_r_exp_cons_scaled(s0, ds0, b0, db0, lumi_factors,df):
     return results
 
 
-def combine_signal_regions(signal_regions, lumi_factors):
+# Background-systematics scenarios for luminosity extrapolation:
+#   db_scaling "sqrt"   -> db scales like sqrt(k) (statistics dominated, the default)
+#   db_scaling "linear" -> db scales like k (relative uncertainty kept fixed)
+#   rel_floor           -> db/b is never allowed below this value after scaling
+SYST_SCENARIOS = {
+    "stat": {"db_scaling": "sqrt", "rel_floor": 0.0},
+    "floor10": {"db_scaling": "sqrt", "rel_floor": 0.10},
+    "fixed_rel": {"db_scaling": "linear", "rel_floor": 0.0},
+}
+
+
+def scale_yields(s0, ds0, b0, db0, k, scenario="stat"):
+    """
+    Scale yields (floats or arrays) to luminosity factor k.
+
+    Returns:
+        (s, ds, b, db)
+    """
+    settings = SYST_SCENARIOS[scenario]
+    s = k * s0
+    ds = np.sqrt(k) * ds0
+    b = k * b0
+    if settings["db_scaling"] == "linear":
+        db = k * db0
+    else:
+        db = np.sqrt(k) * db0
+    if settings["rel_floor"] > 0:
+        db = np.maximum(db, settings["rel_floor"] * b)
+    return s, ds, b, db
+
+
+def scale_signal_region(sr, k, scenario="stat"):
+    """
+    Scale one SR {'s0', 'ds0', 'b0', 'db0'} to luminosity factor k.
+
+    Returns:
+        (s, ds, b, db)
+    """
+    return scale_yields(sr['s0'], sr['ds0'], sr['b0'], sr['db0'], k, scenario)
+
+
+def combine_signal_regions(signal_regions, lumi_factors, scenario="stat"):
     """
     Combine multiple orthogonal signal regions by summing signal/background yields and variances.
 
     Args:
         signal_regions (list of dict): Each dict must contain 's0', 'ds0', 'b0', 'db0'
         lumi_factors (list of float): Luminosity scaling factors
+        scenario (str): Key of SYST_SCENARIOS used to scale the background uncertainty
 
     Returns:
         List of dicts with combined results per luminosity factor
@@ -107,10 +260,7 @@ def combine_signal_regions(signal_regions, lumi_factors):
         total_var_b = 0.0
 
         for sr in signal_regions:
-            s = k * sr['s0']
-            ds = np.sqrt(k) * sr['ds0']
-            b = k * sr['b0']
-            db = np.sqrt(k) * sr['db0']
+            s, ds, b, db = scale_signal_region(sr, k, scenario)
 
             total_s += s
             total_var_s += ds**2
@@ -135,6 +285,119 @@ def combine_signal_regions(signal_regions, lumi_factors):
     return combined_results
 
 
+def masks_s95exp(b, db, masks):
+    """
+    s95exp of many SR combinations at once from already scaled per-SR b and
+    db (see combine_masks): one native_cls call for all combinations the
+    native engine covers, s95exp_scalar for the rest.
+
+    Returns:
+        Array of C s95exp values
+    """
+    masks = np.atleast_2d(masks)
+    total_b = np.where(masks, b, 0.0).sum(axis=1)
+    total_db = np.sqrt(np.where(masks, db**2, 0.0).sum(axis=1))
+
+    s95exp = np.full(len(masks), np.nan)
+    if ENGINE_SETTINGS["engine"] == "native":
+        vector = total_b >= TOY_SETTINGS["b_threshold"]
+        if np.any(vector):
+            s95exp[vector] = native_cls.upper_limit(total_b[vector], total_db[vector], level=CL_LEVEL)
+    for i in np.flatnonzero(np.isnan(s95exp)):
+        s95exp[i] = s95exp_scalar(total_b[i], total_db[i])
+    return s95exp
+
+
+def combine_masks(s0, ds0, b0, db0, masks, lumi_factor, scenario="stat"):
+    """
+    r_exp_cons of many SR combinations at once, each given as a row of a
+    boolean mask over the SR arrays; yields and variances are summed exactly
+    as in combine_signal_regions.
+
+    Args:
+        s0, ds0, b0, db0 (np.ndarray): Per-SR yields and uncertainties, shape (N,)
+        masks (np.ndarray): Boolean array (C, N), True for the SRs in each combination
+        lumi_factor (float): Luminosity scaling factor
+        scenario (str): Key of SYST_SCENARIOS
+
+    Returns:
+        Array of C r_exp_cons values
+    """
+    s, ds, b, db = scale_yields(np.asarray(s0, dtype=float), np.asarray(ds0, dtype=float),
+                                np.asarray(b0, dtype=float), np.asarray(db0, dtype=float),
+                                lumi_factor, scenario)
+    masks = np.atleast_2d(masks)
+    total_s = np.where(masks, s, 0.0).sum(axis=1)
+    return total_s / masks_s95exp(b, db, masks)
+
+
+def r_upper_bound_masks(s0, ds0, b0, db0, masks, lumi_factor, scenario="stat"):
+    """
+    Cheap upper bound on combine_masks for the same combinations: s95exp
+    grows with db, so s / s95exp(b, db = 0) bounds r_exp_cons from above. The
+    db = 0 limits come from native_cls in one call and are lowered by its
+    tolerance against pyhf. Combinations handled by toys (or with b = 0) get
+    an infinite bound.
+
+    Returns:
+        Array of C upper bounds on r_exp_cons
+    """
+    s, ds, b, db = scale_yields(np.asarray(s0, dtype=float), np.asarray(ds0, dtype=float),
+                                np.asarray(b0, dtype=float), np.asarray(db0, dtype=float),
+                                lumi_factor, scenario)
+    masks = np.atleast_2d(masks)
+    total_s = np.where(masks, s, 0.0).sum(axis=1)
+    total_b = np.where(masks, b, 0.0).sum(axis=1)
+    s95_min = native_cls.upper_limit(total_b, np.zeros_like(total_b), level=CL_LEVEL) * (1 - native_cls.PYHF_RTOL)
+    s95_min = np.where(total_b < TOY_SETTINGS["b_threshold"], np.nan, s95_min)
+    with np.errstate(invalid="ignore"):
+        return np.where(np.isnan(s95_min), np.inf, total_s / s95_min)
+
+
+def enumerate_candidates(df):
+    """
+    SR groups that may be summed within ATLAS and within CMS, as boolean masks
+    over the rows of df. Mutually exclusive SRs of one analysis form one group,
+    the 0-lepton x 1-lepton pairs of atlas_2211_08028 are separate candidates
+    and every other SR is a candidate on its own.
+
+    Returns:
+        (atlas_masks, cms_masks), boolean arrays of shape (candidates, len(df))
+    """
+    analysis = df['analysis'].to_numpy()
+    is_atlas = df['analysis'].str.startswith('atlas_').to_numpy()
+    is_cms = df['analysis'].str.startswith('cms_').to_numpy()
+
+    atlas_2004 = analysis == 'atlas_2004_14060'
+    atlas_2101 = analysis == 'atlas_2101_01629'
+    atlas_2211 = analysis == 'atlas_2211_08028'
+    atlas_2211_0lep = atlas_2211 & df['sr'].isin(['SR-Gtb-C','SR-Gtb-M','SR-Gtb-B','SR-Gbb-C','SR-Gbb-M','SR-Gtt-0L-B']).to_numpy()
+    atlas_2211_1lep = atlas_2211 & df['sr'].str.startswith('SR-Gtt-1L').to_numpy()
+    single = np.eye(len(df), dtype=bool)
+
+    atlas_masks = [group for group in (atlas_2004, atlas_2101) if group.any()]
+    if atlas_2211_0lep.any() and atlas_2211_1lep.any():
+        for i in np.flatnonzero(atlas_2211_0lep):
+            for j in np.flatnonzero(atlas_2211_1lep):
+                atlas_masks.append(single[i] | single[j])
+    atlas_masks.extend(single[is_atlas & ~(atlas_2004 | atlas_2101 | atlas_2211)])
+
+    cms_1908 = analysis == 'cms_1908_04722'
+    cms_sus = analysis == 'cms_sus_19_005'
+    cms_masks = [group for group in (cms_1908, cms_sus) if group.any()]
+    cms_masks.extend(single[is_cms & ~(cms_1908 | cms_sus)])
+
+    return np.array(atlas_masks, dtype=bool).reshape(-1, len(df)), np.array(cms_masks, dtype=bool).reshape(-1, len(df))
+
+
+def best_of(r):
+    """Largest r_exp_cons above -1 and its position, or (-1, None)."""
+    if len(r) == 0 or not np.nanmax(r, initial=-np.inf) > -1:
+        return -1, None
+    i = int(np.nanargmax(r))
+    return r[i], i
+
+
 # === Example usage ===
 if __name__ == "__main__":
     signal_regions = [
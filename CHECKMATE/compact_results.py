@@ -0,0 +1,193 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import tarfile
+import argparse
+import fnmatch
+
+RESULTS_DIR = os.path.expandvars("$HOME/packages/CHECKMATE/checkmate2/results")
+
+# What the harvesting tools read (filter_relevant_signal_regions*.py,
+# get_signal_regions*.py, watch_checkmate_results.py); never touched
+KEEP_IN_PLACE = ["evaluation/*", "result.txt"]
+
+# Per-point archive of the small files (cutflows, SR tables, logs, cards)
+ARCHIVE_NAME = "outputs.tar.gz"
+MARKER = ".compacted"
+INDEX_FILE = "compaction_index.txt"
+
+SMALL_BYTES = 1 << 20
+# Always bulky, whatever their size: event files
+BULKY = ["*.root", "*.hepmc", "*.hepmc.gz", "*.lhe", "*.lhe.gz", "*.lhco"]
+# Compressing these again gains nothing
+COMPRESSED = ["*.root", "*.gz", "*.bz2", "*.xz", "*.zip"]
+
+# Retention policies for the bulky files; the small files are always archived
+#   keep    bulky files stay as they are
+#   gzip    bulky files are gzip-compressed in place (compressed formats are kept)
+#   delete  bulky files are removed
+POLICIES = ("keep", "gzip", "delete")
+
+
+def matches(rel_path, patterns):
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(os.path.basename(rel_path), p) for p in patterns)
+
+
+def gzip_file(path):
+    """Replace path by path.gz; returns the new size."""
+    tmp = f"{path}.gz.{os.getpid()}.tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.replace(tmp, path + ".gz")
+    os.remove(path)
+    return os.path.getsize(path + ".gz")
+
+
+def write_archive(point_dir, rel_paths):
+    """
+    Add files to <point_dir>/outputs.tar.gz, keeping the members of an
+    archive left by an earlier compaction, and replace it atomically.
+    """
+    archive = os.path.join(point_dir, ARCHIVE_NAME)
+    tmp = f"{archive}.{os.getpid()}.tmp"
+    with tarfile.open(tmp, "w:gz") as tar:
+        if os.path.isfile(archive):
+            with tarfile.open(archive) as old:
+                for member in old.getmembers():
+                    if member.name not in rel_paths:
+                        tar.addfile(member, old.extractfile(member) if member.isfile() else None)
+        for rel in rel_paths:
+            tar.add(os.path.join(point_dir, rel), arcname=rel, recursive=False)
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, archive)
+
+
+def read_archived(point_dir, rel_path):
+    """Contents of a file of a compacted point, e.g. analysis/<analysis>_cutflow.dat."""
+    path = os.path.join(point_dir, rel_path)
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            return f.read()
+    with tarfile.open(os.path.join(point_dir, ARCHIVE_NAME)) as tar:
+        return tar.extractfile(rel_path).read()
+
+
+def compact_point(point_dir, policy="delete", small_bytes=SMALL_BYTES, settle=300.0, dry_run=False):
+    """
+    Compact one CheckMATE result folder after its evaluation.
+
+    Files under KEEP_IN_PLACE stay untouched. Other files up to small_bytes
+    (except event files) go into <point_dir>/outputs.tar.gz and are removed;
+    bulky files are kept, gzipped or deleted according to `policy`. Empty
+    folders are removed and a .compacted marker records what was done.
+    Points without evaluation/total_results.txt, or with a file modified in
+    the last `settle` seconds, are skipped.
+
+    Returns:
+        List of (point, file, bytes, action) records, empty if skipped
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"unknown retention policy {policy}")
+    point = os.path.basename(os.path.normpath(point_dir))
+    if not os.path.isfile(os.path.join(point_dir, "evaluation", "total_results.txt")):
+        return []
+
+    small, bulky = [], []
+    newest = 0.0
+    for dirpath, _, filenames in os.walk(point_dir):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, point_dir).replace(os.sep, "/")
+            if rel in (ARCHIVE_NAME, MARKER) or matches(rel, KEEP_IN_PLACE) or os.path.islink(path):
+                continue
+            st = os.stat(path)
+            newest = max(newest, st.st_mtime)
+            if matches(rel, BULKY) or st.st_size > small_bytes:
+                bulky.append((rel, st.st_size))
+            else:
+                small.append((rel, st.st_size))
+    if time.time() - newest < settle:
+        print(f"{point}: modified in the last {settle:.0f} s, skipped")
+        return []
+
+    records = [(point, rel, size, "archived") for rel, size in small]
+    for rel, size in bulky:
+        if policy == "delete":
+            action = "deleted"
+        elif policy == "gzip" and not matches(rel, COMPRESSED):
+            action = "gzipped"
+        else:
+            action = "kept"
+        records.append((point, rel, size, action))
+    if dry_run:
+        return records
+
+    if small:
+        write_archive(point_dir, [rel for rel, _ in small])
+        for rel, _ in small:
+            os.remove(os.path.join(point_dir, rel))
+    for _, rel, _, action in records:
+        path = os.path.join(point_dir, rel)
+        if action == "deleted":
+            os.remove(path)
+        elif action == "gzipped":
+            gzip_file(path)
+
+    for dirpath, dirnames, filenames in os.walk(point_dir, topdown=False):
+        if dirpath != point_dir and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+    freed = sum(size for _, _, size, action in records if action in ("archived", "deleted", "gzipped"))
+    with open(os.path.join(point_dir, MARKER), "w") as f:
+        json.dump({"policy": policy, "time": time.time(), "files": len(records), "bytes_processed": freed}, f)
+    return records
+
+
+def append_index(index_path, records):
+    """Append records to the consolidated index (tab-separated, one line per file)."""
+    new_file = not os.path.isfile(index_path)
+    with open(index_path, "a") as f:
+        if new_file:
+            f.write("point\tfile\tbytes\taction\n")
+        for record in records:
+            f.write("\t".join(str(x) for x in record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def compact_all(base_dir, prefix="fpvdm_", policy="delete", small_bytes=SMALL_BYTES, settle=300.0, dry_run=False):
+    """compact_point for every evaluated point folder in base_dir; returns all records."""
+    index_path = os.path.join(base_dir, INDEX_FILE)
+    records = []
+    for folder in sorted(os.listdir(base_dir)):
+        point_dir = os.path.join(base_dir, folder)
+        if not folder.startswith(prefix) or not os.path.isdir(point_dir):
+            continue
+        point_records = compact_point(point_dir, policy, small_bytes, settle, dry_run)
+        if point_records and not dry_run:
+            append_index(index_path, point_records)
+        records.extend(point_records)
+
+    for action in ("archived", "gzipped", "deleted", "kept"):
+        files = [r for r in records if r[3] == action]
+        if files:
+            print(f"{action:9s} {len(files):7d} files {sum(r[2] for r in files) / 2**30:9.3f} GB")
+    print(("Would compact" if dry_run else "Compacted") + f" {len({r[0] for r in records})} points"
+          + ("" if dry_run else f", index in {index_path}"))
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact evaluated CheckMATE result folders")
+    parser.add_argument("base_path", nargs="?", default=RESULTS_DIR)
+    parser.add_argument("--prefix", default="fpvdm_")
+    parser.add_argument("--policy", choices=POLICIES, default="delete", help="what to do with bulky files")
+    parser.add_argument("--small-mb", type=float, default=SMALL_BYTES / 2**20, help="files up to this size are archived")
+    parser.add_argument("--settle", type=float, default=300.0, help="skip points modified in the last SETTLE seconds")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be done")
+    args = parser.parse_args()
+
+    compact_all(args.base_path, args.prefix, args.policy, int(args.small_mb * 2**20), args.settle, args.dry_run)
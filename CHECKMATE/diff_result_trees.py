@@ -0,0 +1,236 @@
+import io
+import os
+import re
+import sys
+import argparse
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+module_path = Path("compact_results.py").resolve()
+spec = importlib.util.spec_from_file_location("compact_results", module_path)
+compact_results = importlib.util.module_from_spec(spec)
+sys.modules["compact_results"] = compact_results
+spec.loader.exec_module(compact_results)
+
+RESULT_FILE = "result.txt"
+BEST_FILE = "evaluation/best_signal_regions.txt"
+TOTAL_FILE = "evaluation/total_results.txt"
+
+# <name><value> or <name>_<value> followed by "_", the next name or the end of the folder name:
+# fpvdm_Mtp1500DMV100 -> Mtp 1500, DMV 100; i2hdm_test_320_300_mh_320_mhc300 -> i 2, test 320, mh 320, mhc 300
+PARAMETER = re.compile(r"([A-Za-z]+)_?(\d+(?:\.\d+)?)(?=_|[A-Za-z]|$)")
+# Lines of CheckMATE's result.txt
+RESULT_LINES = {"Result": "result", "Result for r": "r", "Analysis": "analysis", "SR": "sr"}
+
+COLUMNS = ["point", "status", "folder_a", "folder_b", "result_a", "result_b", "r_a", "r_b", "dr", "dr_rel",
+           "best_a", "best_b", "best_changed", "srs_a", "srs_b", "srs_unmatched", "srs_changed",
+           "max_rel_dev", "worst", "best_table_changed"]
+
+
+def point_parameters(folder):
+    """{'Mtp': 1500.0, 'DMV': 100.0} for fpvdm_Mtp1500DMV100 (see PARAMETER)."""
+    return {name: float(value) for name, value in PARAMETER.findall(folder)}
+
+
+def list_points(base_dir, prefix=""):
+    """Point folders of a result tree: subfolders with any of the compared files (or a compacted archive)."""
+    points = []
+    for folder in sorted(os.listdir(base_dir)):
+        path = os.path.join(base_dir, folder)
+        if not folder.startswith(prefix) or not os.path.isdir(path):
+            continue
+        if any(os.path.isfile(os.path.join(path, f)) for f in (RESULT_FILE, BEST_FILE, TOTAL_FILE,
+                                                                  compact_results.ARCHIVE_NAME)):
+            points.append(folder)
+    return points
+
+
+def align(folders_a, folders_b):
+    """
+    Pair the point folders of two trees by their parameters (point_parameters),
+    using only the parameter names every folder of both trees has; folders
+    whose names differ otherwise (i2hdm_mh320_mhc300 and
+    i2hdm_test_320_300_mh_320_mhc300) are still paired.
+
+    Returns:
+        (key names, list of (key, folder_a or None, folder_b or None))
+    """
+    params = {f: point_parameters(f) for f in folders_a + folders_b}
+    named = [f for f in folders_a + folders_b if params[f]]
+    skipped = sorted(set(folders_a + folders_b) - set(named))
+    if skipped:
+        print(f"Skipping folders without model parameters: {', '.join(skipped)}")
+    common = set.intersection(*[set(params[f]) for f in named]) if named else set()
+    names = [n for n in params[named[0]] if n in common] if named else []
+    if not names:
+        raise ValueError("the folder names of the two trees have no model parameter in common")
+
+    def key(folder):
+        return tuple(params[folder][n] for n in names)
+
+    a, b = {}, {}
+    for folders, points in ((folders_a, a), (folders_b, b)):
+        for f in folders:
+            if params[f]:
+                points.setdefault(key(f), f)
+    if len(a) + len(b) < len(named):
+        print(f"Warning: several folders at one ({', '.join(names)}); only the first of each is compared")
+    keys = sorted(set(a) | set(b))
+    return names, [(k, a.get(k), b.get(k)) for k in keys]
+
+
+def read_file(point_dir, rel_path):
+    """Text of a point's file, from the folder or its outputs.tar.gz; None if it has none."""
+    try:
+        return compact_results.read_archived(point_dir, rel_path).decode(errors="replace")
+    except (FileNotFoundError, KeyError):
+        return None
+
+
+def parse_result(text):
+    """result, r, analysis and sr of a result.txt."""
+    info = {}
+    for line in (text or "").splitlines():
+        key, sep, value = line.partition(":")
+        if sep and key.strip() in RESULT_LINES:
+            info[RESULT_LINES[key.strip()]] = value.strip()
+    if "r" in info:
+        info["r"] = float(re.findall(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?", info["r"])[-1])
+    return info
+
+
+def parse_table(text):
+    if text is None:
+        return None
+    df = pd.read_csv(io.StringIO(text), sep=r"\s+", comment="#")
+    df["sr"] = df["sr"].astype(str)
+    return df.set_index(["analysis", "sr"])
+
+
+def compare_tables(a, b, rtol, atol):
+    """
+    SRs only in one table, SRs with any numeric column beyond the tolerance
+    (|b - a| > atol + rtol |a|), the largest relative deviation and where.
+    """
+    if a is None or b is None:
+        return {}
+    joined = a.join(b, how="inner", lsuffix="_a", rsuffix="_b")
+    columns = [c for c in a.columns if c in b.columns and pd.api.types.is_numeric_dtype(a[c])]
+    changed = np.zeros(len(joined), dtype=bool)
+    worst, worst_dev = "", 0.0
+    for col in columns:
+        x, y = joined[f"{col}_a"].to_numpy(dtype=float), joined[f"{col}_b"].to_numpy(dtype=float)
+        changed |= ~np.isclose(y, x, rtol=rtol, atol=atol, equal_nan=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dev = np.abs(y - x) / np.maximum(np.abs(x), atol)
+        dev = np.where(np.isfinite(dev), dev, 0.0)
+        if len(dev) and dev.max() > worst_dev:
+            i = int(dev.argmax())
+            worst_dev, worst = float(dev[i]), f"{col} {joined.index[i][0]}:{joined.index[i][1]}"
+    return {"srs_a": len(a), "srs_b": len(b), "srs_unmatched": len(a) + len(b) - 2 * len(joined),
+            "srs_changed": int(changed.sum()), "max_rel_dev": worst_dev, "worst": worst}
+
+
+def best_sr(result, total):
+    """analysis:sr of the best SR, from result.txt or else the highest rexpcons of total_results.txt."""
+    if "analysis" in result:
+        return f"{result['analysis']}:{result.get('sr', '')}"
+    if total is not None and "rexpcons" in total and len(total):
+        analysis, sr = total["rexpcons"].idxmax()
+        return f"{analysis}:{sr}"
+    return ""
+
+
+def compare_point(args):
+    """One row of the diff table for an aligned pair of point folders."""
+    key, dir_a, dir_b, rtol, atol = args
+    row = {"folder_a": os.path.basename(dir_a) if dir_a else "", "folder_b": os.path.basename(dir_b) if dir_b else ""}
+    if dir_a is None or dir_b is None:
+        row["status"] = "missing_a" if dir_a is None else "missing_b"
+        return key, row
+
+    result_a, result_b = (parse_result(read_file(d, RESULT_FILE)) for d in (dir_a, dir_b))
+    total_a, total_b = (parse_table(read_file(d, TOTAL_FILE)) for d in (dir_a, dir_b))
+    best_a, best_b = (parse_table(read_file(d, BEST_FILE)) for d in (dir_a, dir_b))
+
+    r_a = result_a.get("r", total_a["rexpcons"].max() if total_a is not None and "rexpcons" in total_a else np.nan)
+    r_b = result_b.get("r", total_b["rexpcons"].max() if total_b is not None and "rexpcons" in total_b else np.nan)
+    row.update({"result_a": result_a.get("result", ""), "result_b": result_b.get("result", ""),
+                "r_a": r_a, "r_b": r_b, "dr": r_b - r_a,
+                "dr_rel": (r_b - r_a) / abs(r_a) if r_a else np.nan,
+                "best_a": best_sr(result_a, total_a), "best_b": best_sr(result_b, total_b)})
+    row["best_changed"] = int(row["best_a"] != row["best_b"])
+    row.update(compare_tables(total_a, total_b, rtol, atol))
+    best_tables = compare_tables(best_a, best_b, rtol, atol)
+    row["best_table_changed"] = best_tables.get("srs_changed", 0) + best_tables.get("srs_unmatched", 0)
+
+    changed = (row["best_changed"] or row["result_a"] != row["result_b"]
+               or not np.isclose(r_b, r_a, rtol=rtol, atol=atol, equal_nan=True)
+               or row.get("srs_changed", 0) or row.get("srs_unmatched", 0) or row["best_table_changed"])
+    row["status"] = "changed" if changed else "same"
+    return key, row
+
+
+def diff_trees(base_a, base_b, prefix_a="", prefix_b="", rtol=1e-3, atol=1e-6, output="tree_diff.txt",
+               sort_by=("status", "dr_rel"), workers=None):
+    """
+    Compare two CheckMATE result trees point by point (see align): result.txt,
+    evaluation/best_signal_regions.txt and evaluation/total_results.txt, with
+    numeric columns compared within rtol/atol. Points are read in a process
+    pool; one row per point goes to `output` (tab-separated), sorted by
+    status (missing and changed points first) and the size of the r shift.
+
+    Returns:
+        DataFrame of the table
+    """
+    folders_a, folders_b = list_points(base_a, prefix_a), list_points(base_b, prefix_b)
+    names, pairs = align(folders_a, folders_b)
+    tasks = [(k, os.path.join(base_a, a) if a else None, os.path.join(base_b, b) if b else None, rtol, atol)
+             for k, a, b in pairs]
+    if workers == 1 or len(tasks) < 2:
+        results = [compare_point(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(compare_point, tasks, chunksize=8))
+
+    rows = []
+    for key, row in results:
+        point = " ".join(f"{n}={v:g}" for n, v in zip(names, key))
+        rows.append({"point": point, **dict(zip(names, key)), **row})
+    table = pd.DataFrame(rows).reindex(columns=COLUMNS[:1] + list(names) + COLUMNS[1:])
+
+    order = {"missing_a": 0, "missing_b": 0, "changed": 1, "same": 2}
+    keys = [table["status"].map(order) if c == "status" else
+            -table[c].abs() if c in ("dr", "dr_rel", "max_rel_dev") else table[c] for c in sort_by]
+    sort_frame = pd.concat(keys, axis=1, keys=range(len(keys)))
+    table = table.loc[sort_frame.sort_values(list(range(len(keys))), kind="stable").index].reset_index(drop=True)
+    table.to_csv(output, sep="\t", index=False, float_format="%.6g")
+
+    counts = table["status"].value_counts()
+    print(f"{len(table)} points: " + ", ".join(f"{counts.get(s, 0)} {s}" for s in ("same", "changed", "missing_a", "missing_b"))
+          + f"; {int(table['best_changed'].fillna(0).sum())} with another best SR. Written to {output}")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Point-by-point diff of two CheckMATE result trees")
+    parser.add_argument("tree_a", help="results folder (reference)")
+    parser.add_argument("tree_b", help="results folder to compare with it")
+    parser.add_argument("--prefix-a", default="", help="only point folders starting with this, e.g. fpvdm_")
+    parser.add_argument("--prefix-b", default=None, help="(default: --prefix-a)")
+    parser.add_argument("--rtol", type=float, default=1e-3)
+    parser.add_argument("--atol", type=float, default=1e-6)
+    parser.add_argument("--sort", nargs="+", default=["status", "dr_rel"], help="columns to sort by")
+    parser.add_argument("--output", default="tree_diff.txt")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    table = diff_trees(args.tree_a, args.tree_b, args.prefix_a, args.prefix_a if args.prefix_b is None else args.prefix_b,
+                       args.rtol, args.atol, args.output, args.sort, args.workers)
+    shown = table[table["status"] != "same"]
+    if len(shown):
+        print(shown[["point", "status", "r_a", "r_b", "dr_rel", "best_a", "best_b"]].head(40).to_string(index=False))
@@ -0,0 +1,300 @@
+import os
+import re
+import sys
+import glob
+import argparse
+import functools
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+module_path = Path("combine_signal_regions.py").resolve()
+spec = importlib.util.spec_from_file_location("combine_signal_regions", module_path)
+combine_signal_regions = importlib.util.module_from_spec(spec)
+sys.modules["combine_signal_regions"] = combine_signal_regions
+spec.loader.exec_module(combine_signal_regions)
+
+RESULTS_DIR = os.path.expandvars("$HOME/packages/CHECKMATE/checkmate2/results")
+DATA_DIR = os.path.expandvars("$HOME/packages/CHECKMATE/checkmate2/data")
+
+# Columns of CheckMATE's evaluation/total_results.txt that our tools read
+COLUMNS = ["analysis", "sr", "o", "b", "db", "s", "ds", "s95obs", "s95exp", "robscons", "rexpcons"]
+# rcons = (s - 1.64 ds) / s95, as in CheckMATE's evaluation
+Z_CONS = 1.64
+
+# Signal counts CheckMATE writes with SkipEvaluation: analysis/<nnn>_<analysis>_signal.dat,
+# one per event file, a header of "# key: value" lines and a table of SRs
+SIGNAL_FILE = re.compile(r"^(?:\d+_)?(?P<analysis>.+)_signal\.dat$")
+# Header keys, searched case-insensitively; adjust here if a CheckMATE version words them differently
+HEADER_KEYS = {
+    "xsect": re.compile(r"^x-?sect(ion)?\b|^cross.?section", re.I),
+    "xsect_err": re.compile(r"^(x-?sect(ion)?|cross.?section).?err|^error\b", re.I),
+    "lumi": re.compile(r"^lumi", re.I),
+    "sum_w": re.compile(r"^sum.?of.?weights$|^sumofweights$|^sum_w$|^total.?weight", re.I),
+    "events": re.compile(r"^(total.?)?(number.?of.?events|n.?events)$", re.I),
+    "process": re.compile(r"^process", re.I),
+}
+# Column names in the signal and reference tables, lower case without "_"
+SIGNAL_ALIASES = {"sr": "sr", "sumw": "sum_w", "sumw2": "sum_w2", "acc": "acc", "nnorm": "n_norm"}
+REFERENCE_ALIASES = {"sr": "sr", "o": "o", "obs": "o", "b": "b", "bkg": "b", "db": "db", "dbkg": "db",
+                     "s95obs": "s95obs", "s95exp": "s95exp"}
+
+
+def _normalize(columns, aliases):
+    return [aliases.get(c.lower().replace("_", "").replace("-", ""), c) for c in columns]
+
+
+def _number(text):
+    match = re.search(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?", text)
+    return float(match.group(0)) if match else np.nan
+
+
+def read_signal_file(path):
+    """
+    One <analysis>_signal.dat: header values (see HEADER_KEYS) and the SR
+    table with columns sr, sum_w, sum_w2 and acc and/or n_norm.
+
+    Returns:
+        (dict of header values, DataFrame)
+    """
+    header = {}
+    table = []
+    columns = None
+    with open(path, errors="replace") as f:
+        for line in f:
+            stripped = line.strip().lstrip("#").strip()
+            if not stripped:
+                continue
+            fields = stripped.split()
+            if columns is None and _normalize(fields[:1], SIGNAL_ALIASES) == ["sr"]:
+                columns = _normalize(fields, SIGNAL_ALIASES)
+                continue
+            if line.lstrip().startswith("#") or (columns is None and ":" in stripped):
+                key, sep, value = stripped.partition(":")
+                if sep:
+                    for name, pattern in HEADER_KEYS.items():
+                        if name not in header and pattern.search(key.strip()):
+                            header[name] = value.strip() if name == "process" else _number(value)
+                continue
+            if columns is not None:
+                table.append(fields[:len(columns)])
+    df = pd.DataFrame(table, columns=columns)
+    for col in df.columns[1:]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return header, df
+
+
+def signal_counts(point_dir, lumi=None):
+    """
+    s and ds of every SR of one point from its analysis/*_signal.dat files:
+    s = N_Norm (or xsect x lumi x Sum_W / sum of weights), ds from the MC
+    statistics (s sqrt(Sum_W2) / Sum_W) and the cross-section error in
+    quadrature, as CheckMATE's evaluation does.
+
+    Event files of one process are independent estimates of the same yield
+    and are averaged, weighted by their number of events (or sum of weights);
+    the processes are then summed. Files without a Process header count as
+    one process, which is what the run cards of this repository define.
+
+    Returns:
+        DataFrame with analysis, sr, s, ds
+    """
+    parts = []
+    for path in sorted(glob.glob(os.path.join(point_dir, "analysis", "*_signal.dat"))):
+        match = SIGNAL_FILE.match(os.path.basename(path))
+        if not match:
+            continue
+        header, df = read_signal_file(path)
+        for col in ("sr", "sum_w", "sum_w2"):
+            if col not in df:
+                raise ValueError(f"{path}: no {col} column in the signal table")
+        if "n_norm" in df:
+            s = df["n_norm"].to_numpy(dtype=float)
+        else:
+            norm = header.get("xsect", np.nan) * (lumi if lumi is not None else header.get("lumi", np.nan))
+            s = norm * df["sum_w"].to_numpy(dtype=float) / header.get("sum_w", np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            stat = np.where(df["sum_w"] > 0, s * np.sqrt(df["sum_w2"]) / df["sum_w"], 0.0)
+        rel_xsect = header.get("xsect_err", 0.0) / header["xsect"] if header.get("xsect") else 0.0
+        weight = header.get("events", header.get("sum_w", 1.0))
+        parts.append(pd.DataFrame({"analysis": match.group("analysis"), "sr": df["sr"],
+                                   "process": header.get("process", ""),
+                                   "weight": 1.0 if np.isnan(weight) else weight, "s": s,
+                                   "var_stat": stat**2, "ds_xsect": s * np.nan_to_num(rel_xsect)}))
+    if not parts:
+        return pd.DataFrame(columns=["analysis", "sr", "s", "ds"])
+    files = pd.concat(parts, ignore_index=True)
+
+    # Weighted mean over the event files of each process
+    key = ["analysis", "sr", "process"]
+    files["fraction"] = files["weight"] / files.groupby(key, sort=False)["weight"].transform("sum")
+    files["s"] *= files["fraction"]
+    files["var_stat"] *= files["fraction"]**2
+    # Cross-section errors of one process are fully correlated between its event files
+    files["ds_xsect"] *= files["fraction"]
+    per_process = files.groupby(key, sort=False)[["s", "var_stat", "ds_xsect"]].sum()
+
+    # Sum over processes, whose cross-section errors are independent
+    per_process["var_xsect"] = per_process["ds_xsect"]**2
+    summed = per_process.groupby(level=["analysis", "sr"], sort=False)[["s", "var_stat", "var_xsect"]].sum().reset_index()
+    summed["ds"] = np.sqrt(summed["var_stat"] + summed["var_xsect"])
+    return summed[["analysis", "sr", "s", "ds"]]
+
+
+@functools.lru_cache(maxsize=None)
+def reference_files(data_dir=DATA_DIR):
+    """{analysis: path} of every <analysis>_ref.dat under CheckMATE's data folder."""
+    found = {}
+    for path in glob.glob(os.path.join(data_dir, "**", "*_ref.dat"), recursive=True):
+        found.setdefault(os.path.basename(path)[:-len("_ref.dat")], path)
+    return found
+
+
+@functools.lru_cache(maxsize=None)
+def reference_data(analysis, data_dir=DATA_DIR):
+    """
+    Observed events, background and model-independent limits of every SR of
+    an analysis (columns sr, o, b, db, s95obs, s95exp; NaN where the
+    reference file has no such column).
+    """
+    path = reference_files(data_dir).get(analysis)
+    if path is None:
+        raise FileNotFoundError(f"no {analysis}_ref.dat under {data_dir}")
+    df = pd.read_csv(path, sep=r"\s+", comment="#")
+    df.columns = _normalize(df.columns, REFERENCE_ALIASES)
+    return df.reindex(columns=["sr", "o", "b", "db", "s95obs", "s95exp"]).assign(sr=lambda d: d["sr"].astype(str))
+
+
+def evaluate_point(point_dir, data_dir=DATA_DIR, lumi=None):
+    """
+    total_results.txt of one point computed from its signal counts and the
+    reference data, in one vectorised pass over all SRs: robscons and
+    rexpcons = (s - 1.64 ds) / s95. SRs without an s95exp in the reference
+    data get the limit engine's (combine_signal_regions.masks_s95exp).
+
+    Returns:
+        DataFrame with COLUMNS, empty if the point has no signal files
+    """
+    counts = signal_counts(point_dir, lumi)
+    if counts.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    counts["sr"] = counts["sr"].astype(str)
+    reference = pd.concat([reference_data(a, data_dir).assign(analysis=a) for a in counts["analysis"].unique()])
+    table = counts.merge(reference, on=["analysis", "sr"], how="left")
+    unmatched = table["b"].isna()
+    if unmatched.any():
+        print(f"{point_dir}: {int(unmatched.sum())} SRs without reference data dropped")
+        table = table[~unmatched].reset_index(drop=True)
+
+    s, ds = table["s"].to_numpy(dtype=float), table["ds"].to_numpy(dtype=float)
+    s95exp = table["s95exp"].to_numpy(dtype=float, copy=True)
+    missing = np.isnan(s95exp)
+    if missing.any():
+        single = np.eye(len(table), dtype=bool)[missing]
+        s95exp[missing] = combine_signal_regions.masks_s95exp(table["b"].to_numpy(dtype=float),
+                                                              table["db"].to_numpy(dtype=float), single)
+    table["s95exp"] = s95exp
+    table["robscons"] = (s - Z_CONS * ds) / table["s95obs"].to_numpy(dtype=float)
+    table["rexpcons"] = (s - Z_CONS * ds) / s95exp
+    return table[COLUMNS]
+
+
+def write_total_results(point_dir, table):
+    """Write <point_dir>/evaluation/total_results.txt as CheckMATE does (space-separated)."""
+    out_dir = os.path.join(point_dir, "evaluation")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, "total_results.txt")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    table.to_csv(tmp, sep=" ", index=False, float_format="%.6g")
+    os.replace(tmp, path)
+    return path
+
+
+def compare_total_results(ours, theirs, rtol=0.01):
+    """
+    Relative deviations of our evaluation from CheckMATE's total_results.txt
+    per numeric column, over the SRs both have.
+
+    Returns:
+        (DataFrame column, max_rel_dev, n_outside_rtol; best SR agrees)
+    """
+    merged = ours.merge(theirs, on=["analysis", "sr"], suffixes=("", "_cm"))
+    rows = []
+    for col in COLUMNS[2:]:
+        if f"{col}_cm" not in merged:
+            continue
+        a, b = merged[col].to_numpy(dtype=float), merged[f"{col}_cm"].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dev = np.abs(a - b) / np.maximum(np.abs(b), 1e-12)
+        dev = dev[np.isfinite(dev)]
+        rows.append((col, dev.max() if len(dev) else np.nan, int(np.sum(dev > rtol))))
+    same_best = (len(merged) > 0 and merged.loc[merged["rexpcons"].idxmax(), ["analysis", "sr"]].tolist()
+                 == merged.loc[merged["rexpcons_cm"].idxmax(), ["analysis", "sr"]].tolist())
+    return pd.DataFrame(rows, columns=["column", "max_rel_dev", "n_outside_rtol"]), same_best
+
+
+def evaluate_all(base_dir=RESULTS_DIR, prefix="fpvdm_", data_dir=DATA_DIR, lumi=None, overwrite=False,
+                 check=False, rtol=0.01):
+    """
+    evaluate_point for every point folder in base_dir that has signal counts:
+    writes evaluation/total_results.txt where there is none (or always with
+    overwrite). With check, nothing is written; the result is compared with
+    CheckMATE's own total_results.txt of each point instead.
+    """
+    done = 0
+    for folder in sorted(os.listdir(base_dir)):
+        point_dir = os.path.join(base_dir, folder)
+        if not folder.startswith(prefix) or not os.path.isdir(os.path.join(point_dir, "analysis")):
+            continue
+        existing = os.path.join(point_dir, "evaluation", "total_results.txt")
+        if not check and os.path.isfile(existing) and not overwrite:
+            continue
+        try:
+            table = evaluate_point(point_dir, data_dir, lumi)
+        except ValueError as e:
+            print(f"{folder}: Error: {e}")
+            continue
+        if table.empty:
+            continue
+        best = table.loc[table["rexpcons"].idxmax()]
+        if check:
+            if not os.path.isfile(existing):
+                continue
+            deviations, same_best = compare_total_results(table, pd.read_csv(existing, sep=r"\s+"), rtol)
+            worst = deviations.loc[deviations["max_rel_dev"].idxmax()] if len(deviations) else None
+            status = "ok" if same_best and deviations["n_outside_rtol"].sum() == 0 else "DIFFERS"
+            print(f"{folder}: {status}, best SR {'same' if same_best else 'different'}" +
+                  (f", max deviation {worst['max_rel_dev']:.2g} in {worst['column']}" if worst is not None else ""))
+        else:
+            write_total_results(point_dir, table)
+            print(f"{folder}: {len(table)} SRs, best {best['analysis']}:{best['sr']} r = {best['rexpcons']:.3g}")
+        done += 1
+    print(f"{done} points {'checked' if check else 'evaluated'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate CheckMATE signal counts (SkipEvaluation runs) "
+                                                 "into evaluation/total_results.txt")
+    parser.add_argument("path", nargs="?", default=RESULTS_DIR, help="results folder, or one point folder")
+    parser.add_argument("--prefix", default="fpvdm_")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="CheckMATE data folder with the *_ref.dat files")
+    parser.add_argument("--lumi", type=float, default=None, help="luminosity [fb^-1] if the signal files lack N_Norm")
+    parser.add_argument("--overwrite", action="store_true", help="also replace existing total_results.txt")
+    parser.add_argument("--check", action="store_true",
+                        help="compare with CheckMATE's own total_results.txt instead of writing")
+    parser.add_argument("--rtol", type=float, default=0.01, help="--check: allowed relative deviation")
+    args = parser.parse_args()
+
+    if os.path.isdir(os.path.join(args.path, "analysis")):
+        table = evaluate_point(args.path, args.data_dir, args.lumi)
+        print(f"Evaluation written to {write_total_results(args.path, table)}")
+        if not table.empty:
+            # Worded as CheckMATE's own summary, which checkmate_telemetry.py reads from the run log
+            best = table.loc[table["rexpcons"].idxmax()]
+            print(f"Result: {'Excluded' if best['rexpcons'] > 1 else 'Allowed'}")
+            print(f"Result for r: {best['rexpcons']:.4g}")
+            print(f"Analysis: {best['analysis']}\nSR: {best['sr']}")
+    else:
+        evaluate_all(args.path, args.prefix, args.data_dir, args.lumi, args.overwrite, args.check, args.rtol)
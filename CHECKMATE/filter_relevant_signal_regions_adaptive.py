@@ -26,39 +26,49 @@ def filter_signal_regions(base_path, output_base,
             continue
 
         input_path = os.path.join(base_path, folder, "evaluation", "total_results.txt")
-        output_folder = os.path.join(output_base, folder)
-        output_path = os.path.join(output_folder, "filtered_regions.txt")
+        output_path = os.path.join(output_base, folder, "filtered_regions.txt")
 
         if not os.path.isfile(input_path):
             continue
 
         try:
-            df = pd.read_csv(input_path, sep='\s+', comment="#")
+            n_kept = filter_point(input_path, output_path, min_threshold, min_keep, max_keep)
+            summary.append((folder, n_kept))
+
+        except Exception as e:
+            summary.append((folder, f"Error: {e}"))
+
+    return summary
 
-            # Sort by rexpcons descending
-            df = df.sort_values("rexpcons", ascending=False)
 
-            # Apply minimum threshold
-            df_filtered = df[df["rexpcons"] > min_threshold]
+def filter_point(input_path, output_path, min_threshold=0.05, min_keep=4, max_keep=20):
+    """
+    Filter a single total_results.txt (see filter_signal_regions) and write
+    the kept SRs to output_path.
 
-            # Ensure between min_keep and max_keep
-            if len(df_filtered) < min_keep:
-                df_filtered = df.head(min_keep)
-            elif len(df_filtered) > max_keep:
-                df_filtered = df_filtered.head(max_keep)
+    Returns:
+        Number of SRs written
+    """
+    df = pd.read_csv(input_path, sep='\\s+', comment="#")
 
-            # Final columns to keep
-            df_filtered = df_filtered[["analysis", "sr", "b", "db", "s", "ds", "rexpcons"]]
+    # Sort by rexpcons descending
+    df = df.sort_values("rexpcons", ascending=False)
 
-            os.makedirs(output_folder, exist_ok=True)
-            df_filtered.to_csv(output_path, index=False, sep="\t", float_format="%.5g")
+    # Apply minimum threshold
+    df_filtered = df[df["rexpcons"] > min_threshold]
 
-            summary.append((folder, len(df_filtered)))
+    # Ensure between min_keep and max_keep
+    if len(df_filtered) < min_keep:
+        df_filtered = df.head(min_keep)
+    elif len(df_filtered) > max_keep:
+        df_filtered = df_filtered.head(max_keep)
 
-        except Exception as e:
-            summary.append((folder, f"Error: {e}"))
+    # Final columns to keep
+    df_filtered = df_filtered[["analysis", "sr", "b", "db", "s", "ds", "rexpcons"]]
 
-    return summary
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    df_filtered.to_csv(output_path, index=False, sep="\t", float_format="%.5g")
+    return len(df_filtered)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+import os
+import json
+import urllib.request
+import urllib.error
+
+# Address of limit_server.py; override with the LIMIT_SERVER environment variable
+SERVER = os.environ.get("LIMIT_SERVER", "http://127.0.0.1:8765")
+
+
+def available(timeout=0.5):
+    """True if a limit server answers at SERVER."""
+    try:
+        with urllib.request.urlopen(f"{SERVER}/status", timeout=timeout) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def evaluate(requests, timeout=600):
+    """
+    Send a batch of requests to the server (see LimitService.evaluate) and
+    return one list of per-lumi-factor result dicts per request.
+    """
+    data = json.dumps({"requests": requests}).encode()
+    request = urllib.request.Request(f"{SERVER}/evaluate", data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)["results"]
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.load(e).get("error", str(e))) from None
+
+
+def compute_r_exp_cons_scaled(s0, ds0, b0, db0, lumi_factors, df=0):
+    """Drop-in for combine_signal_regions.compute_r_exp_cons_scaled."""
+    return evaluate([{"s0": s0, "ds0": ds0, "b0": b0, "db0": db0,
+                      "lumi_factors": list(lumi_factors), "df": df}])[0]
+
+
+def combine_signal_regions(signal_regions, lumi_factors, scenario="stat"):
+    """Drop-in for combine_signal_regions.combine_signal_regions."""
+    regions = [{key: float(sr[key]) for key in ("s0", "ds0", "b0", "db0")} for sr in signal_regions]
+    return evaluate([{"regions": regions, "lumi_factors": list(lumi_factors), "scenario": scenario}])[0]
@@ -0,0 +1,143 @@
+import sys
+import json
+import time
+import argparse
+import threading
+import importlib.util
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+module_path = Path("combine_signal_regions.py").resolve()
+spec = importlib.util.spec_from_file_location("combine_signal_regions", module_path)
+combine_signal_regions = importlib.util.module_from_spec(spec)
+sys.modules["combine_signal_regions"] = combine_signal_regions
+spec.loader.exec_module(combine_signal_regions)
+
+DEFAULT_PORT = 8765
+
+
+class S95Memo(dict):
+    """s95exp per (b, db), shared by the request threads; only the lookups are locked."""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.hits = 0
+
+    def get(self, key):
+        with self.lock:
+            value = super().get(key)
+            if value is not None:
+                self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+
+
+class LimitService:
+    """
+    Keeps the limit engine of combine_signal_regions.py loaded and memoises
+    s95exp per (b, db) through combine_signal_regions.set_s95exp_memo, so
+    repeated and overlapping queries cost one fit. Requests are evaluated
+    concurrently; two requests for a new (b, db) at once may both fit it.
+    """
+
+    def __init__(self):
+        self.s95 = S95Memo()
+        self.started = time.time()
+        combine_signal_regions.set_s95exp_memo(self.s95)
+
+    def evaluate(self, request):
+        """
+        One request, either a single SR as for compute_r_exp_cons_scaled
+        {"s0", "ds0", "b0", "db0", "lumi_factors", "df"} or a list of SRs to
+        sum as for combine_signal_regions {"regions": [...], "lumi_factors", "scenario"}.
+        """
+        lumi_factors = request.get("lumi_factors", [request.get("lumi", 1)])
+        if "regions" in request:
+            results = combine_signal_regions.combine_signal_regions(
+                request["regions"], lumi_factors, request.get("scenario", "stat"))
+        else:
+            results = combine_signal_regions.compute_r_exp_cons_scaled(
+                request["s0"], request["ds0"], request["b0"], request["db0"],
+                lumi_factors, df=request.get("df", 0))
+        return [{key: float(np.asarray(value)) for key, value in res.items()} for res in results]
+
+    def status(self):
+        return {
+            "engine": combine_signal_regions.ENGINE_SETTINGS,
+            "cached_limits": len(self.s95),
+            "cache_hits": self.s95.hits,
+            "uptime_s": time.time() - self.started,
+        }
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/status":
+                self.reply(200, service.status())
+            else:
+                self.reply(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/evaluate":
+                self.reply(404, {"error": f"unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                requests = json.loads(self.rfile.read(length))["requests"]
+                self.reply(200, {"results": [service.evaluate(r) for r in requests]})
+            except Exception as e:
+                self.reply(400, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT):
+    """
+    Serve limit requests on http://host:port until interrupted.
+
+    POST /evaluate  {"requests": [...]} -> {"results": [[{s95exp, r_exp_cons, ...} per lumi factor], ...]}
+    GET  /status    engine settings and cache statistics
+    """
+    service = LimitService()
+    # Warm up the fit machinery before accepting requests
+    service.evaluate({"s0": 1.0, "ds0": 0.0, "b0": 1.0, "db0": 0.1, "lumi_factors": [1]})
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Limit server on http://{host}:{port} ({combine_signal_regions.ENGINE_SETTINGS['engine']} engine)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the limit engine warm and answer s95exp / r_exp_cons requests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--engine", choices=["pyhf", "native"], default="pyhf")
+    parser.add_argument("--toys-below", type=float, default=0.0, metavar="B",
+                        help="use toy-MC CLs for SRs with background below B events")
+    args = parser.parse_args()
+
+    combine_signal_regions.set_engine(args.engine)
+    combine_signal_regions.set_toys(args.toys_below)
+    serve(args.host, args.port)
@@ -0,0 +1,119 @@
+import json
+import time
+from contextlib import contextmanager
+
+import pyhf
+import pyhf.infer.intervals.upper_limits as upper_limits
+
+
+COUNTERS = ["model_builds", "hypotests", "upper_limits", "combinations", "cache_hits"]
+
+
+class PipelineProfile:
+    """
+    Opt-in counters and stage timers for the signal-region combination pipeline.
+
+    One record is kept per model point. Stage times are wall-clock seconds,
+    counters are incremented by the pyhf hooks installed with instrument_pyhf()
+    and by the combination loops in batch_combine_signal_regions.py.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.current = None
+
+    @contextmanager
+    def point(self, name, **meta):
+        record = {"point": name, **meta, "stages": {}, "total_s": 0.0}
+        record.update({c: 0 for c in COUNTERS})
+        self.current = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["total_s"] = time.perf_counter() - start
+            self.records.append(record)
+            self.current = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.current is not None:
+                stages = self.current["stages"]
+                stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, counter, n=1):
+        if self.current is not None:
+            self.current[counter] = self.current.get(counter, 0) + n
+
+    def write_jsonl(self, path):
+        with open(path, "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+    def summary(self, top=10):
+        """
+        Print totals per stage and the slowest model points with the
+        combination/fit counts that went into them.
+        """
+        if not self.records:
+            print("No profiled points.")
+            return
+
+        totals = {}
+        for record in self.records:
+            for stage, seconds in record["stages"].items():
+                totals[stage] = totals.get(stage, 0.0) + seconds
+        wall = sum(r["total_s"] for r in self.records)
+
+        print("\n===== Profile: time per stage =====")
+        for stage, seconds in sorted(totals.items(), key=lambda x: -x[1]):
+            print(f"{stage:<16} {seconds:10.2f} s  ({100 * seconds / wall:5.1f}%)")
+        print(f"{'total':<16} {wall:10.2f} s over {len(self.records)} points")
+        print("(model_build and upper_limit are nested inside the fit_* stages)")
+
+        print(f"\n===== Profile: {min(top, len(self.records))} slowest points =====")
+        print(f"{'point':<28} {'time_s':>8} {'combos':>7} {'models':>7} {'hypotests':>10} {'upper_lim':>10}")
+        for record in sorted(self.records, key=lambda r: -r["total_s"])[:top]:
+            print(f"{record['point']:<28} {record['total_s']:8.2f} {record['combinations']:7d} "
+                  f"{record['model_builds']:7d} {record['hypotests']:10d} {record['upper_limits']:10d}")
+        print("====================================\n")
+
+
+@contextmanager
+def instrument_pyhf(profile):
+    """
+    Temporarily wrap pyhf.Model, upper_limit and the hypotest calls made by the
+    upper-limit scan so that every call is counted (and timed) in `profile`.
+    The original functions are restored on exit.
+    """
+    orig_model = pyhf.Model
+    orig_upper_limit = upper_limits.upper_limit
+    orig_hypotest = upper_limits.hypotest
+
+    def model(*args, **kwargs):
+        profile.count("model_builds")
+        with profile.stage("model_build"):
+            return orig_model(*args, **kwargs)
+
+    def upper_limit(*args, **kwargs):
+        profile.count("upper_limits")
+        with profile.stage("upper_limit"):
+            return orig_upper_limit(*args, **kwargs)
+
+    def hypotest(*args, **kwargs):
+        profile.count("hypotests")
+        return orig_hypotest(*args, **kwargs)
+
+    pyhf.Model = model
+    upper_limits.upper_limit = upper_limit
+    upper_limits.hypotest = hypotest
+    try:
+        yield profile
+    finally:
+        pyhf.Model = orig_model
+        upper_limits.upper_limit = orig_upper_limit
+        upper_limits.hypotest = orig_hypotest
@@ -6,17 +6,31 @@ import matplotlib.pyplot as plt
 from scipy.interpolate import griddata
 
 # Load data
-def load_data(file):
+def load_data(file, lumi=None, scenario=None):
     df = pd.read_csv(file, sep=r'\s+')  # ASCII-safe whitespace
+    # Slice the long-format table of batch_combine_signal_regions.py --lumi/--scenario
+    if lumi is not None:
+        df = df[np.isclose(df['Lumi'], lumi, rtol=1e-3)]
+    if scenario is not None and 'Scenario' in df:
+        df = df[df['Scenario'] == scenario]
+    df = df.reset_index(drop=True)
     return df['Mtp'], df['DMV'], df['Best_Individual'], df['Overall_Best']
 
 # Input files
 lhc_file = 'summary_results.txt'
 hl_lhc_file = 'summary_results_HL_LHC.txt'
 
+# Set to e.g. 'summary_results_long.txt' to take both luminosities from one table
+long_file = None
+scenario = 'stat'
+
 # Load LHC and HL-LHC data
-Mtp_lhc, DMV_lhc, r_indiv_lhc, r_overall_lhc = load_data(lhc_file)
-Mtp_hl, DMV_hl, r_indiv_hl, r_overall_hl = load_data(hl_lhc_file)
+if long_file:
+    Mtp_lhc, DMV_lhc, r_indiv_lhc, r_overall_lhc = load_data(long_file, lumi=1, scenario=scenario)
+    Mtp_hl, DMV_hl, r_indiv_hl, r_overall_hl = load_data(long_file, lumi=3000./139., scenario=scenario)
+else:
+    Mtp_lhc, DMV_lhc, r_indiv_lhc, r_overall_lhc = load_data(lhc_file)
+    Mtp_hl, DMV_hl, r_indiv_hl, r_overall_hl = load_data(hl_lhc_file)
 
 # Create interpolation grid
 x_vals = np.arange(1200, 2301, 5)
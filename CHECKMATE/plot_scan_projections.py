@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import argparse
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+# Parameters of a scattered scan (calchep_scan.py) shown in the corner plot
+PARAMETERS = ["Mtp", "DMV", "DM", "gD"]
+LOG_PARAMETERS = {"DM", "gD"}
+LABELS = {"Mtp": r"$M_{T'}$ [GeV]", "DMV": r"$\Delta M_V$", "DM": r"$M_{D}$ [GeV]",
+          "gD": r"$g_D$", "MV": r"$M_{V_D}$ [GeV]"}
+
+
+def load_data(file, lumi=None, scenario=None):
+    df = pd.read_csv(file, sep=r'\s+')
+    # Slice the long-format table of batch_combine_signal_regions.py --lumi/--scenario
+    if lumi is not None:
+        df = df[np.isclose(df['Lumi'], lumi, rtol=1e-3)]
+    if scenario is not None and 'Scenario' in df:
+        df = df[df['Scenario'] == scenario]
+    return df.reset_index(drop=True)
+
+
+def attach_scan_points(df, points_file):
+    """
+    Add the parameters of scan_points.txt (calchep_scan.py) to a summary:
+    the points are matched on (Mtp, DMV), which calchep_scan.py keeps unique.
+    """
+    points = pd.read_csv(points_file, sep="\t").drop(columns=["run", "batch_file"])
+    key = lambda t: list(zip(t["Mtp"].round().astype(int), t["DMV"].round(3)))
+    points.index = pd.MultiIndex.from_tuples(key(points))
+    extra = points.drop(columns=["Mtp", "DMV"])
+    joined = extra.reindex(pd.MultiIndex.from_tuples(key(df))).reset_index(drop=True)
+    missing = int(joined.isna().all(axis=1).sum())
+    if missing:
+        print(f"{missing} of {len(df)} summary points are not in {points_file}")
+    return pd.concat([df, joined], axis=1)
+
+
+def bin_edges(values, n_bins, log=False):
+    low, high = values.min(), values.max()
+    if log:
+        return np.geomspace(low, high * (1 + 1e-9), n_bins + 1)
+    return np.linspace(low, high + 1e-9 * max(abs(high), 1), n_bins + 1)
+
+
+def marginal_fractions(df, parameters, n_bins=8, threshold=1.0):
+    """
+    Fraction of points with Overall_Best > threshold in bins of each
+    parameter, with binomial errors: the 1D projections of a scattered scan.
+
+    Returns:
+        DataFrame with Parameter, Low, High, Points, Excluded, Fraction, Error
+    """
+    excluded = df["Overall_Best"] > threshold
+    rows = []
+    for name in parameters:
+        edges = bin_edges(df[name], n_bins, name in LOG_PARAMETERS)
+        index = np.digitize(df[name], edges) - 1
+        for i in range(n_bins):
+            in_bin = index == i
+            n, k = int(in_bin.sum()), int(excluded[in_bin].sum())
+            fraction = k / n if n else np.nan
+            error = np.sqrt(fraction * (1 - fraction) / n) if n else np.nan
+            rows.append((name, edges[i], edges[i + 1], n, k, fraction, error))
+    return pd.DataFrame(rows, columns=["Parameter", "Low", "High", "Points", "Excluded", "Fraction", "Error"])
+
+
+def corner_plot(df, parameters, marginals, n_bins=8, threshold=1.0, output="scan_projections.pdf"):
+    """
+    Exclusion fraction per bin of each parameter on the diagonal; below it,
+    the excluded fraction in 2D bins of each pair with the points on top
+    (filled: Overall_Best > threshold, open: allowed).
+    """
+    n = len(parameters)
+    excluded = (df["Overall_Best"] > threshold).to_numpy()
+    fig, axes = plt.subplots(n, n, figsize=(3 * n, 3 * n), squeeze=False)
+    for i, y in enumerate(parameters):
+        for j, x in enumerate(parameters):
+            ax = axes[i, j]
+            if j > i:
+                ax.axis("off")
+                continue
+            if i == j:
+                m = marginals[marginals["Parameter"] == x]
+                centers = np.sqrt(m["Low"] * m["High"]) if x in LOG_PARAMETERS else (m["Low"] + m["High"]) / 2
+                ax.errorbar(centers, m["Fraction"], yerr=m["Error"], xerr=[centers - m["Low"], m["High"] - centers],
+                            fmt="o", color="k", markersize=4)
+                ax.set_ylim(-0.05, 1.05)
+                ax.set_ylabel("excluded fraction")
+            else:
+                x_edges = bin_edges(df[x], n_bins, x in LOG_PARAMETERS)
+                y_edges = bin_edges(df[y], n_bins, y in LOG_PARAMETERS)
+                total, _, _ = np.histogram2d(df[x], df[y], [x_edges, y_edges])
+                hits, _, _ = np.histogram2d(df[x][excluded], df[y][excluded], [x_edges, y_edges])
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    fraction = np.where(total > 0, hits / total, np.nan)
+                mesh = ax.pcolormesh(x_edges, y_edges, fraction.T, cmap="RdYlGn_r", vmin=0, vmax=1, alpha=0.6)
+                ax.scatter(df[x][excluded], df[y][excluded], s=8, c="k", label=f"r > {threshold:g}")
+                ax.scatter(df[x][~excluded], df[y][~excluded], s=8, facecolors="none", edgecolors="k", label="allowed")
+                ax.set_ylabel(LABELS.get(y, y))
+                if y in LOG_PARAMETERS:
+                    ax.set_yscale("log")
+            if x in LOG_PARAMETERS:
+                ax.set_xscale("log")
+            ax.set_xlabel(LABELS.get(x, x))
+    if n > 1:
+        axes[1, 0].legend(fontsize=8, loc="best")
+        fig.colorbar(mesh, ax=axes[0, n - 1], fraction=0.8, label="excluded fraction")
+    fig.tight_layout()
+    fig.savefig(output)
+    plt.close(fig)
+    print(f"Projections written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exclusion projections of a scattered (quasi-random) FPVDM scan")
+    parser.add_argument("summary", nargs="?", default="summary_results.txt")
+    parser.add_argument("--points", default=None, help="scan_points.txt of calchep_scan.py, for DM, gD and derived parameters")
+    parser.add_argument("--lumi", type=float, default=None)
+    parser.add_argument("--scenario", default=None)
+    parser.add_argument("--params", nargs="*", default=None, help=f"parameters to project (default: those of {PARAMETERS} present)")
+    parser.add_argument("--bins", type=int, default=8)
+    parser.add_argument("--threshold", type=float, default=1.0, help="Overall_Best above which a point is excluded")
+    parser.add_argument("--marginals", default="scan_marginals.txt")
+    parser.add_argument("--output", default="scan_projections.pdf")
+    args = parser.parse_args()
+
+    df = load_data(args.summary, args.lumi, args.scenario)
+    if args.points:
+        df = attach_scan_points(df, args.points)
+    parameters = args.params or [p for p in PARAMETERS if p in df and df[p].nunique() > 1]
+    df = df.dropna(subset=parameters + ["Overall_Best"])
+
+    marginals = marginal_fractions(df, parameters, args.bins, args.threshold)
+    marginals.to_csv(args.marginals, sep="\t", index=False, float_format="%.4g")
+    print(f"{len(df)} points, {int((df['Overall_Best'] > args.threshold).sum())} excluded; "
+          f"marginal exclusion fractions written to {args.marginals}")
+    corner_plot(df, parameters, marginals, args.bins, args.threshold, args.output)
@@ -0,0 +1,126 @@
+import os
+import re
+import argparse
+
+import numpy as np
+import pandas as pd
+
+TEMPLATE_FILE = "FPVDM_TOP.dat"
+RESULTS_DIR = os.path.expandvars("$HOME/packages/CHECKMATE/checkmate2/results")
+
+
+def load_scan(base_path, prefix="fpvdm_"):
+    """
+    rexpcons of every SR of every point of a previous scan, from
+    <base_path>/<prefix>*/evaluation/total_results.txt.
+
+    Returns:
+        Dict {point folder: DataFrame with analysis, sr, rexpcons}
+    """
+    scan = {}
+    for folder in sorted(os.listdir(base_path)):
+        path = os.path.join(base_path, folder, "evaluation", "total_results.txt")
+        if folder.startswith(prefix) and os.path.isfile(path):
+            df = pd.read_csv(path, sep=r"\s+", comment="#")
+            scan[folder] = df[["analysis", "sr", "rexpcons"]]
+    return scan
+
+
+class Coverage:
+    """
+    Top-K r values of every analysis at every point, to check quickly how well
+    a set of analyses reproduces each point's top-K SRs.
+
+    A point is covered by a set of analyses when, for every rank j < K, the
+    j-th best r among the set's SRs is at least (1 - tol) times the j-th best
+    r among all SRs. Ranks whose full-scan r is below min_r are not required.
+    """
+
+    def __init__(self, scan, top_k=5, tol=0.05, min_r=0.05):
+        self.points = list(scan)
+        self.analyses = sorted({a for df in scan.values() for a in df["analysis"]})
+        index = {a: i for i, a in enumerate(self.analyses)}
+        # r[p, a, j]: j-th best r of analysis a at point p, -inf where it has fewer SRs
+        self.r = np.full((len(self.points), len(self.analyses), top_k), -np.inf)
+        for p, df in enumerate(scan.values()):
+            for analysis, group in df.groupby("analysis"):
+                best = np.sort(group["rexpcons"].to_numpy(dtype=float))[::-1][:top_k]
+                self.r[p, index[analysis], :len(best)] = best
+        full = np.sort(self.r.reshape(len(self.points), -1), axis=1)[:, ::-1][:, :top_k]
+        self.required = np.where(full >= min_r, (1 - tol) * full, -np.inf)
+
+    def deficit(self, chosen):
+        """Number of (point, rank) pairs the analyses in `chosen` (boolean mask) do not reproduce."""
+        k = self.r.shape[2]
+        r = np.where(chosen[None, :, None], self.r, -np.inf).reshape(len(self.points), -1)
+        top = np.sort(np.partition(r, r.shape[1] - k, axis=1)[:, -k:], axis=1)[:, ::-1]
+        return int(np.sum(top < self.required))
+
+
+def minimal_analyses(coverage, keep=()):
+    """
+    Smallest set of analyses found to cover every point (see Coverage):
+    greedy set cover, always adding the analysis that removes the most
+    uncovered (point, rank) pairs, followed by dropping every analysis the
+    others make redundant. Analyses in `keep` are always included.
+
+    Returns:
+        Sorted list of analysis names
+    """
+    chosen = np.array([a in keep for a in coverage.analyses])
+    missing = coverage.deficit(chosen)
+    while missing > 0:
+        trials = []
+        for i in np.flatnonzero(~chosen):
+            chosen[i] = True
+            trials.append((coverage.deficit(chosen), -np.max(coverage.r[:, i, 0]), i))
+            chosen[i] = False
+        missing, _, best = min(trials)
+        chosen[best] = True
+
+    # Least useful first: analyses whose best SR has the lowest r anywhere
+    for i in sorted(np.flatnonzero(chosen), key=lambda i: np.max(coverage.r[:, i, 0])):
+        if coverage.analyses[i] in keep:
+            continue
+        chosen[i] = False
+        if coverage.deficit(chosen) > 0:
+            chosen[i] = True
+    return [a for a, c in zip(coverage.analyses, chosen) if c]
+
+
+def write_run_card(analyses, template=TEMPLATE_FILE, output="FPVDM_TOP_pruned.dat"):
+    """Copy of the run card template with an explicit Analyses: list."""
+    with open(template) as f:
+        card = f.read()
+    card, n = re.subn(r"(?m)^Analyses:.*$", "Analyses: " + ",".join(analyses), card)
+    if n == 0:
+        raise ValueError(f"no Analyses: line in {template}")
+    with open(output, "w") as f:
+        f.write(card)
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smallest analysis set reproducing every point's top SRs of a previous scan")
+    parser.add_argument("results", nargs="?", default=RESULTS_DIR, help="CheckMATE results folder of the previous scan")
+    parser.add_argument("--prefix", default="fpvdm_")
+    parser.add_argument("--top-k", type=int, default=5, help="SRs per point that have to be reproduced")
+    parser.add_argument("--tol", type=float, default=0.05, help="relative r loss allowed for each of them")
+    parser.add_argument("--min-r", type=float, default=0.05, help="ignore SRs with r below this")
+    parser.add_argument("--keep", nargs="*", default=[], help="analyses to include in any case")
+    parser.add_argument("--template", default=TEMPLATE_FILE)
+    parser.add_argument("--output", default="FPVDM_TOP_pruned.dat")
+    args = parser.parse_args()
+
+    scan = load_scan(args.results, args.prefix)
+    coverage = Coverage(scan, args.top_k, args.tol, args.min_r)
+    analyses = minimal_analyses(coverage, set(args.keep))
+
+    best = pd.concat([df.loc[[df["rexpcons"].idxmax()]] for df in scan.values()])
+    leading = best["analysis"].value_counts()
+    print(f"{len(scan)} points, {len(coverage.analyses)} analyses in the scan, {len(analyses)} needed "
+          f"for the top {args.top_k} SRs within {args.tol:.0%}:")
+    for analysis in analyses:
+        print(f"  {analysis:30s} best SR at {leading.get(analysis, 0)} points")
+    print(f"Run card written to {write_run_card(analyses, args.template, args.output)} "
+          f"(TEMPLATE_FILE={args.output} bash run_all_fpvdm.sh)")
@@ -0,0 +1,103 @@
+import os
+import tarfile
+import zipfile
+import threading
+from pathlib import PurePosixPath
+from concurrent.futures import ThreadPoolExecutor
+
+REGION_FILE = "filtered_regions.txt"
+
+
+class ArchiveMember:
+    """
+    A filtered_regions.txt inside a RegionArchive. Offers the part of the
+    Path interface the loaders use: .name, .parent.name and read_bytes().
+    """
+
+    def __init__(self, archive, member):
+        self.archive = archive
+        self.member = member
+        self.name = PurePosixPath(member).name
+        self.parent = PurePosixPath(member).parent
+
+    def read_bytes(self):
+        return self.archive.read(self.member)
+
+    def __str__(self):
+        return f"{self.archive.path}:{self.member}"
+
+    def __repr__(self):
+        return f"ArchiveMember({str(self)!r})"
+
+
+class RegionArchive:
+    """
+    A zip or tar archive of a filtered_regions/ folder, read through one open
+    handle without extracting it.
+
+    If every entry sits below one top-level folder (zip -r filtered_regions.zip
+    filtered_regions), that folder plays the role of root_dir, so members()
+    finds exactly the files Path(root_dir).glob("*/filtered_regions.txt")
+    finds in the extracted copy.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.lock = threading.Lock()
+        self.data = {}
+        if zipfile.is_zipfile(path):
+            self.handle = zipfile.ZipFile(path)
+            names = [i.filename for i in self.handle.infolist() if not i.is_dir()]
+        elif tarfile.is_tarfile(path):
+            self.handle = tarfile.open(path)
+            names = [m.name for m in self.handle.getmembers() if m.isfile()]
+        else:
+            raise ValueError(f"{path} is neither a zip nor a tar archive")
+
+        tops = {PurePosixPath(name).parts[0] for name in names}
+        prefix = tops.pop() if len(tops) == 1 and all(len(PurePosixPath(n).parts) > 1 for n in names) else None
+        self.names = []
+        for name in names:
+            parts = PurePosixPath(name).parts
+            if prefix is not None:
+                parts = parts[1:]
+            if len(parts) == 2 and parts[1] == REGION_FILE:
+                self.names.append(name)
+
+    def read(self, member):
+        """
+        Bytes of one member. A ZipFile serialises seeks on its handle itself
+        and inflates outside that lock, so zip reads run concurrently; a
+        TarFile handle is not thread-safe and is locked.
+        """
+        if member not in self.data:
+            if isinstance(self.handle, zipfile.ZipFile):
+                self.data[member] = self.handle.read(member)
+            else:
+                with self.lock:
+                    self.data[member] = self.handle.extractfile(member).read()
+        return self.data[member]
+
+    def members(self, workers=8):
+        """
+        ArchiveMember for every */filtered_regions.txt. Their contents are read
+        up front by `workers` threads sharing the handle, so later loads are
+        served from memory.
+        """
+        if workers > 1 and len(self.names) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(self.read, self.names))
+        return [ArchiveMember(self, name) for name in self.names]
+
+    def close(self):
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_archive(path):
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+
+
+def cache_key(file_path, lumi_factor, settings, extra=""):
+    """
+    Content hash identifying one model-point result.
+
+    Args:
+        file_path (Path or region_archive.ArchiveMember): filtered_regions.txt of
+            the point; its bytes and its folder name (which gives Mtp/DMV) enter
+            the hash, so a point read from an archive shares its entry with the
+            extracted copy
+        lumi_factor (float): Luminosity scaling factor
+        settings (dict): Limit-engine settings (combine_signal_regions.ENGINE_SETTINGS)
+        extra (str): Anything else the result depends on
+
+    Returns:
+        Hex digest string
+    """
+    h = hashlib.sha256()
+    if isinstance(file_path, (str, os.PathLike)):
+        with open(file_path, "rb") as f:
+            h.update(f.read())
+        folder = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+    else:
+        h.update(file_path.read_bytes())
+        folder = file_path.parent.name
+    h.update(folder.encode())
+    h.update(repr(float(lumi_factor)).encode())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    h.update(extra.encode())
+    return h.hexdigest()
+
+
+def load(cache_dir, key):
+    path = os.path.join(cache_dir, key[:2], key + ".json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def store(cache_dir, key, value):
+    """
+    Write value as JSON durably: temporary file, fsync, then atomic rename,
+    so an interrupted run never leaves a truncated entry behind.
+    """
+    folder = os.path.join(cache_dir, key[:2])
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, key + ".json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
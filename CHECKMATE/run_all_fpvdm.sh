@@ -1,21 +1,43 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-TEMPLATE_FILE="FPVDM_TOP.dat"
+TEMPLATE_FILE="${TEMPLATE_FILE:-FPVDM_TOP.dat}"  # e.g. a card from prune_analyses.py
 PYTHIA_TEMPLATE="pythia8card.in"
 LHE_SOURCE_DIR="./batch_results"
 CHECKMATE_EXEC="$HOME/packages/CHECKMATE/checkmate2/bin/CM"
+RESULTS_DIR="$(dirname "$(dirname "$CHECKMATE_EXEC")")/results"
+# 1: run CheckMATE with SkipEvaluation and write evaluation/total_results.txt
+# from the signal counts with evaluate_counts.py (sharded runs: per shard, in shard_point.py)
+SKIP_EVALUATION="${SKIP_EVALUATION:-0}"
 MAX_PARALLEL=4
+# Split every point into this many LHE event shards run in parallel (shard_point.py);
+# each job then uses SHARDS cores, so lower MAX_PARALLEL accordingly
+SHARDS="${SHARDS:-1}"
+# GNU time for peak memory in timing_${tag}.txt (optional; see checkmate_telemetry.py)
+TIME_EXEC=$(command -v /usr/bin/time || true)
+# CM (Python) and fritz (C++) buffer their output in blocks when it goes to a
+# pipe; line-buffer both so that stamp_lines times every line as it is written
+export PYTHONUNBUFFERED=1
+LINE_BUFFER=""
+if command -v stdbuf >/dev/null; then LINE_BUFFER="stdbuf -oL -eL"; fi
 
 [[ -f "$TEMPLATE_FILE" ]] || { echo "ERROR: '$TEMPLATE_FILE' missing"; exit 1; }
 [[ -f "$PYTHIA_TEMPLATE" ]] || { echo "ERROR: '$PYTHIA_TEMPLATE' missing"; exit 1; }
 [[ -x "$CHECKMATE_EXEC" ]] || { echo "ERROR: CheckMATE binary not found at $CHECKMATE_EXEC"; exit 1; }
 
 mapfile -t combos < <(find "$LHE_SOURCE_DIR" -name "pp_TpTp_FPVDM-Mtp*DMV*DM*.lhe.gz" \
-  | grep -oP "Mtp\d+DMV\d+" | sort -u)
+  | grep -oP "Mtp[\d.]+DMV[\d.]+" | sort -u)
 
 job_pids=()
 
+# Prefix every log line with the epoch second it was written, so that
+# checkmate_telemetry.py can time the CheckMATE stages
+stamp_lines() {
+    while IFS= read -r line; do
+        printf '%(%s)T %s\n' -1 "$line"
+    done
+}
+
 for combo in "${combos[@]}"; do
     Mtp=${combo#Mtp}; Mtp=${Mtp%DMV*}
     DMV=${combo#*DMV}
@@ -34,6 +56,9 @@ for combo in "${combos[@]}"; do
     cp "$TEMPLATE_FILE" "$run_file"
     sed -i "s/^Name:.*/Name: $model_name/" "$run_file"
     sed -i "s|pythia8card\.in|pythia8card_1.in|" "$run_file"
+    if [[ "$SKIP_EVALUATION" == 1 ]]; then
+        sed -i "s/^#*SkipEvaluation:.*/SkipEvaluation: True/" "$run_file"
+    fi
 
     scratch_dir=$(mktemp -d -p . tmp_run_${tag}_XXXX)
     cp "$PYTHIA_TEMPLATE" "$scratch_dir/pythia8card_1.in"
@@ -41,10 +66,30 @@ for combo in "${combos[@]}"; do
     ln -s "$(realpath "$lhe_file")" "$scratch_dir/file1.lhe.gz"
     cp "$run_file" "$scratch_dir/"
 
+    n_events=$(grep -oP "^Main:numberOfEvents *= *\K\d+" "$PYTHIA_TEMPLATE" || echo "")
+
     (
         cd "$scratch_dir"
-        "$CHECKMATE_EXEC" "$run_file" > "../log_${tag}.txt" 2>&1 </dev/null
+        start=$(date +%s.%N)
+        status=0
+        if (( SHARDS > 1 )); then
+            : > "../timing_${tag}.txt"
+            (cd .. && python3 shard_point.py "$model_name" "$lhe_file" --shards "$SHARDS" --template "$run_file") 2>&1 </dev/null \
+                | stamp_lines > "../log_${tag}.txt" || status=$?
+        elif [[ -n "$TIME_EXEC" ]]; then
+            "$TIME_EXEC" -v -o "../timing_${tag}.txt" $LINE_BUFFER "$CHECKMATE_EXEC" "$run_file" 2>&1 </dev/null \
+                | stamp_lines > "../log_${tag}.txt" || status=$?
+        else
+            : > "../timing_${tag}.txt"
+            $LINE_BUFFER "$CHECKMATE_EXEC" "$run_file" 2>&1 </dev/null | stamp_lines > "../log_${tag}.txt" || status=$?
+        fi
+        printf "Scheduler start: %s\nScheduler end: %s\nScheduler exit status: %s\nScheduler events: %s\nScheduler host: %s\nScheduler max parallel: %s\nScheduler shards: %s\n" \
+            "$start" "$(date +%s.%N)" "$status" "$n_events" "$(hostname)" "$MAX_PARALLEL" "$SHARDS" >> "../timing_${tag}.txt"
         cd ..
+        if [[ "$SKIP_EVALUATION" == 1 && "$SHARDS" -le 1 && "$status" == 0 ]]; then
+            python3 evaluate_counts.py "$RESULTS_DIR/$model_name" 2>&1 </dev/null \
+                | stamp_lines >> "log_${tag}.txt" || true
+        fi
         rm -rf "$scratch_dir" "$run_file"
         echo "-> Finished $tag"
     ) &
@@ -0,0 +1,160 @@
+import os
+import re
+import sys
+import gzip
+import shutil
+import argparse
+import tempfile
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+module_path = Path("adaptive_events.py").resolve()
+spec = importlib.util.spec_from_file_location("adaptive_events", module_path)
+adaptive_events = importlib.util.module_from_spec(spec)
+sys.modules["adaptive_events"] = adaptive_events
+spec.loader.exec_module(adaptive_events)
+
+module_path = Path("evaluate_counts.py").resolve()
+spec = importlib.util.spec_from_file_location("evaluate_counts", module_path)
+evaluate_counts = importlib.util.module_from_spec(spec)
+sys.modules["evaluate_counts"] = evaluate_counts
+spec.loader.exec_module(evaluate_counts)
+
+RESULTS_DIR = adaptive_events.RESULTS_DIR
+
+
+def events_per_run(pythia_card=adaptive_events.PYTHIA_TEMPLATE):
+    """Main:numberOfEvents of the Pythia card, as a single run would use."""
+    with open(pythia_card) as f:
+        match = re.search(r"(?m)^Main:numberOfEvents *= *(\d+)", f.read())
+    return int(match.group(1)) if match else None
+
+
+def split_lhe(lhe_file, n_shards, out_dir, max_events=None):
+    """
+    Split an LHE file into n_shards files in one streaming pass.
+
+    Every shard gets the header and <init> block; the first max_events
+    events (all if None), which are the ones a single run would read, are
+    dealt out round-robin.
+
+    Returns:
+        List of (shard path, number of events)
+    """
+    opener = gzip.open if lhe_file.endswith(".gz") else open
+    paths = [os.path.join(out_dir, f"shard{i}.lhe.gz") for i in range(n_shards)]
+    outputs = [gzip.open(path, "wt", compresslevel=1) for path in paths]
+    counts = [0] * n_shards
+    header = []
+    current = None
+    n = 0
+    try:
+        with opener(lhe_file, "rt") as f:
+            for line in f:
+                stripped = line.lstrip()
+                if current is None and stripped.startswith("<event"):
+                    if max_events is not None and n >= max_events:
+                        break
+                    if header is not None:
+                        for out in outputs:
+                            out.writelines(header)
+                        header = None
+                    current = outputs[n % n_shards]
+                    counts[n % n_shards] += 1
+                    n += 1
+                if current is not None:
+                    current.write(line)
+                    if stripped.startswith("</event"):
+                        current = None
+                elif header is not None:
+                    header.append(line)
+        for out in outputs:
+            if header is not None:
+                out.writelines(header)
+            out.write("</LesHouchesEvents>\n")
+    finally:
+        for out in outputs:
+            out.close()
+    return list(zip(paths, counts))
+
+
+def run_shard(runner, name, lhe_file, n_events, seed, results_dir, template):
+    """
+    One shard run; if the run card skips CheckMATE's evaluation
+    (SkipEvaluation: True), its total_results.txt is computed from the
+    signal counts with evaluate_counts.py.
+    """
+    path = runner(name, lhe_file, n_events, 0, seed, results_dir, template)
+    if not os.path.isfile(path):
+        point_dir = os.path.dirname(os.path.dirname(path))
+        path = evaluate_counts.write_total_results(point_dir, evaluate_counts.evaluate_point(point_dir))
+    return path
+
+
+def run_sharded(name, lhe_file, n_shards, n_events=None, seed=1, results_dir=RESULTS_DIR,
+                runner=adaptive_events.run_checkmate, scratch=".", keep_shards=False,
+                template=adaptive_events.TEMPLATE_FILE):
+    """
+    Run one model point as n_shards parallel CheckMATE jobs and merge them.
+
+    The LHE file is split with split_lhe; shard i runs as <name>_shard<i>
+    with Pythia seed `seed + i`. The per-shard total_results.txt are merged
+    as independent runs of the point (adaptive_events.merge_runs: event-
+    weighted s, ds in quadrature, rexpcons from s95exp) into
+    <results_dir>/<name>/evaluation/total_results.txt, the file a single
+    run would have written; the <name>_shard<i> folders are then removed.
+
+    Args:
+        n_events (int or None): Events of the point, by default those of the
+            Pythia card (Main:numberOfEvents)
+        runner (callable): runner(name, lhe, n_events, skip, seed, results_dir, template)
+            returning the run's total_results.txt, see adaptive_events.run_checkmate
+        template (str): Run card of every shard, e.g. the run_<tag>.dat of
+            run_all_fpvdm.sh (a pruned card, SkipEvaluation)
+
+    Returns:
+        Path of the merged total_results.txt
+    """
+    if n_events is None:
+        n_events = events_per_run()
+    shard_dir = tempfile.mkdtemp(prefix=f"tmp_shards_{name}_", dir=scratch)
+    names = []
+    try:
+        shards = [(path, n) for path, n in split_lhe(lhe_file, n_shards, shard_dir, n_events) if n > 0]
+        names = [f"{name}_shard{i}" for i in range(len(shards))]
+        print(f"{name}: {sum(n for _, n in shards)} events in {len(shards)} shards")
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            futures = [pool.submit(run_shard, runner, shard_name, path, n, seed + i, results_dir, template)
+                       for i, (shard_name, (path, n)) in enumerate(zip(names, shards))]
+            paths = [future.result() for future in futures]
+        runs = [(pd.read_csv(path, sep=r"\s+"), n) for path, (_, n) in zip(paths, shards)]
+    finally:
+        if not keep_shards:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+        adaptive_events.remove_runs(names, results_dir)
+
+    merged = adaptive_events.merge_runs(runs) if len(runs) > 1 else runs[0][0]
+    out_dir = os.path.join(results_dir, name, "evaluation")
+    os.makedirs(out_dir, exist_ok=True)
+    output = os.path.join(out_dir, "total_results.txt")
+    merged.to_csv(output, sep=" ", index=False)
+    print(f"{name}: merged into {output}")
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one point as parallel CheckMATE jobs over LHE event shards")
+    parser.add_argument("name", help="CheckMATE run name, e.g. fpvdm_Mtp1500DMV100")
+    parser.add_argument("lhe_file")
+    parser.add_argument("--shards", type=int, default=os.cpu_count())
+    parser.add_argument("--events", type=int, default=None, help="events of the point (default: Pythia card)")
+    parser.add_argument("--seed", type=int, default=1, help="Pythia seed of the first shard")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--template", default=adaptive_events.TEMPLATE_FILE, help="CheckMATE run card of the shards")
+    args = parser.parse_args()
+
+    run_sharded(args.name, args.lhe_file, args.shards, args.events, args.seed, args.results_dir,
+                template=args.template)
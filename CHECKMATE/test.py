@@ -4,12 +4,22 @@ from pathlib import Path
 import importlib.util
 import sys
 
-# Load combine_signal_regions module from user-provided file
-module_path = Path("combine_signal_regions.py").resolve()
-spec = importlib.util.spec_from_file_location("combine_signal_regions", module_path)
-combine_signal_regions = importlib.util.module_from_spec(spec)
-sys.modules["combine_signal_regions"] = combine_signal_regions
-spec.loader.exec_module(combine_signal_regions)
+# Ask a running limit_server.py if there is one (no pyhf import or warm-up here),
+# otherwise load combine_signal_regions module from user-provided file
+module_path = Path("limit_client.py").resolve()
+spec = importlib.util.spec_from_file_location("limit_client", module_path)
+limit_client = importlib.util.module_from_spec(spec)
+sys.modules["limit_client"] = limit_client
+spec.loader.exec_module(limit_client)
+
+if limit_client.available():
+    combine_signal_regions = limit_client
+else:
+    module_path = Path("combine_signal_regions.py").resolve()
+    spec = importlib.util.spec_from_file_location("combine_signal_regions", module_path)
+    combine_signal_regions = importlib.util.module_from_spec(spec)
+    sys.modules["combine_signal_regions"] = combine_signal_regions
+    spec.loader.exec_module(combine_signal_regions)
 
 # Manually defined SRs for testing
 manual_data = [
@@ -0,0 +1,165 @@
+import sys
+import atexit
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+module_path = Path("native_cls.py").resolve()
+spec = importlib.util.spec_from_file_location("native_cls", module_path)
+native_cls = importlib.util.module_from_spec(spec)
+sys.modules["native_cls"] = native_cls
+spec.loader.exec_module(native_cls)
+
+# Shared process pool, created on first use and reused by every limit
+_POOL = None
+_POOL_WORKERS = 0
+
+# Toy limits already computed in this process, keyed by all their inputs
+_LIMITS = {}
+
+
+def get_pool(workers):
+    global _POOL, _POOL_WORKERS
+    if _POOL is None or _POOL_WORKERS != workers:
+        if _POOL is not None:
+            _POOL.shutdown()
+        _POOL = ProcessPoolExecutor(max_workers=workers)
+        _POOL_WORKERS = workers
+        atexit.register(_POOL.shutdown)
+    return _POOL
+
+
+def toy_counts(b, db, mu, n_obs, ntoys, seed_words):
+    """
+    Throw ntoys pseudo-experiments under the signal+background (mu) and the
+    background-only hypothesis, fit them all at once and count how many give
+    q~_mu at least as large as the observed one.
+
+    Nuisance parameters are set to their conditional fits to the observed data
+    (profiled at mu and at 0); toys vary the event count (Poisson) and the
+    auxiliary measurement (unit Gaussian).
+
+    Returns:
+        (number of s+b toys with q >= q_obs, number of b-only toys with q >= q_obs)
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed_words))
+    observed = native_cls.CountingModel(b, db)
+    q_obs = observed.qmu_tilde(mu, n_obs, 0.0)
+    theta_mu = observed.profile_theta(mu, n_obs, 0.0)
+    theta_0 = observed.profile_theta(0.0, n_obs, 0.0)
+
+    toys = native_cls.CountingModel(np.full(ntoys, b), np.full(ntoys, db))
+    counts = []
+    for signal, theta in ((mu, theta_mu), (0.0, theta_0)):
+        lam = signal + b * observed.interp(theta)[0]
+        n = rng.poisson(lam, ntoys).astype(float)
+        aux = rng.normal(theta, 1.0, ntoys)
+        counts.append(int(np.count_nonzero(toys.qmu_tilde(mu, n, aux) >= q_obs)))
+    return tuple(counts)
+
+
+def toy_cls(b, db, mu, n_obs, level=0.05, batch=5000, max_toys=200000, z=3.0, seed=0, workers=1):
+    """
+    Toy-MC CLs at signal strength mu, adding batches of toys until CLs is
+    separated from `level` by z standard deviations or max_toys is reached.
+    With workers > 1 each round runs `workers` batches in the process pool.
+
+    Returns:
+        (CLs estimate, number of toys per hypothesis)
+    """
+    words = [seed] + [int(w) for w in np.array([b, db, mu, n_obs]).view(np.uint32)]
+    workers = max(workers, 1)
+    k_sb = k_b = total = 0
+    index = 0
+    while True:
+        seeds = [words + [index + j] for j in range(workers)]
+        if workers > 1:
+            pool = get_pool(workers)
+            futures = [pool.submit(toy_counts, b, db, mu, n_obs, batch, s) for s in seeds]
+            results = [f.result() for f in futures]
+        else:
+            results = [toy_counts(b, db, mu, n_obs, batch, seeds[0])]
+        # Batches are checked in order, so the answer does not depend on workers
+        for r_sb, r_b in results:
+            k_sb += r_sb
+            k_b += r_b
+            total += batch
+            index += 1
+
+            p_sb = k_sb / total
+            p_b = max(k_b, 1) / total
+            cls = p_sb / p_b
+            # Binomial errors of the two tail fractions, propagated to the ratio
+            err = cls * np.sqrt((1 - p_sb) / max(k_sb, 1) + (1 - p_b) / max(k_b, 1))
+            if abs(cls - level) > z * err or total >= max_toys:
+                return cls, total
+
+
+def upper_limit(b, db, n=None, level=0.05, rtol=0.01, batch=5000, max_toys=200000,
+                z=3.0, seed=0, workers=1):
+    """
+    95% CL upper limit on the signal yield from toy-MC CLs, for one SR.
+
+    The asymptotic limit of native_cls.upper_limit seeds the bracket, which is
+    widened until the toys confirm it and then bisected until it is narrower
+    than rtol (relative). Each CLs evaluation stops as soon as the toys decide
+    on which side of `level` it lies, so only mu values close to the root need
+    the full max_toys. Results are deterministic for a given seed.
+
+    Args:
+        b (float): Background yield
+        db (float): Background uncertainty
+        n (float or None): Observed events (default b + 1, as in the pyhf path)
+        level (float): CLs level
+        rtol (float): Relative width of the final bracket
+        batch (int): Toys per hypothesis per batch
+        max_toys (int): Maximum toys per hypothesis for one CLs value
+        z (float): Standard deviations required to decide a CLs comparison
+        seed (int): Base random seed
+        workers (int): Processes used for the toy batches
+
+    Returns:
+        Upper limit (NaN where the normsys is not defined, e.g. db >= b)
+    """
+    n = b + 1.0 if n is None else n
+    key = (b, db, n, level, rtol, batch, max_toys, z, seed)
+    if key in _LIMITS:
+        return _LIMITS[key]
+    if not native_cls.CountingModel(b, db).valid:
+        return np.nan
+
+    def above(mu):
+        return toy_cls(b, db, mu, n, level, batch, max_toys, z, seed, workers)[0] > level
+
+    asymptotic = native_cls.upper_limit(b, db, n=n, level=level)
+    lo, hi = 0.8 * asymptotic, 1.25 * asymptotic
+    while not above(lo):
+        lo, hi = 0.5 * lo, lo
+    while above(hi):
+        lo, hi = hi, 2 * hi
+
+    while hi - lo > rtol * hi:
+        mid = 0.5 * (lo + hi)
+        if above(mid):
+            lo = mid
+        else:
+            hi = mid
+
+    _LIMITS[key] = 0.5 * (lo + hi)
+    return _LIMITS[key]
+
+
+if __name__ == "__main__":
+    import time
+
+    cases = [(0.0001, 0.0), (0.6, 0.4), (2.8, 0.9), (3.2, 0.5), (5.6, 0.7)]
+    print("\n===== Toy-MC vs asymptotic CLs limits =====")
+    for b, db in cases:
+        start = time.perf_counter()
+        toys = upper_limit(b, db)
+        elapsed = time.perf_counter() - start
+        asymptotic = native_cls.upper_limit(b, db)
+        print(f"b = {b:7.4g}  db = {db:4.2g}  s95 toys = {toys:8.4f}  asymptotic = {asymptotic:8.4f}  ({elapsed:.1f} s)")
+    print("===========================================\n")
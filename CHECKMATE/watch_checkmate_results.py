@@ -0,0 +1,247 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import importlib.util
+from pathlib import Path
+
+
+def load_module(name):
+    module_path = Path(f"{name}.py").resolve()
+    spec = importlib.util.spec_from_file_location(name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+filter_adaptive = load_module("filter_relevant_signal_regions_adaptive")
+batch_combine = load_module("batch_combine_signal_regions")
+compact_results = load_module("compact_results")
+
+RESULT_SUFFIX = os.path.join("evaluation", "total_results.txt")
+
+
+class InotifyWaker:
+    """
+    Wake the polling loop as soon as anything changes in the results tree.
+
+    Uses inotify_simple when it is installed; the directory scan in
+    find_completed_points stays the source of truth, inotify only replaces the
+    sleep between scans. Without inotify_simple, wait() is a plain sleep.
+    """
+
+    def __init__(self, base_dir):
+        self.watched = set()
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            self.inotify = None
+            return
+        self.inotify = INotify()
+        self.mask = flags.CREATE | flags.MOVED_TO | flags.CLOSE_WRITE
+        self.add(base_dir)
+
+    def add(self, path):
+        if self.inotify is None or path in self.watched or not os.path.isdir(path):
+            return
+        try:
+            self.inotify.add_watch(path, self.mask)
+            self.watched.add(path)
+        except OSError:
+            pass
+
+    def wait(self, timeout):
+        if self.inotify is None:
+            time.sleep(timeout)
+        else:
+            self.inotify.read(timeout=int(timeout * 1000))
+
+
+def find_completed_points(base_dir, prefix, seen, settle=30.0, waker=None):
+    """
+    Return (folder, total_results.txt path, mtime) for every point whose
+    evaluation/total_results.txt is new or changed since `seen` and has not
+    been modified for `settle` seconds.
+    """
+    now = time.time()
+    ready = []
+    with os.scandir(base_dir) as entries:
+        for entry in entries:
+            if not entry.name.startswith(prefix) or not entry.is_dir():
+                continue
+            if waker is not None:
+                waker.add(entry.path)
+                waker.add(os.path.join(entry.path, "evaluation"))
+            path = os.path.join(entry.path, RESULT_SUFFIX)
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if seen.get(entry.name) == mtime or now - mtime < settle:
+                continue
+            ready.append((entry.name, path, mtime))
+    return sorted(ready)
+
+
+def load_state(state_file):
+    seen = {}
+    if os.path.isfile(state_file):
+        with open(state_file) as f:
+            for line in f:
+                folder, mtime = line.split("\t")
+                seen[folder] = float(mtime)
+    return seen
+
+
+def append_line(path, line, header=None):
+    """
+    Append one line and fsync, writing `header` first if the file is new,
+    so an interrupted watch keeps every point finished so far.
+    """
+    new_file = not os.path.isfile(path) or os.path.getsize(path) == 0
+    with open(path, "a") as f:
+        if new_file and header is not None:
+            f.write(header + "\n")
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def drop_rows(path, key):
+    """
+    Remove rows starting with the (Mtp, DMV, Lumi) fields in `key` from a
+    summary file, e.g. before appending the result of a re-run point.
+    """
+    if not os.path.isfile(path):
+        return
+    with open(path) as f:
+        lines = f.readlines()
+    kept = [line for line in lines if line.split("\t")[:3] != key]
+    if len(kept) != len(lines):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(kept)
+        os.replace(tmp, path)
+
+
+def compact_pending(base_dir, pending, policy, settle):
+    """
+    Try to compact every folder in `pending` (see compact_results.compact_point)
+    and drop those that were compacted; folders with a file still being
+    written stay pending for the next scan.
+    """
+    for folder in sorted(pending):
+        point_dir = os.path.join(base_dir, folder)
+        if not os.path.isdir(point_dir):
+            pending.discard(folder)
+            continue
+        try:
+            records = compact_results.compact_point(point_dir, policy, settle=settle)
+        except Exception as e:
+            print(f"{folder}: Error: {e}")
+            pending.discard(folder)
+            continue
+        if records:
+            compact_results.append_index(os.path.join(base_dir, compact_results.INDEX_FILE), records)
+        if os.path.isfile(os.path.join(point_dir, compact_results.MARKER)):
+            pending.discard(folder)
+
+
+def watch(base_dir, prefix="fpvdm_", output_base="filtered_regions",
+          lumi_outputs=((1, "summary_results.txt"), (3000. / 139., "summary_results_HL_LHC.txt")),
+          filter_settings=None, poll_interval=60.0, settle=30.0,
+          plot_script="plot_r_exp_contours_MTP-DMV_new.py", plot_interval=600.0,
+          state_file="watch_state.txt", once=False, compact_policy=None):
+    """
+    Follow a CheckMATE results folder while run_all_fpvdm.sh is running.
+
+    Every newly finished point is filtered into output_base/<folder>/, combined
+    for each (lumi factor, summary file) in lumi_outputs and appended to that
+    summary file. The contour plot is re-rendered at most once per
+    plot_interval seconds while new rows keep arriving.
+
+    Args:
+        base_dir (str): CheckMATE results folder
+        prefix (str): Only follow folders starting with this prefix
+        output_base (str): Where filtered_regions.txt files are written
+        lumi_outputs (list of (float, str)): Luminosity factor and summary file
+        filter_settings (dict): Keyword arguments for filter_point
+        poll_interval (float): Seconds between scans (or inotify wake-up timeout)
+        settle (float): total_results.txt must be this many seconds old
+        plot_script (str or None): Plotter to run when new rows arrive
+        plot_interval (float): Minimum seconds between two plot renders
+        state_file (str): Records processed folders so a restart resumes
+        once (bool): Process what is already finished and return
+        compact_policy (str or None): If given, each processed point folder is
+            compacted with this compact_results retention policy, retried on
+            later scans while its files are still changing
+    """
+    if filter_settings is None:
+        filter_settings = dict(min_threshold=0.01, min_keep=10, max_keep=10)
+
+    header = "\t".join(batch_combine.HEADER)
+    seen = load_state(state_file)
+    # Processed points still to be compacted, including those of an earlier watch
+    pending = set()
+    if compact_policy is not None:
+        pending = {f for f in seen if not os.path.isfile(os.path.join(base_dir, f, compact_results.MARKER))}
+    waker = None if once else InotifyWaker(base_dir)
+    if waker is not None:
+        mode = "inotify" if waker.inotify is not None else "mtime polling"
+        print(f"Watching {base_dir} ({mode}), {len(seen)} points already processed")
+
+    last_plot = 0.0
+    dirty = False
+    while True:
+        for folder, path, mtime in find_completed_points(base_dir, prefix, seen, settle, waker):
+            filtered_path = os.path.join(output_base, folder, "filtered_regions.txt")
+            try:
+                filter_adaptive.filter_point(path, filtered_path, **filter_settings)
+                for lumi_factor, summary_file in lumi_outputs:
+                    row = batch_combine.process_point(Path(filtered_path), lumi_factor)
+                    if row is not None:
+                        if folder in seen:
+                            drop_rows(summary_file, row[:3])
+                        append_line(summary_file, "\t".join(row), header)
+                        print(f"{folder}\t" + "\t".join(row))
+                        dirty = True
+                if compact_policy is not None:
+                    # total_results.txt stays in place, so the point is not picked up again
+                    pending.add(folder)
+            except Exception as e:
+                print(f"{folder}: Error: {e}")
+            seen[folder] = mtime
+            append_line(state_file, f"{folder}\t{mtime}")
+        if pending:
+            compact_pending(base_dir, pending, compact_policy, settle)
+
+        if dirty and plot_script and (once or time.time() - last_plot >= plot_interval):
+            result = subprocess.run([sys.executable, plot_script], capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"Plot failed: {result.stderr.strip().splitlines()[-1:]}")
+            else:
+                print(f"Plot updated ({plot_script})")
+            last_plot = time.time()
+            dirty = False
+
+        if once:
+            if pending:
+                print(f"{len(pending)} points not compacted yet (files still changing): {', '.join(sorted(pending))}")
+            return
+        waker.wait(poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update filtered regions, summaries and plots as CheckMATE points finish")
+    parser.add_argument("--base-path", default="/home/belyaev/packages/CHECKMATE/checkmate2/results")
+    parser.add_argument("--poll", type=float, default=60.0, help="seconds between scans")
+    parser.add_argument("--plot-interval", type=float, default=600.0, help="minimum seconds between plot renders")
+    parser.add_argument("--once", action="store_true", help="process finished points and exit")
+    parser.add_argument("--compact", choices=["keep", "gzip", "delete"], default=None, metavar="POLICY",
+                        help="compact each processed point folder (see compact_results.py)")
+    args = parser.parse_args()
+
+    watch(args.base_path, poll_interval=args.poll, plot_interval=args.plot_interval, once=args.once,
+          compact_policy=args.compact)
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import importlib.util
+import multiprocessing
+from fractions import Fraction
+from pathlib import Path
+from contextlib import nullcontext
+
+module_path = Path("batch_combine_signal_regions.py").resolve()
+spec = importlib.util.spec_from_file_location("batch_combine_signal_regions", module_path)
+batch_combine = importlib.util.module_from_spec(spec)
+sys.modules["batch_combine_signal_regions"] = batch_combine
+spec.loader.exec_module(batch_combine)
+
+combine_signal_regions = batch_combine.combine_signal_regions
+result_cache = batch_combine.result_cache
+
+# Queue layout on the shared filesystem:
+#   config.json        lumi factors, scenarios and engine, written by init_queue
+#   todo/<point>       one JSON task per model point
+#   claimed/<point>    a task moved here by the worker that runs it (os.rename is
+#                      atomic, so exactly one worker wins); its mtime is the heartbeat
+#   done/<point>.json  formatted summary rows of the point
+#   failed/<point>     the task plus the error, for points that raised
+SUBDIRS = ["todo", "claimed", "done", "failed"]
+
+
+def init_queue(queue_dir, root_dir="filtered_regions", lumi_factors=(1,), scenarios=("stat",)):
+    """
+    Create (or top up) a queue with one task per */filtered_regions.txt in
+    root_dir, a folder or a zip/tar archive of one. Points that are already queued, running or done are skipped.
+    """
+    for sub in SUBDIRS:
+        os.makedirs(os.path.join(queue_dir, sub), exist_ok=True)
+    config = {
+        "lumi_factors": list(lumi_factors),
+        "scenarios": list(scenarios),
+        "engine": combine_signal_regions.ENGINE_SETTINGS,
+    }
+    result_cache.write_atomic(os.path.join(queue_dir, "config.json"), json.dumps(config, indent=1))
+
+    existing = set()
+    for sub in SUBDIRS:
+        existing.update(name.split(".json")[0] for name in os.listdir(os.path.join(queue_dir, sub)))
+    added = 0
+    for path in sorted(batch_combine.find_filtered_regions(root_dir), key=str):
+        point = path.parent.name
+        if point in existing:
+            continue
+        if isinstance(path, batch_combine.region_archive.ArchiveMember):
+            task = json.dumps({"point": point, "path": path.archive.path, "member": path.member})
+        else:
+            task = json.dumps({"point": point, "path": str(path.resolve())})
+        result_cache.write_atomic(os.path.join(queue_dir, "todo", point), task)
+        added += 1
+    print(f"{added} points queued in {queue_dir}")
+    return added
+
+
+def claim(queue_dir):
+    """
+    Move the next task from todo/ to claimed/; returns (point, claimed path)
+    or None when todo/ is empty. Losing a rename race just tries the next task.
+    """
+    for point in sorted(os.listdir(os.path.join(queue_dir, "todo"))):
+        if point.endswith(".tmp"):
+            continue
+        source = os.path.join(queue_dir, "todo", point)
+        target = os.path.join(queue_dir, "claimed", point)
+        try:
+            # Fresh mtime first, so the claim is never mistaken for a stale one
+            os.utime(source)
+            os.rename(source, target)
+        except FileNotFoundError:
+            continue
+        return point, target
+    return None
+
+
+def recover_stale(queue_dir, stale_after):
+    """Return claims whose heartbeat is older than stale_after seconds to todo/."""
+    now = time.time()
+    recovered = []
+    claimed_dir = os.path.join(queue_dir, "claimed")
+    for point in os.listdir(claimed_dir):
+        path = os.path.join(claimed_dir, point)
+        try:
+            if now - os.stat(path).st_mtime < stale_after:
+                continue
+            os.rename(path, os.path.join(queue_dir, "todo", point))
+            recovered.append(point)
+        except FileNotFoundError:
+            continue
+    if recovered:
+        print(f"Recovered stale claims: {', '.join(recovered)}")
+    return recovered
+
+
+class Heartbeat:
+    """Touch a claim file every `interval` seconds while the point is computed."""
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+def worker(queue_dir, stale_after=900.0, heartbeat=30.0, cache_dir=".result_cache", wait=False):
+    """
+    Claim and evaluate points until todo/ is empty. With wait=True the worker
+    keeps polling while other workers hold claims, so it can pick up points
+    whose claims go stale.
+
+    Returns:
+        Number of points this worker completed
+    """
+    with open(os.path.join(queue_dir, "config.json")) as f:
+        config = json.load(f)
+    engine = config["engine"]
+    combine_signal_regions.set_engine(engine["engine"])
+    if "toys" in engine:
+        combine_signal_regions.set_toys(**engine["toys"])
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stage = lambda name: nullcontext()
+    count = lambda counter, n=1: None
+
+    archives = {}
+    completed = 0
+    while True:
+        recover_stale(queue_dir, stale_after)
+        claimed = claim(queue_dir)
+        if claimed is None:
+            if wait and os.listdir(os.path.join(queue_dir, "claimed")):
+                time.sleep(min(heartbeat, stale_after / 4))
+                continue
+            break
+        point, claim_path = claimed
+        with open(claim_path) as f:
+            task = json.load(f)
+        try:
+            if "member" in task:
+                if task["path"] not in archives:
+                    archives[task["path"]] = batch_combine.region_archive.RegionArchive(task["path"])
+                path = batch_combine.region_archive.ArchiveMember(archives[task["path"]], task["member"])
+            else:
+                path = Path(task["path"])
+            with Heartbeat(claim_path, heartbeat):
+                rows = batch_combine.process_point_scenarios(path, config["lumi_factors"],
+                                                             config["scenarios"], stage, count, cache_dir)
+            done = {"point": point, "worker": worker_id,
+                    "rows": [[k, scenario, row] for (k, scenario), row in rows.items()]}
+            result_cache.write_atomic(os.path.join(queue_dir, "done", point + ".json"), json.dumps(done))
+            completed += 1
+            print(f"[{worker_id}] {point} done")
+        except Exception as e:
+            task["error"] = f"{type(e).__name__}: {e}"
+            task["worker"] = worker_id
+            result_cache.write_atomic(os.path.join(queue_dir, "failed", point), json.dumps(task))
+            print(f"[{worker_id}] {point}: Error: {e}")
+        try:
+            os.remove(claim_path)
+        except FileNotFoundError:
+            pass
+    return completed
+
+
+def merge(queue_dir, output=None):
+    """
+    Collect done/*.json into the summary table, exactly as
+    process_all_filtered_regions would have written it.
+    """
+    with open(os.path.join(queue_dir, "config.json")) as f:
+        config = json.load(f)
+    long_format = len(config["lumi_factors"]) > 1 or config["scenarios"] != ["stat"]
+    if output is None:
+        output = "summary_results_long.txt" if long_format else "summary_results.txt"
+
+    results = []
+    done_dir = os.path.join(queue_dir, "done")
+    for name in sorted(os.listdir(done_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(done_dir, name)) as f:
+            for k, scenario, row in json.load(f)["rows"]:
+                if row is not None:
+                    results.append(row[:3] + [scenario] + row[3:] if long_format else row)
+    batch_combine.write_summary(results, long_format, output)
+
+    pending = {sub: len(os.listdir(os.path.join(queue_dir, sub))) for sub in ("todo", "claimed", "failed")}
+    print(f"{len(results)} rows written to {output}; still todo {pending['todo']}, "
+          f"claimed {pending['claimed']}, failed {pending['failed']}")
+
+
+def status(queue_dir):
+    counts = {sub: len(os.listdir(os.path.join(queue_dir, sub))) for sub in SUBDIRS}
+    print("  ".join(f"{sub}: {n}" for sub, n in counts.items()))
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared-directory work queue for the SR combination stage")
+    parser.add_argument("command", choices=["init", "work", "merge", "status"])
+    parser.add_argument("--queue", default="combine_queue", help="queue directory on a shared filesystem")
+    parser.add_argument("--root", default="filtered_regions", help="init: folder with */filtered_regions.txt, or a zip/tar archive of it")
+    parser.add_argument("--lumi", type=lambda x: float(Fraction(x)), nargs="+", default=[1],
+                        help="init: luminosity factor(s)")
+    parser.add_argument("--scenario", nargs="+", default=["stat"],
+                        choices=sorted(combine_signal_regions.SYST_SCENARIOS), help="init: scenario(s)")
+    parser.add_argument("--engine", choices=["pyhf", "native"], default="pyhf", help="init: s95exp engine")
+    parser.add_argument("--workers", type=int, default=1, help="work: local worker processes")
+    parser.add_argument("--stale-after", type=float, default=900.0,
+                        help="work: seconds without heartbeat before a claim is taken over")
+    parser.add_argument("--wait", action="store_true", help="work: keep polling while other claims are open")
+    parser.add_argument("--no-cache", action="store_true", help="work: do not use .result_cache/")
+    parser.add_argument("--output", default=None, help="merge: output table")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        combine_signal_regions.set_engine(args.engine)
+        lumi_factors = [int(k) if k == int(k) else k for k in args.lumi]
+        init_queue(args.queue, args.root, lumi_factors, args.scenario)
+    elif args.command == "work":
+        cache_dir = None if args.no_cache else ".result_cache"
+        work_args = (args.queue, args.stale_after, 30.0, cache_dir, args.wait)
+        if args.workers > 1:
+            processes = [multiprocessing.Process(target=worker, args=work_args) for _ in range(args.workers)]
+            for p in processes:
+                p.start()
+            for p in processes:
+                p.join()
+        else:
+            worker(*work_args)
+    elif args.command == "merge":
+        merge(args.queue, args.output)
+    else:
+        status(args.queue)
@@ -0,0 +1,203 @@
+import os
+import re
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+# Default ranges of the scanned FPVDM parameters: (low, high, log scale)
+RANGES = {
+    "Mtp": (1200.0, 2300.0, False),
+    "DMV": (0.025, 0.925, False),
+    "DM": (1.0, 100.0, True),
+    "gD": (0.1, 2.0, True),
+}
+
+# Values are rounded to these steps, so they survive the run and folder names
+# (Mtp as an integer for extract_mtp_dmv in batch_combine_signal_regions.py)
+RESOLUTION = {"Mtp": 1.0, "DMV": 0.001, "DM": 0.1, "gD": 0.001}
+
+RUN_KEYS = ("Run parameter:", "Run begin:", "Run step size:", "Run n steps:")
+DERIVED = re.compile(r"^Parameter:\s*(\w+)\s*=\s*(.*[A-Za-z].*?)\s*$")
+
+
+def sample(ranges, n, method="sobol", seed=0):
+    """
+    n quasi-random points in the box `ranges` {name: (low, high, log)}:
+    scrambled Sobol or Latin hypercube (scipy.stats.qmc), log-uniform for
+    log parameters and rounded to RESOLUTION.
+
+    Returns:
+        DataFrame with one column per parameter
+    """
+    names = list(ranges)
+    if method == "sobol":
+        unit = qmc.Sobol(len(names), scramble=True, seed=seed).random(n)
+    elif method == "lhs":
+        unit = qmc.LatinHypercube(len(names), seed=seed).random(n)
+    else:
+        raise ValueError(f"unknown sampling method {method}")
+
+    points = pd.DataFrame(index=range(n))
+    for i, name in enumerate(names):
+        low, high, log = ranges[name]
+        if log:
+            values = np.exp(np.log(low) + unit[:, i] * (np.log(high) - np.log(low)))
+        else:
+            values = low + unit[:, i] * (high - low)
+        step = RESOLUTION.get(name)
+        points[name] = np.round(values / step) * step if step else values
+    return points.round(6)
+
+
+def derived_parameters(template_lines, scanned):
+    """Parameter: X=<expression> lines of the batch template that use scanned parameters."""
+    derived = {}
+    for line in template_lines:
+        match = DERIVED.match(line.strip())
+        if match and any(re.search(rf"\b{p}\b", match.group(2)) for p in scanned):
+            derived[match.group(1)] = match.group(2)
+    return derived
+
+
+def template_values(template_lines):
+    """
+    Fixed numeric Parameter: values and the Run parameters of the template
+    with their begin values, in template order.
+
+    Returns:
+        (dict of fixed parameters, dict of run parameters)
+    """
+    fixed, runs = {}, {}
+    name = None
+    for line in template_lines:
+        stripped = line.strip()
+        match = re.match(r"Parameter:\s*(\w+)\s*=\s*([-+0-9.eE]+)\s*$", stripped)
+        if match:
+            fixed[match.group(1)] = float(match.group(2))
+        elif stripped.startswith("Run parameter:"):
+            name = stripped.split(":", 1)[1].strip()
+        elif stripped.startswith("Run begin:") and name is not None:
+            runs[name] = float(stripped.split(":", 1)[1])
+    return fixed, runs
+
+
+def run_name(point, run_parameters):
+    """CalcHEP run name of a point, e.g. Mtp1523DMV0.314DM12.5gD0.431."""
+    return "".join(f"{name}{point[name]:g}" for name in run_parameters)
+
+
+def batch_file(template_lines, point, run_parameters, events=None):
+    """
+    The template with its Run blocks replaced by one single-step Run block
+    per run parameter, at the point's value (fixed Parameter: lines of those
+    are dropped). The Filename is kept, so the events still come out as
+    <Filename>-<run name>.lhe.gz, which run_all_fpvdm.sh looks for.
+    """
+    out = []
+    inserted = in_runs = False
+    for line in template_lines:
+        stripped = line.strip()
+        if stripped.startswith(RUN_KEYS) or stripped.startswith(tuple(f"#{k}" for k in RUN_KEYS)):
+            if not inserted:
+                for name in run_parameters:
+                    out += [f"Run parameter: {name}\n", f"Run begin:     {point[name]:g}\n",
+                            "Run step size: 0\n", "Run n steps:   1\n", "\n"]
+                inserted = True
+            in_runs = True
+            continue
+        if in_runs and not stripped:
+            continue
+        in_runs = False
+        match = re.match(r"Parameter:\s*(\w+)\s*=\s*([-+0-9.eE]+)\s*$", stripped)
+        if match and match.group(1) in run_parameters:
+            continue
+        if events is not None and stripped.startswith("Number of events"):
+            line = f"Number of events (per run step): {events}\n"
+        out.append(line)
+    return "".join(out)
+
+
+def generate_scan(template, out_dir, ranges=RANGES, n=64, method="sobol", seed=0, events=None, require=None):
+    """
+    Write one CalcHEP batch file per quasi-random point, plus scan_points.txt
+    with the run name, batch file, scanned and derived parameters of every
+    point.
+
+    Run parameters of the template that are not scanned keep their "Run
+    begin" value (as DM = 10 in the 2D grids). Derived parameters are the
+    template's Parameter: X=<expression> lines (MV=Mtp*(1-DMV), MtD=Mtp-DM,
+    ...), evaluated for the table; CalcHEP itself still evaluates them from
+    the batch file. Points failing any
+    `require` expression (by default: every derived mass M* > 0) or sharing
+    (Mtp, DMV) with an earlier point, which the CheckMATE folder names
+    could not tell apart, are dropped.
+
+    Returns:
+        DataFrame of the written points
+    """
+    with open(template) as f:
+        lines = f.readlines()
+    scanned = list(ranges)
+    fixed, template_runs = template_values(lines)
+    run_parameters = list(template_runs) + [name for name in scanned if name not in template_runs]
+    points = sample(ranges, n, method, seed)
+    for name in run_parameters:
+        if name not in scanned:
+            points[name] = template_runs[name]
+    points = points[run_parameters]
+    derived = derived_parameters(lines, run_parameters)
+    env = points.assign(**{k: v for k, v in fixed.items() if k not in points})
+    for name, expression in derived.items():
+        env[name] = points[name] = env.eval(expression).round(6)
+    if require is None:
+        require = [f"{name} > 0" for name in derived if name.startswith("M")]
+    keep = np.ones(len(points), dtype=bool)
+    for condition in require:
+        keep &= points.eval(condition).to_numpy()
+    if {"Mtp", "DMV"} <= set(scanned):
+        keep &= ~points.duplicated(["Mtp", "DMV"]).to_numpy()
+    if not keep.all():
+        print(f"{int((~keep).sum())} of {n} points dropped ({' and '.join(require)}, unique Mtp/DMV)")
+    points = points[keep].reset_index(drop=True)
+
+    base = re.search(r"(?m)^Filename:\s*(\S+)", "".join(lines))
+    base = base.group(1) if base else os.path.splitext(os.path.basename(template))[0]
+    os.makedirs(out_dir, exist_ok=True)
+    runs, files = [], []
+    for i, point in points.iterrows():
+        path = os.path.join(out_dir, f"batch_{base}_{method}{i:04d}")
+        with open(path, "w") as f:
+            f.write(batch_file(lines, point, run_parameters, events))
+        runs.append(run_name(point, run_parameters))
+        files.append(os.path.basename(path))
+    points.insert(0, "batch_file", files)
+    points.insert(0, "run", runs)
+    points.to_csv(os.path.join(out_dir, "scan_points.txt"), sep="\t", index=False)
+    print(f"{len(points)} {method} points over {', '.join(scanned)} written to {out_dir}/")
+    return points
+
+
+def parse_range(text):
+    """'gD=0.1:2:log' -> ('gD', (0.1, 2.0, True))"""
+    name, _, spec = text.partition("=")
+    parts = spec.split(":")
+    return name, (float(parts[0]), float(parts[1]), len(parts) > 2 and parts[2] == "log")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quasi-random FPVDM scan written as CalcHEP batch files")
+    parser.add_argument("template", nargs="?", default="pp_TpTp_FPVDM-batch_example", help="CalcHEP batch file to start from")
+    parser.add_argument("--out", default="scan_batches")
+    parser.add_argument("-n", type=int, default=64, help="number of points (a power of 2 for Sobol)")
+    parser.add_argument("--method", choices=["sobol", "lhs"], default="sobol")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--param", type=parse_range, action="append", default=None, metavar="NAME=LOW:HIGH[:log]",
+                        help="scanned parameter and range (repeatable; default Mtp, DMV, DM, gD)")
+    parser.add_argument("--events", type=int, default=None, help="number of events per point")
+    parser.add_argument("--require", nargs="*", default=None, help="conditions on the points, e.g. 'MV > 200'")
+    args = parser.parse_args()
+
+    ranges = dict(args.param) if args.param else RANGES
+    generate_scan(args.template, args.out, ranges, args.n, args.method, args.seed, args.events, args.require)
@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Run summaries of a CalcHEP batch: <batch dir>/html/runs/<run name>.txt
+RUN_SUMMARY = re.compile(r"(?:^|/)html/runs/(?P<run>[^/]+)\.txt$")
+
+# Scan parameters encoded in the run name, e.g. Mtp1500MV100DM10
+RUN_PARAMETER = re.compile(r"([A-Za-z]+)(\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)")
+
+# Columns identifying the parsed file; runs without a cross section keep a row
+# with sigma_fb NaN, so that an unchanged file is not parsed again
+BOOKKEEPING = ["source", "file", "mtime_ns", "size"]
+
+
+def parse_run_name(run):
+    """{'Mtp': 1500.0, 'MV': 100.0, 'DM': 10.0} for 'Mtp1500MV100DM10'."""
+    return {name: float(value) for name, value in RUN_PARAMETER.findall(run.split("_")[-1])}
+
+
+def parse_run_summary(text):
+    """
+    Parse one html/runs/*.txt summary.
+
+    Returns:
+        Dict with sigma_fb and sigma_err_fb (the Processes Total line), and
+        width(<particle>) and BR(<decay>) for every particle in the Decays
+        table; empty if the run has no cross section
+    """
+    row = {}
+    section = None
+    widths = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields:
+            section = None
+            continue
+        if fields[0] in ("Processes", "Decays", "Widths"):
+            section = fields[0]
+            continue
+        if section == "Processes" and fields[0] == "Total":
+            sigma, unc = float(fields[1]), float(fields[2])
+            row["sigma_fb"] = sigma
+            row["sigma_err_fb"] = sigma * unc / 100
+        elif section == "Decays" and "->" in fields[0]:
+            widths[fields[0]] = float(fields[1])
+
+    if not row.get("sigma_fb"):
+        return {}
+
+    totals = {}
+    for decay, width in widths.items():
+        parent = decay.split("->")[0]
+        totals[parent] = totals.get(parent, 0.0) + width
+    for parent, total in totals.items():
+        row[f"width({parent})"] = total
+    for decay, width in widths.items():
+        total = totals[decay.split("->")[0]]
+        row[f"BR({decay})"] = width / total if total > 0 else np.nan
+    return row
+
+
+def list_run_summaries(source):
+    """(file id, mtime_ns, size) of every run summary in a batch directory or zip."""
+    if zipfile.is_zipfile(source):
+        mtime = os.stat(source).st_mtime_ns
+        with zipfile.ZipFile(source) as z:
+            return sorted((info.filename, mtime, info.file_size) for info in z.infolist()
+                          if RUN_SUMMARY.search(info.filename))
+    found = []
+    for dirpath, _, filenames in os.walk(source):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, source).replace(os.sep, "/")
+            if RUN_SUMMARY.search(rel):
+                st = os.stat(path)
+                found.append((rel, st.st_mtime_ns, st.st_size))
+    return sorted(found)
+
+
+def _harvest_file(args):
+    source, name, mtime, size = args
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as z:
+            text = z.read(name).decode(errors="replace")
+    else:
+        with open(os.path.join(source, name), errors="replace") as f:
+            text = f.read()
+    row = parse_run_summary(text)
+    params = parse_run_name(RUN_SUMMARY.search(name)["run"])
+    if not row or not params:
+        # Recorded all the same, so the next harvest skips it while unchanged
+        return {"sigma_fb": np.nan, "source": source, "file": name, "mtime_ns": mtime, "size": size}
+    return {**params, **row, "source": source, "file": name, "mtime_ns": mtime, "size": size}
+
+
+def harvest(sources, output="calchep_xsec.txt", workers=None):
+    """
+    Collect the cross sections, widths and branchings of every CalcHEP run
+    under `sources` into one tab-separated table, one row per run.
+
+    The scan parameters come from the run name (Mtp, MV or DMV, DM, ...).
+    Rows of files whose mtime and size have not changed since the previous
+    harvest into `output` are kept as they are, so only new or re-run points
+    are parsed (in a process pool). Files without a cross section (e.g.
+    single.txt) get a row with sigma_fb NaN for the same reason.
+
+    Args:
+        sources (list of str): CalcHEP batch directories or zips of them
+        output (str): Table to create or update
+        workers (int or None): Parser processes (default os.cpu_count())
+
+    Returns:
+        DataFrame of the table
+    """
+    previous = pd.DataFrame(columns=BOOKKEEPING)
+    if os.path.isfile(output):
+        try:
+            previous = pd.read_csv(output, sep="\t")
+        except pd.errors.EmptyDataError:
+            pass  # empty table of a harvest that found nothing: no previous rows
+    # Tables of an older harvest have no size column: their files are parsed again
+    previous = previous.reindex(columns=list(dict.fromkeys(list(previous.columns) + BOOKKEEPING)))
+    known = {(s, f): (m, z) for s, f, m, z in previous[BOOKKEEPING].itertuples(index=False)}
+
+    todo = []
+    current = set()
+    for source in sources:
+        if not os.path.exists(source):
+            print(f"Warning: {source} does not exist")
+            continue
+        for name, mtime, size in list_run_summaries(source):
+            current.add((source, name))
+            if known.get((source, name)) != (mtime, size):
+                todo.append((source, name, mtime, size))
+
+    if len(todo) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_harvest_file, todo, chunksize=16))
+    else:
+        rows = [_harvest_file(args) for args in todo]
+
+    redone = {(source, name) for source, name, _, _ in todo}
+    keep = [(s, f) in current and (s, f) not in redone for s, f in zip(previous["source"], previous["file"])]
+    table = pd.concat([previous[keep], pd.DataFrame(rows)], ignore_index=True)
+
+    params = [c for c in table.columns if c not in BOOKKEEPING and not c.startswith(("sigma", "width(", "BR("))]
+    other = sorted(c for c in table.columns if c.startswith(("width(", "BR(")))
+    table = table.reindex(columns=params + ["sigma_fb", "sigma_err_fb"] + other + BOOKKEEPING)
+    table = table.sort_values(params + ["source"]).reset_index(drop=True) if len(table) else table
+    if len(table):
+        table[["mtime_ns", "size"]] = table[["mtime_ns", "size"]].astype("int64")
+
+    tmp = f"{output}.{os.getpid()}.tmp"
+    table.to_csv(tmp, sep="\t", index=False)
+    os.replace(tmp, output)
+    print(f"{len(todo)} run summaries parsed, {sum(keep)} reused, "
+          f"{int(table['sigma_fb'].notna().sum()) if len(table) else 0} runs with a cross section in {output}")
+    return table
+
+
+def load_xsec_table(path="calchep_xsec.txt"):
+    """
+    The harvested table indexed by its scan parameters, ready to join
+    against e.g. a CheckMATE summary on (Mtp, MV, DM).
+    """
+    table = pd.read_csv(path, sep="\t").dropna(subset=["sigma_fb"])
+    params = [c for c in table.columns if c not in BOOKKEEPING and not c.startswith(("sigma", "width(", "BR("))]
+    return table.set_index(params).sort_index()
+
+
+if __name__ == "__main__":
+    sources = sys.argv[1:] or ["pp_TpTp_decay_FPVDM.zip"]
+    table = harvest(sources)
+    table = table.dropna(subset=["sigma_fb"])
+    if len(table):
+        print(table[[c for c in table.columns if not c.startswith("BR(") and c not in BOOKKEEPING]].to_string(index=False))
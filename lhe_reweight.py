@@ -0,0 +1,404 @@
+import os
+import re
+import sys
+import glob
+import gzip
+import shutil
+import argparse
+import functools
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import RectBivariateSpline
+
+module_path = Path("calchep_xsec.py").resolve()
+spec = importlib.util.spec_from_file_location("calchep_xsec", module_path)
+calchep_xsec = importlib.util.module_from_spec(spec)
+sys.modules["calchep_xsec"] = calchep_xsec
+spec.loader.exec_module(calchep_xsec)
+
+# pdf1/pdf2 of the batch files
+SOURCE_PDF = "NNPDF40_lo_as_01180"
+# Where LHAPDF6 sets are looked for by name, after the folders in $LHAPDF_DATA_PATH / $LHAPATH
+PDF_PATHS = ["~/share/LHAPDF", "/usr/share/LHAPDF", "/usr/local/share/LHAPDF", "."]
+# Powers of alpha_s in the matrix element: pp -> Tp tp proceeds through qq -> Tp tp and gg -> Tp tp
+N_ALPHA_S = 2
+# 7-point scale variation (mu_F, mu_R) around the CalcHEP scale
+SCALE_VARIATIONS = [(0.5, 0.5), (0.5, 1.0), (1.0, 0.5), (1.0, 2.0), (2.0, 1.0), (2.0, 2.0)]
+# Events whose PDF weights are evaluated in one vectorised call
+BATCH = 20000
+
+
+def find_pdf_member(name):
+    """
+    Member grid of an LHAPDF6 set: a path to a member .dat file, a path to a
+    set folder, or "NAME[:member]" looked up in the PDF paths (member 0 by
+    default).
+
+    Returns:
+        (path of the member .dat, path of the set's .info or None)
+    """
+    if os.path.isfile(name):
+        folder = os.path.dirname(os.path.abspath(name))
+        info = os.path.join(folder, os.path.basename(folder) + ".info")
+        return name, info if os.path.isfile(info) else None
+    set_name, _, member = name.partition(":")
+    folders = [set_name] if os.path.isdir(set_name) else []
+    paths = os.environ.get("LHAPDF_DATA_PATH", "").split(":") + os.environ.get("LHAPATH", "").split(":") + PDF_PATHS
+    folders += [os.path.join(os.path.expanduser(p), set_name) for p in paths if p]
+    for folder in folders:
+        base = os.path.basename(os.path.normpath(folder))
+        path = os.path.join(folder, f"{base}_{int(member or 0):04d}.dat")
+        if os.path.isfile(path):
+            info = os.path.join(folder, f"{base}.info")
+            return path, info if os.path.isfile(info) else None
+    raise FileNotFoundError(f"PDF {name} not found (looked in {', '.join(folders)})")
+
+
+def _yaml_list(text, key):
+    match = re.search(rf"(?m)^{key}:\s*\[([^\]]*)\]", text)
+    return np.array([float(v) for v in match.group(1).split(",") if v.strip()]) if match else None
+
+
+class PDFGrid:
+    """
+    One member of an LHAPDF6 set in the lhagrid1 format, read without LHAPDF.
+
+    x f(x, Q) is interpolated with bicubic splines in (log x, log Q^2) on
+    each Q subgrid; x and Q outside the grid are frozen at its edges. The
+    gluon is pid 21 (0 is accepted as well); flavours the grid does not have
+    give 0. alpha_s(Q) comes from the AlphaS_Qs/AlphaS_Vals of the set's
+    .info file (or the member header), interpolated in log Q.
+    """
+
+    def __init__(self, path, info=None):
+        self.path = path
+        with open(path) as f:
+            blocks = f.read().split("\n---")
+        header = blocks[0]
+        if info is not None:
+            with open(info) as f:
+                header = f.read() + "\n" + header
+
+        self.subgrids = []
+        for block in blocks[1:]:
+            lines = [line for line in block.strip().splitlines() if line.strip()]
+            if len(lines) < 4:
+                continue
+            xs = np.array(lines[0].split(), dtype=float)
+            qs = np.array(lines[1].split(), dtype=float)
+            pids = [21 if int(p) == 0 else int(p) for p in lines[2].split()]
+            values = np.array(" ".join(lines[3:]).split(), dtype=float).reshape(len(xs), len(qs), len(pids))
+            log_x, log_q2 = np.log(xs), np.log(qs**2)
+            kx, ky = min(3, len(xs) - 1), min(3, len(qs) - 1)
+            splines = {pid: RectBivariateSpline(log_x, log_q2, values[:, :, i], kx=kx, ky=ky, s=0)
+                       for i, pid in enumerate(pids)}
+            self.subgrids.append((log_x, log_q2, splines))
+        if not self.subgrids:
+            raise ValueError(f"{path} is not an lhagrid1 PDF grid")
+
+        qs, values = _yaml_list(header, "AlphaS_Qs"), _yaml_list(header, "AlphaS_Vals")
+        self.alphas_grid = (np.log(qs), values) if qs is not None and values is not None else None
+
+    def xfxQ(self, pid, x, q):
+        """x f(x, Q) for arrays of flavours, momentum fractions and scales."""
+        pid = np.where(np.asarray(pid) == 0, 21, np.asarray(pid))
+        log_q2 = np.log(np.asarray(q, dtype=float)**2)
+        log_x = np.log(np.asarray(x, dtype=float))
+        result = np.zeros(np.broadcast(pid, log_x, log_q2).shape)
+        pid, log_x, log_q2 = np.broadcast_arrays(pid, log_x, log_q2)
+        log_q2 = np.clip(log_q2, self.subgrids[0][1][0], self.subgrids[-1][1][-1])
+        for n, (grid_x, grid_q2, splines) in enumerate(self.subgrids):
+            in_grid = log_q2 <= grid_q2[-1] if n < len(self.subgrids) - 1 else np.ones(log_q2.shape, dtype=bool)
+            if n > 0:
+                in_grid &= log_q2 > self.subgrids[n - 1][1][-1]
+            for flavour in np.unique(pid[in_grid]):
+                if flavour not in splines:
+                    continue
+                sel = in_grid & (pid == flavour)
+                result[sel] = splines[flavour].ev(np.clip(log_x[sel], grid_x[0], grid_x[-1]), log_q2[sel])
+        return result
+
+    def alphas(self, q):
+        if self.alphas_grid is None:
+            raise ValueError(f"no AlphaS_Qs/AlphaS_Vals for {self.path}")
+        log_q, values = self.alphas_grid
+        return np.interp(np.log(q), log_q, values)
+
+
+@functools.lru_cache(maxsize=None)
+def load_pdf(name):
+    """PDFGrid of a set name or path (see find_pdf_member), read once per process."""
+    return PDFGrid(*find_pdf_member(name))
+
+
+def variation_label(pdf, mu_f, mu_r):
+    """'cteq6l1' for a PDF, 'muF0.5_muR1' for a scale variation, both if both."""
+    parts = [] if pdf is None else [os.path.basename(pdf.rstrip("/")).replace(".dat", "").replace(":", "_")]
+    if (mu_f, mu_r) != (1.0, 1.0):
+        parts.append(f"muF{mu_f:g}_muR{mu_r:g}")
+    return "_".join(parts)
+
+
+def weight_ratios(events, source, variations, alphas_from_pdf=False):
+    """
+    Per-event weight ratios target / source for a batch of events.
+
+    r = f_T(id1, x1, k_F Q) f_T(id2, x2, k_F Q) / (f_S(id1, x1, Q) f_S(id2, x2, Q))
+        x [alpha_s(k_R Q) / alpha_s(Q)]^N_ALPHA_S
+
+    with Q the event's SCALUP. alpha_s is the target's; with alphas_from_pdf
+    the denominator is the source PDF's alpha_s(Q), so that the coupling
+    follows the PDF set as well (CalcHEP otherwise uses its own alpha_s).
+
+    Args:
+        events (dict of arrays): id1, id2, x1, x2, q of the batch
+        variations (list of (pdf or None, mu_f, mu_r)): None keeps the source PDF
+
+    Returns:
+        Array (variations, events)
+    """
+    pdf_s = load_pdf(source)
+    q = events["q"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denominator = pdf_s.xfxQ(events["id1"], events["x1"], q) * pdf_s.xfxQ(events["id2"], events["x2"], q)
+        ratios = []
+        for pdf, mu_f, mu_r in variations:
+            pdf_t = load_pdf(pdf) if pdf is not None else pdf_s
+            r = pdf_t.xfxQ(events["id1"], events["x1"], mu_f * q) * pdf_t.xfxQ(events["id2"], events["x2"], mu_f * q)
+            r = r / denominator
+            if mu_r != 1.0 or (alphas_from_pdf and pdf is not None):
+                alphas_0 = pdf_s.alphas(q) if alphas_from_pdf else pdf_t.alphas(q)
+                r = r * (pdf_t.alphas(mu_r * q) / alphas_0)**N_ALPHA_S
+            ratios.append(np.where(np.isfinite(r), r, 0.0))
+    return np.array(ratios)
+
+
+def parse_event(lines, beam_energies):
+    """(IDPRUP, XWGTUP, SCALUP, id1, x1, id2, x2) of one event's lines (without <event> tags)."""
+    fields = lines[0].split()
+    idprup, weight, scale = int(fields[1]), float(fields[2]), float(fields[3])
+    partons = {}
+    for line in lines[1:1 + int(fields[0])]:
+        p = line.split()
+        if p[1] == "-1":
+            pz, e = float(p[8]), float(p[9])
+            beam = 0 if pz >= 0 and 0 not in partons else 1
+            partons[beam] = (int(p[0]), (e + abs(pz)) / (2 * beam_energies[beam]))
+    (id1, x1), (id2, x2) = partons[0], partons[1]
+    return idprup, weight, scale, id1, x1, id2, x2
+
+
+def _write_member(path, text, mode="wb"):
+    with open(path, mode) as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+        f.write(text.encode())
+
+
+def reweight_file(args):
+    """
+    Stream one .lhe(.gz) file event by event and reweight it to every
+    variation (see weight_ratios) in batches of BATCH events.
+
+    With out_dir, one reweighted <name>_<label>.lhe.gz per variation is
+    written: weighted events (IDWTUP = +-4, XWGTUP in pb, the cross section
+    being their mean) and XSECUP/XERRUP of the <init> block rescaled. The
+    events go to a temporary gzip member first and the header, known only at
+    the end, is written as a member in front of it.
+
+    Returns:
+        List of summary rows, one per variation
+    """
+    path, source, variations, out_dir, alphas_from_pdf = args
+    opener = gzip.open if path.endswith(".gz") else open
+    name = re.sub(r"\.lhe(\.gz)?$", "", os.path.basename(path))
+    labels = [variation_label(*v) for v in variations]
+    header, init, tail = [], [], []
+    init_index = []
+    beam_energies = idwtup = None
+    processes = {}
+    sums = {}
+    bodies = []
+    batch = {"lines": [], "id1": [], "id2": [], "x1": [], "x2": [], "q": [], "w": [], "proc": []}
+
+    def flush():
+        if not batch["w"]:
+            return
+        arrays = {k: np.array(batch[k]) for k in ("id1", "id2", "x1", "x2", "q")}
+        ratios = weight_ratios(arrays, source, variations, alphas_from_pdf)
+        w, proc = np.array(batch["w"]), np.array(batch["proc"])
+        for p in np.unique(proc):
+            sel = proc == p
+            acc = sums.setdefault(p, [0, 0.0, np.zeros(len(variations)), np.zeros(len(variations))])
+            acc[0] += int(sel.sum())
+            acc[1] += w[sel].sum()
+            acc[2] += (ratios[:, sel] * w[sel]).sum(axis=1)
+            acc[3] += ((ratios[:, sel] * w[sel])**2).sum(axis=1)
+        if out_dir is not None:
+            for v, (out, body) in enumerate(bodies):
+                for i, lines in enumerate(batch["lines"]):
+                    first = lines[0].split()
+                    new_weight = w[i] * ratios[v, i] if abs(idwtup) == 4 else \
+                        np.sign(w[i]) * processes[proc[i]][0] * ratios[v, i]
+                    first[2] = f"{new_weight:.7E}"
+                    body.write("<event>\n " + " ".join(first) + "\n" + "".join(lines[1:]) + "</event>\n")
+        for values in batch.values():
+            values.clear()
+
+    try:
+        with opener(path, "rt") as f:
+            section = "header"
+            event = None
+            for line in f:
+                stripped = line.strip()
+                if event is not None:
+                    if stripped.startswith("</event"):
+                        values = parse_event([l for l in event if not l.lstrip().startswith(("#", "<"))], beam_energies)
+                        for key, value in zip(("proc", "w", "q", "id1", "x1", "id2", "x2"), values):
+                            batch[key].append(value)
+                        batch["lines"].append(event)
+                        event = None
+                        if len(batch["w"]) >= BATCH:
+                            flush()
+                    else:
+                        event.append(line)
+                    continue
+                if stripped.startswith("<event"):
+                    if section != "events":
+                        section = "events"
+                        beam = init[0].split()
+                        beam_energies = (float(beam[2]), float(beam[3]))
+                        idwtup = int(beam[8])
+                        for proc_line in init[1:]:
+                            fields = proc_line.split()
+                            processes[int(fields[3])] = (float(fields[0]), float(fields[1]))
+                        if out_dir is not None:
+                            for label in labels:
+                                body_path = os.path.join(out_dir, f"{name}_{label}.lhe.gz.{os.getpid()}.body")
+                                bodies.append((body_path, gzip.open(body_path, "wt", compresslevel=6)))
+                    event = []
+                    continue
+                if section == "events":
+                    tail.append(line)
+                elif stripped.startswith("<init"):
+                    section = "init"
+                    header.append(line)
+                elif stripped.startswith("</init"):
+                    section = "after_init"
+                    header.append(line)
+                elif section == "init":
+                    init.append(line)
+                    init_index.append(len(header))
+                    header.append(line)
+                else:
+                    header.append(line)
+        flush()
+    finally:
+        for _, body in bodies:
+            body.close()
+
+    rows = []
+    params = calchep_xsec.parse_run_name(name.split("-", 1)[-1])
+    total = {p: processes.get(p, (np.nan, np.nan)) for p in sums}
+    for v, (pdf, mu_f, mu_r) in enumerate(variations):
+        sigma = sum(total[p][0] for p in sums)
+        sigma_rw, var_xsec, var_mc = 0.0, 0.0, 0.0
+        new_init = {}
+        for p, (n, sum_w, sum_rw, sum_rw2) in sums.items():
+            xsec, xerr = total[p]
+            ratio = sum_rw[v] / sum_w
+            # MC error of the ratio: spread of r w around ratio x w
+            ratio_err = np.sqrt(max(sum_rw2[v] - sum_rw[v]**2 / n, 0.0)) / abs(sum_w) if n > 1 else 0.0
+            sigma_rw += xsec * ratio
+            var_mc += (xsec * ratio_err)**2
+            var_xsec += (xerr * ratio)**2
+            new_init[p] = (xsec * ratio, np.hypot(xerr * ratio, xsec * ratio_err))
+        rows.append({"file": os.path.basename(path), **params, "variation": labels[v],
+                     "pdf": pdf or source, "mu_f": mu_f, "mu_r": mu_r, "events": sum(a[0] for a in sums.values()),
+                     "sigma_pb": sigma, "sigma_rw_pb": sigma_rw, "ratio": sigma_rw / sigma if sigma else np.nan,
+                     "ratio_err": np.sqrt(var_mc) / sigma if sigma else np.nan,
+                     "sigma_rw_err_pb": np.sqrt(var_xsec + var_mc)})
+
+        if out_dir is not None:
+            out_path = os.path.join(out_dir, f"{name}_{labels[v]}.lhe.gz")
+            text = []
+            for i, line in enumerate(header):
+                if i == init_index[0]:
+                    fields = line.split()
+                    fields[8] = str(4 if idwtup > 0 else -4)
+                    text.append(" " + " ".join(fields) + "\n")
+                elif i in init_index:
+                    fields = line.split()
+                    xsec, xerr = new_init.get(int(fields[3]), (float(fields[0]), float(fields[1])))
+                    fields[0], fields[1] = f"{xsec:.7E}", f"{xerr:.7E}"
+                    text.append(" " + " ".join(fields) + "\n")
+                else:
+                    text.append(line)
+                if line.strip().startswith("<LesHouchesEvents"):
+                    text.append(f"<!-- lhe_reweight.py: {source} -> {pdf or source}, mu_F x {mu_f:g}, mu_R x {mu_r:g} -->\n")
+            tmp = f"{out_path}.{os.getpid()}.tmp"
+            _write_member(tmp, "".join(text))
+            body_path = bodies[v][0]
+            with open(tmp, "ab") as out, open(body_path, "rb") as body:
+                shutil.copyfileobj(body, out, 1 << 20)
+            _write_member(tmp, "".join(tail) or "</LesHouchesEvents>\n", mode="ab")
+            os.replace(tmp, out_path)
+            os.remove(body_path)
+    return rows
+
+
+def reweight_all(files, source=SOURCE_PDF, variations=(), out_dir=None, output="lhe_reweight.txt",
+                 workers=None, alphas_from_pdf=False):
+    """
+    reweight_file for every LHE file, in a process pool: the rescaled cross
+    section of each file and variation goes to `output` (tab-separated),
+    and with out_dir the reweighted event files as well.
+
+    Args:
+        variations (list of (pdf or None, mu_f, mu_r)): pdf None keeps the source PDF
+        workers (int or None): Processes (default os.cpu_count())
+
+    Returns:
+        DataFrame of the table
+    """
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    # Fail early on a missing or broken grid rather than in every worker
+    for pdf in [source] + [v[0] for v in variations if v[0] is not None]:
+        load_pdf(pdf)
+    tasks = [(path, source, list(variations), out_dir, alphas_from_pdf) for path in files]
+    if workers == 1 or len(tasks) < 2:
+        results = [reweight_file(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(reweight_file, tasks))
+    table = pd.DataFrame([row for rows in results for row in rows])
+    table.to_csv(output, sep="\t", index=False, float_format="%.6g")
+    print(f"{len(files)} files x {len(variations)} variations reweighted from {source}, cross sections in {output}"
+          + (f", events in {out_dir}/" if out_dir else ""))
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reweight CalcHEP LHE files to other PDF sets and scales")
+    parser.add_argument("files", nargs="+", help=".lhe or .lhe.gz files")
+    parser.add_argument("--source", default=SOURCE_PDF, help="PDF the events were generated with (name[:member] or grid path)")
+    parser.add_argument("--pdf", nargs="*", default=[], help="target PDF sets (name[:member] or grid path)")
+    parser.add_argument("--scales", action="store_true", help="add the 7-point mu_F/mu_R variation with the source PDF")
+    parser.add_argument("--alphas-from-pdf", action="store_true",
+                        help="also take alpha_s from the PDF sets (target over source at the event scale)")
+    parser.add_argument("--out-dir", default=None, help="write reweighted .lhe.gz files here (default: cross sections only)")
+    parser.add_argument("--output", default="lhe_reweight.txt")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    variations = [(pdf, 1.0, 1.0) for pdf in args.pdf]
+    if args.scales:
+        variations += [(None, mu_f, mu_r) for mu_f, mu_r in SCALE_VARIATIONS]
+    if not variations:
+        parser.error("nothing to do: give --pdf and/or --scales")
+    files = [f for pattern in args.files for f in (sorted(glob.glob(pattern)) or [pattern])]
+    table = reweight_all(files, args.source, variations, args.out_dir, args.output, args.workers, args.alphas_from_pdf)
+    print(table[["file", "variation", "events", "sigma_pb", "sigma_rw_pb", "ratio", "ratio_err"]].to_string(index=False))
@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+import json
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# <observable>_<Mtp>_<MV>.tab, as written by the lhe2tab commands in the README
+TAB_NAME = re.compile(r"(?:.*/)?(?P<obs>.+?)_(?P<mtp>\d+)_(?P<mv>\d+)\.tab$")
+
+HEADER_KEYS = ["xName", "xMin", "xMax", "xDim", "yName"]
+
+
+def parse_tab(text):
+    """
+    Parse one CalcHEP lhe2tab histogram.
+
+    Returns:
+        (header dict with xName/xMin/xMax/xDim/yName, values, errors)
+    """
+    header = {}
+    data = []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            key, _, value = line[1:].partition(" ")
+            if key in HEADER_KEYS:
+                header[key] = value.strip()
+        elif line.strip():
+            data.append(line)
+    header["xMin"] = float(header["xMin"])
+    header["xMax"] = float(header["xMax"])
+    header["xDim"] = int(header["xDim"])
+    table = np.array(" ".join(data).split(), dtype=float).reshape(len(data), -1)
+    return header, table[:, 0], table[:, 1]
+
+
+def _parse_member(args):
+    source, name = args
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as z:
+            text = z.read(name).decode()
+    else:
+        with open(os.path.join(source, name)) as f:
+            text = f.read()
+    return name, parse_tab(text)
+
+
+class TabHistograms:
+    """
+    All <observable>_<Mtp>_<MV>.tab histograms of one directory (or zip file).
+
+    values and errors have shape (observable, mass point, bin); observables
+    with fewer bins than the largest xDim and missing (observable, point)
+    pairs are NaN. header[obs] holds the xName/xMin/xMax/xDim/yName lines.
+    """
+
+    def __init__(self, observables, points, header, values, errors):
+        self.observables = list(observables)
+        self.points = [tuple(p) for p in points]
+        self.header = header
+        self.values = values
+        self.errors = errors
+
+    def index(self, obs, point):
+        return self.observables.index(obs), self.points.index(tuple(point))
+
+    def centers(self, obs):
+        h = self.header[obs]
+        bins = np.linspace(h["xMin"], h["xMax"], h["xDim"] + 1)
+        return 0.5 * (bins[:-1] + bins[1:])
+
+    def normalised(self, obs, point):
+        """
+        Same as read_hist.read_histogram: (unit-area values, bin centres, bin width).
+        """
+        i, j = self.index(obs, point)
+        h = self.header[obs]
+        values = np.asarray(self.values[i, j, :h["xDim"]])
+        binwidth = (h["xMax"] - h["xMin"]) / h["xDim"]
+        return values / (values * binwidth).sum(), self.centers(obs), binwidth
+
+
+def list_tab_files(source):
+    """Names of the .tab files in a directory or zip and a signature of their mtimes."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as z:
+            names = sorted(n for n in z.namelist() if TAB_NAME.match(n))
+        st = os.stat(source)
+        return names, {os.path.basename(source): [st.st_mtime_ns, st.st_size]}
+    names = sorted(n for n in os.listdir(source) if TAB_NAME.match(n))
+    signature = {}
+    for n in names:
+        st = os.stat(os.path.join(source, n))
+        signature[n] = [st.st_mtime_ns, st.st_size]
+    return names, signature
+
+
+def cache_paths(source):
+    base = source.rstrip("/") + ".tab_cache" if zipfile.is_zipfile(source) else os.path.join(source, ".tab_cache")
+    return base + ".npy", base + ".json"
+
+
+def load_tab_histograms(source, workers=None, use_cache=True):
+    """
+    Read every <observable>_<Mtp>_<MV>.tab in `source` (a directory or a zip
+    such as pp_TpTp_decay_FPVDM.zip) into one TabHistograms.
+
+    Files are parsed in a process pool. The result is cached next to the
+    source as a raw .npy array plus a .json header; the cache is rebuilt when
+    the set of files or any of their mtimes/sizes changes. A cached array is
+    memory-mapped read-only, so several plotting processes share its pages.
+
+    Args:
+        source (str): Directory or zip file with the .tab files
+        workers (int or None): Parser processes (default os.cpu_count())
+        use_cache (bool): Read/write the binary cache
+
+    Returns:
+        TabHistograms
+    """
+    names, signature = list_tab_files(source)
+    npy_path, json_path = cache_paths(source)
+
+    if use_cache and os.path.isfile(npy_path) and os.path.isfile(json_path):
+        with open(json_path) as f:
+            meta = json.load(f)
+        if meta["signature"] == signature:
+            data = np.load(npy_path, mmap_mode="r")
+            return TabHistograms(meta["observables"], meta["points"], meta["header"], data[0], data[1])
+
+    if workers == 1 or len(names) < 2:
+        parsed = [_parse_member((source, n)) for n in names]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(_parse_member, [(source, n) for n in names]))
+
+    keys = {}
+    for name, result in parsed:
+        m = TAB_NAME.match(name)
+        keys[name] = (m["obs"], (int(m["mtp"]), int(m["mv"])))
+    observables = sorted({obs for obs, _ in keys.values()})
+    points = sorted({point for _, point in keys.values()})
+    nbins = max((result[0]["xDim"] for _, result in parsed), default=0)
+
+    data = np.full((2, len(observables), len(points), nbins), np.nan)
+    header = {}
+    for name, (h, values, errors) in parsed:
+        obs, point = keys[name]
+        if obs in header and header[obs]["xDim"] != h["xDim"]:
+            raise ValueError(f"{name}: xDim {h['xDim']} differs from other {obs} files ({header[obs]['xDim']})")
+        header[obs] = h
+        i, j = observables.index(obs), points.index(point)
+        data[0, i, j, :len(values)] = values
+        data[1, i, j, :len(errors)] = errors
+
+    if use_cache:
+        tmp = f"{npy_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, data)
+        os.replace(tmp, npy_path)
+        meta = {"signature": signature, "observables": observables, "points": points, "header": header}
+        with open(json_path, "w") as f:
+            json.dump(meta, f, indent=1)
+
+    return TabHistograms(observables, points, header, data[0], data[1])
+
+
+# The four distribution plots of pp_TpTp_decay_FPVDM/histogram_plot_*.py
+PLOTS = {
+    "MtT": {"xlabel": "$M_{t\\bar{t}}$", "yscale": "log", "ymin": 1E-4, "ymax_factor": 1.1, "output": "plot_MtT.pdf"},
+    "MttT": {"xlabel": "$M_{ttt}$", "yscale": "log", "ymin": 1E-4, "ymax_factor": 2, "output": "plot_Mttt.pdf"},
+    "T_t": {"xlabel": "$P_T^{t}$", "yscale": "linear", "ymin": 0, "ymax_factor": 1.1, "output": "plot_T_t.pdf",
+            "all_points_ymax": True, "tight_x": True, "legend_fontsize": 8},
+    "T_Tt": {"xlabel": "$P_T^{\\bar{t}t}$", "yscale": "log", "ymin": 1E-3, "ymax_factor": 1.1, "output": "plot_T_Tt.pdf"},
+}
+
+
+def plot_all(hists, output_dir=".", plots=PLOTS, colors=("b", "r", "g")):
+    """
+    Render every configured observable from one TabHistograms in one process.
+    As in the original scripts, the y range follows the second mass point
+    unless all_points_ymax is set.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    for obs, cfg in plots.items():
+        if obs not in hists.observables:
+            continue
+        curves = []
+        plt.figure(figsize=(5, 3))
+        for (mtp, mv), color in zip(hists.points, colors):
+            values, xc, dx = hists.normalised(obs, (mtp, mv))
+            curves.append(values)
+            plt.plot(xc, values, ls="-", drawstyle="steps-mid",
+                     label=f"$M_{{T'}}$={mtp / 1000:g} TeV, $M_V'=${mv} GeV", color=color)
+
+        reference = max(map(max, curves)) if cfg.get("all_points_ymax") else max(curves[min(1, len(curves) - 1)])
+        plt.ylim(cfg["ymin"], cfg["ymax_factor"] * reference)
+        if cfg.get("tight_x"):
+            plt.xlim(min(xc) - dx / 2, max(xc) + dx / 2)
+        plt.yscale(cfg["yscale"])
+        plt.xlabel(cfg["xlabel"])
+        plt.ylabel("Normalised distribution")
+        plt.legend(fontsize=cfg.get("legend_fontsize"))
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, cfg["output"]))
+        plt.close()
+        print(f"{obs}: {cfg['output']}")
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "pp_TpTp_decay_FPVDM.zip"
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else "."
+
+    hists = load_tab_histograms(source)
+    print(f"{len(hists.observables)} observables x {len(hists.points)} mass points x {hists.values.shape[-1]} bins")
+    plot_all(hists, output_dir)